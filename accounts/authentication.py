@@ -0,0 +1,157 @@
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_KEY = 'accounts:user:{}'
+UNCACHED_FIELDS = {'password'} # Never copied to the cache, loaded on access like any deferred field
+
+
+def get_cached_user(user_id):
+    """
+    Rebuilds a user from the cache without a query, or returns None on a miss. The user comes back as if loaded with
+    .defer('password'), so reading the password queries for it and save() never writes a missing one back.
+    """
+    try:
+        cached = cache.get(USER_CACHE_KEY.format(user_id))
+    except Exception:
+        logger.warning('User cache unavailable', exc_info=True)
+        return None
+    return _user_from_cache(cached)
+
+
+async def aget_cached_user(user_id):
+    """get_cached_user for async views, the cache is read off the event loop."""
+    try:
+        cached = await cache.aget(USER_CACHE_KEY.format(user_id))
+    except Exception:
+        logger.warning('User cache unavailable', exc_info=True)
+        return None
+    return _user_from_cache(cached)
+
+
+def _user_from_cache(cached):
+    if cached is None:
+        return None
+    field_names, values, password_hash = cached
+    user = get_user_model().from_db(DEFAULT_DB_ALIAS, field_names, values)
+    user._password_hash = password_hash
+    return user
+
+
+def cache_user(user):
+    try:
+        cache.set(*_cache_entry(user), settings.AUTH_USER_CACHE_TIMEOUT)
+    except Exception:
+        logger.warning('Could not cache user %s', user.pk, exc_info=True)
+
+
+async def acache_user(user):
+    """cache_user for async views."""
+    try:
+        await cache.aset(*_cache_entry(user), settings.AUTH_USER_CACHE_TIMEOUT)
+    except Exception:
+        logger.warning('Could not cache user %s', user.pk, exc_info=True)
+
+
+def _cache_entry(user):
+    field_names = [field.attname for field in user._meta.concrete_fields if field.attname not in UNCACHED_FIELDS]
+    # Only a digest of the password hash, for CHECK_REVOKE_TOKEN
+    password_hash = get_md5_hash_password(user.password) if api_settings.CHECK_REVOKE_TOKEN else None
+    return (USER_CACHE_KEY.format(getattr(user, api_settings.USER_ID_FIELD)),
+            (field_names, [getattr(user, name) for name in field_names], password_hash))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Any save or delete, including password changes and deactivation, drops the cached copy before the next request.
+    QuerySet.update() and bulk deletes send no signal, see uncache_users() for those.
+    """
+    uncache_users([getattr(instance, api_settings.USER_ID_FIELD)])
+
+
+def uncache_users(user_ids):
+    """
+    Drops the cached copies of the users, for writes that bypass the model signals such as a bulk deactivation. Dropped
+    again on commit, in case a concurrent request cached the uncommitted old rows in between.
+    """
+    keys = [USER_CACHE_KEY.format(user_id) for user_id in user_ids]
+    _drop(keys)
+    transaction.on_commit(lambda: _drop(keys))
+
+
+def _drop(keys):
+    try:
+        cache.delete_many(keys)
+    except Exception:
+        # The copies expire on their own after AUTH_USER_CACHE_TIMEOUT
+        logger.warning('Could not drop cached users %s', keys, exc_info=True)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from the cache, so authenticated requests do not start with a
+    User SELECT. Cached users go through the same active and token revocation checks as freshly loaded ones.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = get_cached_user(user_id) if user_id is not None else None
+        if user is None:
+            user = super().get_user(validated_token) # Loads the user and runs every check
+            cache_user(user)
+            return user
+        self.check_cached_user(user, validated_token)
+        return user
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views, only a cache miss reaches the database."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        user = await aget_cached_user(user_id)
+        if user is not None:
+            self.check_cached_user(user, validated_token)
+            return user
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            user._password_hash = get_md5_hash_password(user.password)
+        self.check_cached_user(user, validated_token)
+        await acache_user(user)
+        return user
+
+    def check_cached_user(self, user, validated_token):
+        """The active and token revocation checks of JWTAuthentication.get_user, for users it did not load."""
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != user._password_hash:
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
@@ -1,3 +1,137 @@
-from django.test import TestCase
+import asyncio
 
-# Create your tests here.
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework import status
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.authentication import cache, get_cached_user, uncache_users
+
+
+@pytest.mark.django_db
+class TestCachedJWTAuthentication:
+    def authenticate(self, api_client, user):
+        api_client.credentials(HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(user)}')
+
+    def test_repeat_requests_do_not_query_the_user(self, user, api_client, created_task_board,
+                                                   django_assert_num_queries):
+        """
+        Test that once a token's user is cached, authenticating costs no query.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param django_assert_num_queries:
+        """
+        self.authenticate(api_client, user)
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        api_client.get(url)
+
+        with django_assert_num_queries(1): # The board lookup, the task list itself is cached too
+            response = api_client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_cached_user_never_holds_the_password(self, user, api_client, created_task_board):
+        """
+        Test that the password hash is left out of the cache and is loaded on access instead.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        self.authenticate(api_client, user)
+        api_client.get(f'/boards/{created_task_board.slug}/tasks/')
+
+        cached = get_cached_user(user.pk)
+
+        assert 'password' in cached.get_deferred_fields()
+        assert cached.password == user.password
+
+    def test_deactivation_takes_effect_immediately(self, user, api_client, created_task_board):
+        """
+        Test that deactivating a user invalidates their cached copy, so their next request is refused.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        self.authenticate(api_client, user)
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        api_client.get(url)
+
+        user.is_active = False
+        user.save()
+        response = api_client.get(url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_bulk_deactivation_takes_effect_once_uncached(self, user, api_client, created_task_board):
+        """
+        Test that a bulk deactivation, which sends no signal, refuses the user's next request once uncache_users()
+        drops their cached copy.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        self.authenticate(api_client, user)
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        api_client.get(url)
+
+        get_user_model().objects.filter(pk=user.pk).update(is_active=False)
+        assert api_client.get(url).status_code == status.HTTP_200_OK # Still served from the cached copy
+        uncache_users([user.pk])
+        response = api_client.get(url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_password_change_revokes_tokens_when_configured(self, user, api_client, created_task_board,
+                                                            monkeypatch):
+        """
+        Test that with CHECK_REVOKE_TOKEN a password change refuses older tokens, cached user or not.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param monkeypatch:
+        """
+        # Patched on the settings object itself, simplejwt modules keep a reference to it across settings changes
+        monkeypatch.setattr(api_settings, 'CHECK_REVOKE_TOKEN', True)
+        self.authenticate(api_client, user)
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        assert api_client.get(url).status_code == status.HTTP_200_OK
+
+        user.set_password('a-new-password')
+        user.save()
+        response = api_client.get(url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_async_views_never_read_the_cache_on_the_event_loop(self, user, api_client, created_task_board,
+                                                                 monkeypatch):
+        """
+        Test that authenticating an async request reads and fills the user cache off the event loop thread, where a
+        Redis round trip would block every other request.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param monkeypatch:
+        """
+        on_event_loop = []
+
+        def track(method):
+            def tracked(*args, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                    on_event_loop.append(method.__name__)
+                except RuntimeError:
+                    pass
+                return method(*args, **kwargs)
+            return tracked
+
+        monkeypatch.setattr(cache, 'get', track(cache.get))
+        monkeypatch.setattr(cache, 'set', track(cache.set))
+        self.authenticate(api_client, user)
+        url = f'/async/boards/{created_task_board.slug}/tasks/'
+
+        responses = [api_client.get(url), api_client.get(url)] # A cache miss, then a hit
+
+        assert [response.status_code for response in responses] == [status.HTTP_200_OK] * 2
+        assert on_event_loop == []
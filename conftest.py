@@ -0,0 +1,46 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from model_bakery import baker
+from rest_framework.test import APIClient
+
+
+@pytest.fixture(autouse=True)
+def local_cache(settings):
+    """
+    Stands in for Redis with Django's in-process cache, emptied before every test. The response cache only uses
+    operations both backends implement the same way.
+    """
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tests',
+        }
+    }
+    cache.clear()
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def local_board_events(settings):
+    """Publishes live board events in-process rather than through Redis."""
+    settings.BOARD_EVENTS = {'BACKEND': 'tasks.events.InMemoryBroker'}
+
+
+@pytest.fixture
+def user():
+    User = get_user_model()
+    return User.objects.create_user(username='testuser', password='testpassword', email="testuser@example.com")
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def created_task_board(user):
+    task_board = baker.make(
+        "TaskBoard",
+        owner=user
+    )
+    return task_board
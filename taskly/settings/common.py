@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'tasks.metrics.APIMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -129,7 +130,7 @@ AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
 
 }
@@ -139,6 +140,11 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=5),
 }
 
+# Seconds a user resolved from a JWT is cached. Model saves and deletes drop it at once, but bulk writes such as
+# User.objects.filter(...).update(is_active=False) send no signal, so they only take effect once it expires. Call
+# accounts.authentication.uncache_users() after one.
+AUTH_USER_CACHE_TIMEOUT = 60
+
 DJOSER = {
     'USER_CREATE_PASSWORD_RETYPE': True,
 }
@@ -152,13 +158,38 @@ EMAIL_HOST_USER = ''
 EMAIL_HOST_PASSWORD = ''
 DEFAULT_FROM_EMAIL = 'from@taskly.com'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/2', # The Celery broker's Redis, in its own database
+    }
+}
+BOARD_EVENTS = {
+    'BACKEND': 'tasks.events.RedisBroker',
+    'LOCATION': 'redis://localhost:6379', # Pub/sub channels are not scoped to a database
+}
+SSE_HEARTBEAT_SECONDS = 15 # Keeps idle event streams open through proxies, access is re-checked on each one
+RESPONSE_CACHE_TIMEOUT = 60 * 10 # Seconds a serialised board or task response is cached, writes orphan it sooner
+API_METRICS_SAMPLE_RATE = 0.05 # Share of requests timed and counted, keeps the overhead well under 1%
+API_METRICS_TOKEN = os.environ.get('API_METRICS_TOKEN') # Bearer token for scraping /metrics/, hidden while unset
+
 CELERY_BROKER_URL = 'redis://localhost:6379/1'
 CELERY_BEAT_SCHEDULE = {
     'notify_user_task_is_due_within_24_hours': {
-        'task': 'tasks.tasks.notify_user_task_is_due_within_24_hours',
+        'task': 'tasks.tasks.dispatch_due_task_reminders',
         'schedule': crontab(minute=0),
-    }
+    },
+    'refresh_overdue_stats': {
+        'task': 'tasks.tasks.refresh_overdue_stats',
+        'schedule': crontab(minute='*/5'),
+    },
+    'prune_change_log_entries': {
+        'task': 'tasks.tasks.prune_change_log_entries',
+        'schedule': crontab(hour=3, minute=30),
+    },
 }
+TASK_REMINDER_SHARDS = 8 # Reminder shards dispatched in parallel each hour, roughly one per worker process
+CHANGE_LOG_RETENTION_DAYS = 30 # How far back a ?since= cursor can sync from
 
 LOGGING = {
     'version': 1,
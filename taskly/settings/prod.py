@@ -7,3 +7,21 @@ ALLOWED_HOSTS = []
 
 SECRET_KEY = os.environ['SECRET_KEY']
 
+# Lean API profile: clients authenticate with JWTs only, so nothing here needs sessions, messages or CSRF tokens, and
+# the admin and the development tools are left out with them. Compare with python manage.py benchmark_settings.
+DEV_APPS = ['debug_toolbar', 'django_extensions']
+BROWSER_APPS = ['django.contrib.admin', 'django.contrib.sessions', 'django.contrib.messages']
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DEV_APPS + BROWSER_APPS]
+
+BROWSER_MIDDLEWARE = [
+    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware', # DRF authenticates the JWT itself
+    'django.contrib.messages.middleware.MessageMiddleware',
+]
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in BROWSER_MIDDLEWARE]
+
+TEMPLATES = [{**TEMPLATES[0], 'OPTIONS': {**TEMPLATES[0]['OPTIONS'], 'context_processors': [
+    processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+    if processor != 'django.contrib.messages.context_processors.messages']}}]
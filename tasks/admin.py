@@ -1,8 +1,7 @@
 from django.contrib import admin
-from django.db.models.aggregates import Count
 from django.utils.text import slugify
 
-from .models import Task, TaskBoard
+from .models import Task, TaskBoard, BoardGuest
 
 
 # Register your models here.
@@ -30,23 +29,39 @@ class TaskInLine(admin.TabularInline):
     show_change_link = True
 
 
+class BoardGuestInLine(admin.TabularInline):
+    model = BoardGuest
+    fields = ['user', 'role', 'joined_at']
+    extra = 0
+    readonly_fields = ['joined_at']
+    autocomplete_fields = ['user']
 
 
 @admin.register(TaskBoard)
 class TaskBoardAdmin(admin.ModelAdmin):
-    fields = ['id', 'title', 'slug', 'visibility', 'owner', 'created_at', 'last_updated', 'tasks_count', 'guests']
-    readonly_fields = ['id', 'slug', 'owner', 'created_at', 'last_updated', 'tasks_count']
-    list_display = ['title', 'slug', 'visibility', 'owner', 'tasks_count']
+    fields = ['id', 'title', 'slug', 'visibility', 'owner', 'created_at', 'last_updated', 'tasks_count',
+              'completed_count', 'overdue_count']
+    readonly_fields = ['id', 'slug', 'owner', 'created_at', 'last_updated', 'tasks_count', 'completed_count',
+                       'overdue_count']
+    list_display = ['title', 'slug', 'visibility', 'owner', 'tasks_count', 'completed_count', 'overdue_count']
     list_filter = ['created_at', 'last_updated']
-    list_select_related = ['owner']
+    list_select_related = ['owner', 'stats']
     search_fields = ['title', 'created_at']
     autocomplete_fields = ['owner']
-    inlines = [TaskInLine]
+    inlines = [BoardGuestInLine, TaskInLine]
 
+    # Read from the board's stats row rather than counting its tasks
+    @admin.display(description='tasks')
     def tasks_count(self, obj):
-        return obj.tasks.count()
+        return obj.get_stats().tasks
+
+    @admin.display(description='completed')
+    def completed_count(self, obj):
+        return obj.get_stats().completed
+
+    @admin.display(description='overdue')
+    def overdue_count(self, obj):
+        return obj.get_stats().overdue
 
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        qs = qs.prefetch_related('tasks').annotate(tasks_count=Count('tasks'))
-        return qs
+        return super().get_queryset(request).select_related('stats')
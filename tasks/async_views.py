@@ -0,0 +1,182 @@
+"""
+Async-native counterparts of the read and create paths of TaskViewSet and TaskBoardViewSet, served under /async/,
+and the live event stream of a board, which only an async view can hold open without tying up a worker thread.
+
+DRF views are synchronous, so under ASGI every request to them hops to a worker thread and back. These are plain
+Django async views that authenticate, check access and query through the async ORM on the event loop, and reuse the
+serializers, pagination and search of the DRF views so both paths return the same representations.
+"""
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound, PermissionDenied, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from accounts.authentication import CachedJWTAuthentication
+from .events import get_broker
+from .models import Task, TaskBoard
+from .pagination import TaskCursorPagination
+from .permissions import aget_task_board, ahas_task_board_access
+from .search import search_tasks
+from .serializers import TaskBoardSerializer, TaskSerializer
+from .views import TaskViewSet, get_board_queryset
+
+
+def api_response(data, status=status.HTTP_200_OK):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def async_api_view(methods):
+    """
+    Turns an async view into a JSON API view like DRF's: only the given methods are allowed, the user is
+    authenticated from the JWT, and authentication, not found and validation errors answer as DRF would.
+    """
+    def decorator(view):
+        @csrf_exempt # Authenticated by the Authorization header, never by cookies
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return api_response({'detail': f'Method "{request.method}" not allowed.'},
+                                    status.HTTP_405_METHOD_NOT_ALLOWED)
+            try:
+                authenticated = await CachedJWTAuthentication().aauthenticate(request)
+                if authenticated is None:
+                    raise NotAuthenticated()
+                request.user = authenticated[0]
+                request.query_params = request.GET # As on DRF requests, for the shared pagination
+                return await view(request, *args, **kwargs)
+            except Http404:
+                return api_response({'detail': NotFound.default_detail}, status.HTTP_404_NOT_FOUND)
+            except APIException as e: # Includes simplejwt's AuthenticationFailed and InvalidToken
+                detail = e.detail if isinstance(e.detail, (list, dict)) else {'detail': e.detail}
+                status_code = status.HTTP_401_UNAUTHORIZED if isinstance(e, NotAuthenticated) else e.status_code
+                return api_response(detail, status_code)
+        return wrapper
+    return decorator
+
+
+def parse_json(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        raise ValidationError({'detail': 'JSON parse error'})
+
+
+async def get_accessible_board(request, board_slug):
+    board = await aget_task_board(request, board_slug)
+    if not await ahas_task_board_access(request, board):
+        raise PermissionDenied()
+    return board
+
+
+@async_api_view(['GET', 'POST'])
+async def task_list(request, board_slug):
+    board = await get_accessible_board(request, board_slug)
+
+    if request.method == 'POST':
+        serializer = TaskSerializer(data=parse_json(request))
+        serializer.is_valid(raise_exception=True)
+        task = Task(**serializer.validated_data, created_by=request.user, task_board=board)
+        await task.asave()
+        return api_response(TaskSerializer(task).data, status.HTTP_201_CREATED)
+
+    queryset = Task.objects.filter(task_board=board).select_related('task_board')
+    query = request.GET.get('search', '')
+    if query.strip():
+        queryset = search_tasks(queryset, query, [board.pk])
+    ordering = request.GET.get('ordering', '')
+    if ordering.lstrip('-') in TaskViewSet.ordering_fields:
+        queryset = queryset.order_by(ordering)
+
+    paginator = TaskCursorPagination()
+    tasks = await paginator.apaginate_queryset(queryset, request)
+    return api_response(paginator.get_paginated_data(TaskSerializer(tasks, many=True).data))
+
+
+@async_api_view(['GET'])
+async def task_detail(request, board_slug, slug):
+    board = await get_accessible_board(request, board_slug)
+    try:
+        task = await Task.objects.select_related('task_board').aget(task_board=board, slug=slug)
+    except Task.DoesNotExist:
+        raise Http404
+    return api_response(TaskSerializer(task).data)
+
+
+@async_api_view(['GET', 'POST'])
+async def board_list(request, username):
+    if request.user.username != username:
+        return redirect(f"/async/{request.user.username}/boards/")
+
+    if request.method == 'POST':
+        serializer = TaskBoardSerializer(data=parse_json(request))
+        serializer.is_valid(raise_exception=True)
+        board = TaskBoard(**serializer.validated_data, owner=request.user)
+        await board.asave()
+        board = await get_board_queryset(request.user).aget(pk=board.pk)
+        return api_response(TaskBoardSerializer(board).data, status.HTTP_201_CREATED)
+
+    boards = [board async for board in get_board_queryset(request.user)]
+    await TaskBoard.aload_missing_stats(boards)
+    return api_response(TaskBoardSerializer(boards, many=True).data)
+
+
+@async_api_view(['GET'])
+async def board_detail(request, username, slug):
+    if request.user.username != username:
+        return redirect(f"/async/{request.user.username}/boards/{slug}/")
+    try:
+        board = await get_board_queryset(request.user).aget(slug=slug)
+    except TaskBoard.DoesNotExist:
+        raise Http404
+    await TaskBoard.aload_missing_stats([board])
+    return api_response(TaskBoardSerializer(board).data)
+
+
+@async_api_view(['GET'])
+async def board_events(request, board_slug):
+    """
+    Server-Sent Events stream of the board's changes, open to whoever TaskBoardAccess lets read the board. Every
+    committed write sends a changes event, {"action": "upsert" or "delete", "ids": [task id, or null for the board]},
+    with ids null for writes too large to list. Clients then read the tasks from the change feed. Access is checked
+    again every SSE_HEARTBEAT_SECONDS and the stream ends once it is revoked.
+    """
+    board = await get_accessible_board(request, board_slug)
+    subscription = await get_broker().subscribe(board.pk)
+    return StreamingHttpResponse(event_stream(request, board.pk, subscription), content_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def event_stream(request, board_id, subscription):
+    try:
+        yield 'retry: 5000\n\n' # Browsers reconnect after 5 seconds if the stream drops
+        checked_at = time.monotonic()
+        while True:
+            message = await subscription.get(timeout=settings.SSE_HEARTBEAT_SECONDS)
+            if time.monotonic() - checked_at >= settings.SSE_HEARTBEAT_SECONDS:
+                if not await has_board_access(request, board_id):
+                    return
+                checked_at = time.monotonic()
+            if message is None:
+                yield ': heartbeat\n\n'
+            else:
+                yield f'event: changes\ndata: {json.dumps(message)}\n\n'
+    finally:
+        await subscription.close()
+
+
+async def has_board_access(request, board_id):
+    """Checks access to the board again, without the per-request board and role cached when the stream opened."""
+    request._task_board = request._task_board_role = None
+    try:
+        board = await TaskBoard.objects.aget(pk=board_id)
+    except TaskBoard.DoesNotExist:
+        return False
+    request._task_board = board
+    return await ahas_task_board_access(request, board)
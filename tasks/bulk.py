@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.utils.text import slugify
+from django.utils.timezone import now
+
+from .models import BoardStats, ChangeLogEntry, Task, TaskBoard
+from .search import index_tasks
+
+BULK_MAX_ITEMS = 5000 # Per request, across creates, updates and deletes
+BULK_BATCH_SIZE = 1000 # Rows per INSERT or UPDATE statement
+
+
+def create_tasks(task_board, user, items):
+    """
+    Inserts the validated task data as new tasks of task_board, returned in the same order. The tasks get one
+    contiguous block of local_ids, so the board counter is bumped once however many tasks are created.
+    """
+    if not items:
+        return []
+    with transaction.atomic(savepoint=False):
+        first_local_id = task_board.reserve_local_ids(len(items))
+        tasks = []
+        for local_id, data in enumerate(items, start=first_local_id):
+            task = Task(**data, local_id=local_id, created_by=user, task_board=task_board)
+            task.slug = slugify(f"{local_id}-{task.title}")
+            tasks.append(task)
+        Task.objects.bulk_create(tasks, batch_size=BULK_BATCH_SIZE)
+
+        if tasks[0].pk is None:
+            # MySQL does not return the inserted ids, read them back through the (task_board, local_id) index
+            ids = dict(Task.objects.filter(task_board=task_board, local_id__gte=first_local_id,
+                                           local_id__lt=first_local_id + len(tasks))
+                       .values_list('local_id', 'id'))
+            for task in tasks:
+                task.pk = ids[task.local_id]
+        index_tasks(tasks, created=True) # bulk_create sends no post_save
+        ChangeLogEntry.record((task_board.pk, task.pk) for task in tasks)
+        BoardStats.apply((task_board.pk, None, task.get_stats_state()) for task in tasks)
+    return tasks
+
+
+def update_tasks(updates):
+    """
+    Applies validated data to tasks loaded from the database, given as (task, data) pairs, and writes them with
+    bulk_update. Only the columns that changed on some task are written and untouched tasks are skipped.
+    """
+    changed_tasks, changed_fields, reindex = [], set(), []
+    updated_at = now()
+    for task, data in updates:
+        for field, value in data.items():
+            setattr(task, field, value)
+        task.refresh_derived_fields()
+        dirty_fields = task.get_dirty_fields()
+        if dirty_fields:
+            task.updated_at = updated_at # bulk_update does not apply auto_now
+            changed_tasks.append(task)
+            changed_fields.update(dirty_fields)
+        if {'title', 'description'} & set(dirty_fields):
+            reindex.append(task)
+    if not changed_tasks:
+        return [task for task, _ in updates]
+
+    with transaction.atomic(savepoint=False):
+        Task.objects.bulk_update(changed_tasks, sorted(changed_fields | {'updated_at'}), batch_size=BULK_BATCH_SIZE)
+        index_tasks(reindex) # bulk_update sends no post_save either
+        TaskBoard.touch({task.task_board_id for task in changed_tasks})
+        ChangeLogEntry.record((task.task_board_id, task.pk) for task in changed_tasks)
+        BoardStats.apply((task.task_board_id, task.get_stats_state(loaded=True), task.get_stats_state())
+                         for task in changed_tasks)
+    for task in changed_tasks:
+        task._snapshot()
+    return [task for task, _ in updates]
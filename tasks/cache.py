@@ -0,0 +1,237 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+BOARD_VERSION_KEY = 'tasks:board:{}:version'
+PUBLIC_BOARD_KEY = 'tasks:board:slug:{}:public' # The id of a public board, read by the public tier before any query
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def get_response_cache_stats():
+    """Hits, misses and errors of the response cache in this process since it started."""
+    with _stats_lock:
+        return {'hits': _stats['hit'], 'misses': _stats['miss'], 'errors': _stats['error']}
+
+
+def get_board_version(board_id):
+    """Returns the board's cache version, the part of every cached response key that writes to the board change."""
+    key = BOARD_VERSION_KEY.format(board_id)
+    version = cache.get(key)
+    if version is None:
+        # Seeded from the clock rather than 1, so a version lost to eviction never returns to a number that still has
+        # responses cached under it
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_board_versions(board_ids):
+    """
+    Moves the given boards to a new version, orphaning their cached responses. Bumped once right away, so the
+    writing request and tests see it, and once more on commit: a reader that cached the old rows under the first
+    bump's version in between is orphaned by the second.
+    """
+    board_ids = list(board_ids)
+    _bump(board_ids)
+    transaction.on_commit(lambda: _bump(board_ids))
+
+
+def _bump(board_ids):
+    for board_id in board_ids:
+        try:
+            cache.incr(BOARD_VERSION_KEY.format(board_id))
+        except ValueError:
+            pass # No version yet, so nothing is cached for the board
+        except Exception:
+            # Cached responses of the board can be stale for up to RESPONSE_CACHE_TIMEOUT
+            logger.warning('Could not bump the cache version of board %s', board_id, exc_info=True)
+
+
+def evict_public_board(slug):
+    """
+    Stops the public tier from answering for the board at once, rather than when its responses expire. Dropped right
+    away and again on commit, like the version bumps, in case a reader stored the slug in between.
+    """
+    _evict(slug)
+    transaction.on_commit(lambda: _evict(slug))
+
+
+def _evict(slug):
+    try:
+        cache.delete(PUBLIC_BOARD_KEY.format(slug))
+    except Exception:
+        # The version bump of the same save still keeps the board's public responses from being served
+        logger.warning('Could not evict public board %s from the cache', slug, exc_info=True)
+
+
+@receiver(post_save, sender='tasks.TaskBoard')
+@receiver(post_delete, sender='tasks.TaskBoard')
+def invalidate_saved_board(sender, instance, signal, **kwargs):
+    bump_board_versions([instance.pk])
+    if signal is post_delete or instance.visibility != instance.VISIBILITY_PUBLIC:
+        evict_public_board(instance.slug)
+
+
+class ResponseCacheMixin:
+    """
+    Read-through cache of serialised list and retrieve responses, consulted after the permission checks so every
+    viewer still goes through the visibility and guest rules. Views implement get_cache_scope(), returning the
+    values the response depends on, such as board versions, or None to bypass the cache. Responses carry an X-Cache
+    header saying whether they came from the cache.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+    def get_cache_scope(self):
+        return None
+
+    def get_cache_key(self, request, scope):
+        key = '|'.join(str(part) for part in (self.basename, self.action, request.get_full_path(), *scope))
+        return f'tasks:response:{hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()}'
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        try:
+            scope = self.get_cache_scope()
+            key = self.get_cache_key(request, scope) if scope is not None else None
+            data = cache.get(key) if key else None
+        except Exception:
+            # The cache is an optimisation, an unreachable Redis must not take the API down with it
+            logger.warning('Response cache unavailable', exc_info=True)
+            _record('error')
+            key = None
+        if key is None:
+            return handler(request, *args, **kwargs)
+
+        if data is not None:
+            _record('hit')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _record('miss')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            try:
+                cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+            except Exception:
+                logger.warning('Could not store a response in the cache', exc_info=True)
+                _record('error')
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class PublicResponseCacheMixin:
+    """
+    Shared tier in front of the permission checks for list and retrieve requests on public boards, whose responses
+    are the same for every authenticated user. A hit costs no query at all: the board id is read from the cache by
+    slug and the stored response is served only while the board is still at the cache version read before the board
+    was loaded, so any write to the board or its tasks, making it private included, retires it. Making a board
+    private or deleting it also evicts its slug, so the tier stops answering for it right away. Misses go through
+    the permission checks and the views' own caching as usual. Views name the URL kwarg holding the board slug in
+    public_board_kwarg, and override get_public_board() if their board is not the one the permission checks resolve.
+    """
+    public_board_kwarg = 'board_slug'
+
+    def check_permissions(self, request):
+        self.public_response, self.public_version = None, None
+        if self.action in ('list', 'retrieve') and request.user.is_authenticated:
+            self.public_response = self.get_public_response(request)
+        if self.public_response is None:
+            super().check_permissions(request)
+
+    def list(self, request, *args, **kwargs):
+        return self.public_cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.public_cached_response(request, super().retrieve, *args, **kwargs)
+
+    def get_public_board(self):
+        from .permissions import get_task_board # The permissions import the models, which import this module
+        return get_task_board(self.request, self.kwargs.get(self.public_board_kwarg))
+
+    def get_public_cache_key(self, request):
+        # The stored ETag covers the renderer, so the format is part of the key even though the data is not
+        key = '|'.join((self.basename, self.action, request.get_full_path(), request.accepted_renderer.format))
+        return f'tasks:public:{hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()}'
+
+    def get_public_response(self, request):
+        board_key = PUBLIC_BOARD_KEY.format(self.kwargs.get(self.public_board_kwarg))
+        key = self.get_public_cache_key(request)
+        try:
+            found = cache.get_many([board_key, key])
+            board_id = found.get(board_key)
+            if board_id is None:
+                return None
+            # Read before the permission checks load the board, see bump_board_versions for why the order matters
+            self.public_version = version = get_board_version(board_id)
+        except Exception:
+            logger.warning('Response cache unavailable', exc_info=True)
+            _record('error')
+            return None
+        entry = found.get(key)
+        if entry is None or entry['version'] != version:
+            return None
+
+        _record('hit')
+        response = get_conditional_response(request, etag=entry['etag'], last_modified=entry['last_modified'])
+        if response is None:
+            response = Response(entry['data'])
+            response['X-Cache'] = 'HIT'
+            if entry['etag']:
+                response['ETag'] = entry['etag']
+            if entry['last_modified']:
+                response['Last-Modified'] = http_date(entry['last_modified'])
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def public_cached_response(self, request, handler, *args, **kwargs):
+        if self.public_response is not None:
+            return self.public_response
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and getattr(response, 'data', None) is not None:
+            self.store_public_response(request, response)
+        return response
+
+    def store_public_response(self, request, response):
+        board = self.get_public_board()
+        if board.visibility != board.VISIBILITY_PUBLIC:
+            return
+        try:
+            if self.public_version is None:
+                # Nothing can be stored without a version read before the board was loaded, the next read will
+                cache.set(PUBLIC_BOARD_KEY.format(board.slug), board.pk, timeout=None)
+                return
+            last_modified = response.get('Last-Modified')
+            cache.set(self.get_public_cache_key(request), {
+                'version': self.public_version,
+                'etag': response.get('ETag'),
+                'last_modified': parse_http_date(last_modified) if last_modified else None,
+                'data': response.data,
+            }, settings.RESPONSE_CACHE_TIMEOUT)
+        except Exception:
+            logger.warning('Could not store a public response in the cache', exc_info=True)
+            _record('error')
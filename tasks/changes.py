@@ -0,0 +1,106 @@
+from datetime import timedelta
+from itertools import takewhile
+
+from django.db.models import Max, Min
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from .models import ChangeLogEntry, Task, TaskBoard
+
+CHANGE_FEED_PAGE_SIZE = 500 # Log entries read per feed request
+PRUNE_BATCH_SIZE = 10_000
+SETTLE_SECONDS = 60 # Longer than any write transaction stays open after recording its changes
+
+
+class CursorExpired(Exception):
+    """The entries after the cursor were pruned, the client has to download the board again."""
+
+
+# Board saves and deletes hold the board row themselves, as ChangeLogEntry requires
+@receiver(post_save, sender=TaskBoard)
+def record_saved_board(sender, instance, **kwargs):
+    ChangeLogEntry.record([(instance.pk, None)])
+
+
+@receiver(post_delete, sender=TaskBoard)
+def record_deleted_board(sender, instance, **kwargs):
+    ChangeLogEntry.record([(instance.pk, None)], ChangeLogEntry.ACTION_DELETE)
+
+
+def get_current_cursor(task_board):
+    """
+    The cursor a client takes before downloading the board in full, so no change made during the download is missed,
+    and the one a client in sync moves to. It is the newest of the board's own entries and of the entries of every
+    board that are older than SETTLE_SECONDS. Skipping the board's own entries is safe: an uncommitted write to it
+    holds the board row, so its entry will be newer than all of them. Skipping other boards' entries is safe once no
+    write of this board can still commit an older id, which the settle delay guarantees. Moving past them is what
+    keeps the cursor of a quiet board from falling behind the pruned log.
+    """
+    latest = ChangeLogEntry.objects.filter(task_board=task_board).aggregate(latest=Max('id'))['latest']
+    # Reads back from the newest entry, through the last SETTLE_SECONDS of the log only
+    settled = (ChangeLogEntry.objects.filter(created_at__lt=now() - timedelta(seconds=SETTLE_SECONDS))
+               .order_by('-id').values_list('id', flat=True).first())
+    if latest is not None or settled is not None:
+        return max(cursor for cursor in (latest, settled) if cursor is not None)
+    oldest = ChangeLogEntry.objects.aggregate(oldest=Min('id'))['oldest']
+    return oldest - 1 if oldest is not None else 0
+
+
+def read_changes(task_board, since, limit=None):
+    """
+    Returns (changes, cursor, has_more) for the board's log entries after the since cursor. changes holds one
+    (action, task id, task) tuple per changed task in the order of its latest change, the task id is None for
+    changes to the board itself and task is None for deletes. Raises CursorExpired if since is older than the log.
+    """
+    limit = limit or CHANGE_FEED_PAGE_SIZE
+    oldest = ChangeLogEntry.objects.aggregate(oldest=Min('id'))['oldest'] # The primary key's first entry
+    if oldest is not None and since < oldest - 1:
+        raise CursorExpired
+
+    entries = list(ChangeLogEntry.objects.filter(task_board=task_board, id__gt=since)
+                   .order_by('id').values_list('id', 'task_id', 'action')[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        # In sync, so the cursor moves up with the log, or after CHANGE_LOG_RETENTION_DAYS it would expire
+        return [], max(since, get_current_cursor(task_board)), False
+
+    # Only the latest change of each task matters, a task edited many times is sent once
+    latest_actions = {}
+    for _, task_id, action in entries:
+        latest_actions.pop(task_id, None)
+        latest_actions[task_id] = action
+    upserted_ids = [task_id for task_id, action in latest_actions.items()
+                    if task_id is not None and action == ChangeLogEntry.ACTION_UPSERT]
+    tasks = Task.objects.filter(task_board=task_board).select_related('task_board').in_bulk(upserted_ids)
+
+    changes = []
+    for task_id, action in latest_actions.items():
+        if task_id is not None and action == ChangeLogEntry.ACTION_UPSERT:
+            if task_id not in tasks:
+                continue # Deleted since, its tombstone follows on a later page
+            changes.append((action, task_id, tasks[task_id]))
+        else:
+            changes.append((action, task_id, None))
+    return changes, entries[-1][0], has_more
+
+
+def prune_change_log(before):
+    """
+    Deletes the entries created before the given time in batches of primary keys, always keeping the newest entry
+    so the log's oldest id keeps expiring cursors correctly. Returns the number of entries deleted.
+    """
+    newest = ChangeLogEntry.objects.aggregate(newest=Max('id'))['newest']
+    if newest is None:
+        return 0
+    deleted = 0
+    while True:
+        # The oldest entries come first on the primary key, so every batch reads only rows it deletes
+        batch = list(ChangeLogEntry.objects.filter(id__lt=newest).order_by('id')
+                     .values_list('id', 'created_at')[:PRUNE_BATCH_SIZE])
+        expired = [entry_id for entry_id, _ in takewhile(lambda entry: entry[1] < before, batch)]
+        if expired:
+            deleted += ChangeLogEntry.objects.filter(id__lte=expired[-1]).delete()[0]
+        if len(expired) < PRUNE_BATCH_SIZE:
+            return deleted
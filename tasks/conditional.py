@@ -0,0 +1,55 @@
+import hashlib
+import time
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    Answers list and retrieve requests with 304 Not Modified while the client's If-None-Match or If-Modified-Since
+    still match, before the queryset runs or anything is serialised.
+
+    Views implement get_validators(), returning (last_modified, parts) where last_modified is when the response last
+    changed and parts are any other values the response depends on, or None when there is nothing to validate. It
+    runs after the permission checks, so validators never leak to clients without access. Last-Modified is left out
+    while last_modified is within the current second.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
+
+    def get_validators(self):
+        return None
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        validators = self.validators = self.get_validators() # Kept for the rest of the request, see ResponseCacheMixin
+        if validators is None:
+            return handler(request, *args, **kwargs)
+
+        last_modified, parts = validators
+        etag = self.get_etag(request, last_modified, parts)
+        timestamp = int(last_modified.timestamp()) # HTTP dates only have second precision
+        if timestamp >= int(time.time()):
+            # Another change within this second would leave the date unchanged, only the ETag can validate it
+            timestamp = None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        # Responses are per user, shared caches must not store them and clients must revalidate every time
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_etag(self, request, last_modified, parts):
+        """The query string and renderer are part of the tag, pages and formats of one resource differ."""
+        key = '|'.join(str(part) for part in (request.get_full_path(), request.accepted_renderer.format,
+                                              last_modified.isoformat(), *parts))
+        return quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
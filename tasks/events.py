@@ -0,0 +1,192 @@
+"""
+Live board events. Every change recorded in the change log is announced on its board's channel once committed, and
+the board's Server-Sent Events stream relays the announcements to connected clients, which then read the task data
+from the change feed. The broker is chosen by the BOARD_EVENTS setting: Redis pub/sub across processes, or an
+in-memory broker for tests and single-process servers.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'tasks:board:{}:events'
+MAX_EVENT_CHANGES = 100 # Larger writes are announced without their ids, clients read them from the change feed
+
+
+class Subscription:
+    """One event stream's subscription to a board, the queue its broker delivers the board's messages to."""
+
+    def __init__(self, queue, on_close):
+        self.queue, self.on_close = queue, on_close
+
+    async def get(self, timeout):
+        """Waits up to timeout seconds for the next message, None if there was none."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        await self.on_close()
+
+
+class InMemoryBroker:
+    """Delivers events to the subscribers in this process only."""
+
+    def __init__(self, **options):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, board_id, message):
+        with self._lock:
+            subscribers = list(self._subscribers[board_id])
+        for loop, queue in subscribers:
+            # Publishers run in request threads, the subscribers' queues belong to their event loops
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+
+    async def subscribe(self, board_id):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[board_id].add(subscriber)
+
+        async def close():
+            with self._lock:
+                self._subscribers[board_id].discard(subscriber)
+        return Subscription(subscriber[1], close)
+
+
+class RedisBroker:
+    """
+    Delivers events through Redis pub/sub, to the subscribers of every server process. However many streams a
+    process serves, it holds one pub/sub connection per event loop, see RedisHub.
+    """
+
+    def __init__(self, location, **options):
+        self.location = location
+        self.client = redis.Redis.from_url(location)
+        self.hubs = {}
+
+    def publish(self, board_id, message):
+        self.client.publish(CHANNEL.format(board_id), json.dumps(message))
+
+    async def subscribe(self, board_id):
+        loop = asyncio.get_running_loop()
+        hub = self.hubs.get(loop)
+        if hub is None:
+            hub = self.hubs[loop] = RedisHub(self, loop)
+        return await hub.subscribe(board_id)
+
+
+class RedisHub:
+    """
+    The pub/sub connection of one event loop. It is subscribed to the channels of the boards streamed in the loop,
+    and one reader task fans their messages out to the queues of the streams. The connection opens with the first
+    stream and closes with the last.
+    """
+
+    def __init__(self, broker, loop):
+        self.broker, self.loop = broker, loop
+        self.client = redis.asyncio.Redis.from_url(broker.location)
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self.queues = {} # Channel name to the queues of its subscribers
+        self.lock = asyncio.Lock()
+        self.reader = None
+        self.closed = False
+
+    async def subscribe(self, board_id):
+        channel = CHANNEL.format(board_id)
+        queue = asyncio.Queue()
+        async with self.lock:
+            if self.closed:
+                # The last stream closed the hub while this one waited for the lock
+                return await self.broker.subscribe(board_id)
+            if channel not in self.queues:
+                await self.pubsub.subscribe(channel)
+                self.queues[channel] = set()
+            self.queues[channel].add(queue)
+            if self.reader is None:
+                self.reader = asyncio.create_task(self.read())
+        return Subscription(queue, lambda: self.unsubscribe(channel, queue))
+
+    async def unsubscribe(self, channel, queue):
+        async with self.lock:
+            queues = self.queues[channel]
+            queues.discard(queue)
+            if queues:
+                return
+            del self.queues[channel]
+            if self.queues:
+                await self.pubsub.unsubscribe(channel)
+                return
+            self.closed = True
+            del self.broker.hubs[self.loop]
+            self.reader.cancel()
+            try:
+                await self.reader
+            except asyncio.CancelledError:
+                pass
+            await self.pubsub.aclose()
+            await self.client.aclose()
+
+    async def read(self):
+        while True:
+            try:
+                message = await self.pubsub.get_message(timeout=None)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # redis-py reconnects and subscribes again on the next read, streams catch up from the change feed
+                logger.warning('Board events connection lost, reconnecting', exc_info=True)
+                await asyncio.sleep(1)
+                continue
+            if message is None:
+                continue
+            data = json.loads(message['data'])
+            for queue in self.queues.get(message['channel'].decode(), ()):
+                queue.put_nowait(data)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    options = dict(settings.BOARD_EVENTS)
+    return import_string(options.pop('BACKEND'))(**{key.lower(): value for key, value in options.items()})
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    if setting == 'BOARD_EVENTS':
+        get_broker.cache_clear()
+
+
+def publish_changes(changes, action):
+    """
+    Announces (task_board_id, task_id) changes on their boards' channels once the surrounding transaction commits,
+    one message per board. A task_id of None stands for the board itself, as in the change log.
+    """
+    task_ids = defaultdict(list)
+    for task_board_id, task_id in changes:
+        task_ids[task_board_id].append(task_id)
+    transaction.on_commit(lambda: _publish(task_ids, action))
+
+
+def _publish(task_ids, action):
+    broker = get_broker()
+    for task_board_id, ids in task_ids.items():
+        message = {'action': action, 'ids': ids if len(ids) <= MAX_EVENT_CHANGES else None}
+        try:
+            broker.publish(task_board_id, message)
+        except Exception:
+            # Subscribers miss the event, they catch up from the change feed on their next event or reconnect
+            logger.warning('Could not publish an event for board %s', task_board_id, exc_info=True)
@@ -0,0 +1,56 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Task
+
+EXPORT_FIELDS = ('local_id', 'slug', 'title', 'description', 'created_at', 'deadline', 'priority', 'completed',
+                 'reminder_notification', 'created_by')
+EXPORT_BATCH_SIZE = 2000
+
+
+def iter_task_rows(task_board, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yields the tasks of a board as dicts of EXPORT_FIELDS in local_id order. Rows are read in batches that seek
+    past the last local_id on the (task_board, local_id) index, so memory stays bound by the batch size however
+    large the board is. A plain .iterator() would not bound it on MySQL, whose client buffers the whole result.
+    """
+    queryset = Task.objects.filter(task_board=task_board).order_by('local_id').values(*EXPORT_FIELDS)
+    last_local_id = 0
+    while True:
+        batch = list(queryset.filter(local_id__gt=last_local_id)[:batch_size])
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        last_local_id = batch[-1]['local_id']
+
+
+def ndjson_lines(rows):
+    """Renders rows as newline delimited JSON, one task per line."""
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+class _LineBuffer:
+    """File-like object for csv.writer that hands each written line back instead of storing it."""
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """Renders rows as CSV with a header line, datetimes in the same ISO 8601 format as the JSON output."""
+    writer = csv.writer(_LineBuffer())
+    encoder = DjangoJSONEncoder()
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([encoder.default(value) if hasattr(value, 'isoformat') else value
+                               for value in row.values()])
+
+
+EXPORT_FORMATS = {
+    # output: (renderer, content type, file extension)
+    'ndjson': (ndjson_lines, 'application/x-ndjson', 'ndjson'),
+    'csv': (csv_lines, 'text/csv', 'csv'),
+}
@@ -0,0 +1,16 @@
+from django_filters import rest_framework as filters
+
+from .models import Task
+
+
+class TaskFeedFilter(filters.FilterSet):
+    """Filters of the cross-board task feed, e.g. ?completed=false&priority=H&priority=M&deadline_before=..."""
+    completed = filters.BooleanFilter()
+    priority = filters.MultipleChoiceFilter(choices=Task.PRIORITY_CHOICES)
+    deadline_after = filters.IsoDateTimeFilter(field_name='deadline', lookup_expr='gte')
+    deadline_before = filters.IsoDateTimeFilter(field_name='deadline', lookup_expr='lte')
+    board = filters.CharFilter(field_name='task_board__slug')
+
+    class Meta:
+        model = Task
+        fields = ['completed', 'priority', 'deadline_after', 'deadline_before', 'board']
@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+import os
+
+from rest_framework.exceptions import ValidationError
+
+from .bulk import create_tasks
+from .serializers import TaskSerializer
+
+IMPORT_BATCH_SIZE = 1000 # Valid rows created per transaction
+IMPORT_MAX_REPORTED_ERRORS = 1000 # Failed rows past this are counted but not listed
+
+
+def read_ndjson(lines):
+    """Yields (line number, row, errors) for each non blank line of newline delimited JSON."""
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None, ['Invalid JSON.']
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, ['Expected a JSON object.']
+            continue
+        yield line_number, row, None
+
+
+def read_csv(lines):
+    """Yields (line number, row, errors) for each CSV record, empty cells are treated as missing values."""
+    reader = csv.DictReader(lines)
+    for record in reader:
+        yield reader.line_num, {field: value for field, value in record.items() if field and value}, None
+
+
+IMPORT_READERS = {
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+}
+
+
+def guess_import_format(filename):
+    return 'csv' if os.path.splitext(filename or '')[1].lower() == '.csv' else 'ndjson'
+
+
+def import_tasks(task_board, user, file, input_format, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Creates tasks on task_board from a binary NDJSON or CSV file, read one line at a time. Rows go through
+    TaskSerializer's field rules and deadline validation, and valid rows are created in batches of batch_size, each
+    in its own transaction. Memory use is bound by the batch size whatever the size of the file.
+
+    Returns a report of the imported and failed row counts, with the errors of the failed rows by line number. A
+    file that is not UTF-8 raises UnicodeDecodeError with nothing created, unless batches were already created:
+    then the rows read so far are created and the first line left unread is reported as failed.
+    """
+    serializer = TaskSerializer()
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+    batch = []
+    lines = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    line_number = 0
+    try:
+        for line_number, row, errors in IMPORT_READERS[input_format](lines):
+            if errors is None:
+                try:
+                    batch.append(serializer.run_validation(row))
+                except ValidationError as e:
+                    errors = e.detail
+            if errors is not None:
+                report['failed'] += 1
+                if len(report['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+                    report['errors'].append({'line': line_number, 'errors': errors})
+
+            if len(batch) >= batch_size:
+                report['imported'] += len(create_tasks(task_board, user, batch))
+                batch = []
+    except UnicodeDecodeError:
+        if not report['imported']:
+            raise
+        # Decoding goes a chunk at a time, so the undecodable bytes are on this line or one shortly after it
+        report['failed'] += 1
+        report['errors'].append({'line': line_number + 1,
+                                 'errors': ['The file is not UTF-8 encoded from here, the rest was not imported.']})
+    finally:
+        lines.detach() # Leave closing the underlying file to its owner
+    if batch:
+        report['imported'] += len(create_tasks(task_board, user, batch))
+    return report
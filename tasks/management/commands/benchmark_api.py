@@ -0,0 +1,104 @@
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from tasks.bulk import create_tasks
+from tasks.models import TaskBoard
+
+BENCHMARK_USERNAME = 'api-benchmark'
+
+
+class Command(BaseCommand):
+    help = ('Load tests the task API against a running server, comparing the DRF views with their async counterparts '
+            'under /async/. Start the server first, e.g. "uvicorn taskly.asgi:application --workers 4" for the ASGI '
+            'path or "gunicorn taskly.wsgi --workers 4" for the WSGI one, against the same database this command '
+            'uses. Seeded rows are removed afterwards unless --keep is passed. Never run it against production.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='Root URL of the running server.')
+        parser.add_argument('--tasks', type=int, default=500, help='Number of tasks to seed on the board.')
+        parser.add_argument('--concurrency', type=int, default=32, help='Simultaneous client connections.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint.')
+        parser.add_argument('--paths', nargs='+', choices=['sync', 'async'], default=['sync', 'async'])
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded board for further runs.')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['base_url'])
+        if url.scheme not in ('http', 'https') or not url.netloc:
+            raise CommandError(f"Invalid --base-url {options['base_url']}")
+
+        user, board = self.seed(options['tasks'])
+        headers = {'Authorization': f'JWT {AccessToken.for_user(user)}'}
+        endpoints = {
+            'sync': [f'/boards/{board.slug}/tasks/', f'/{user.username}/boards/'],
+            'async': [f'/async/boards/{board.slug}/tasks/', f'/async/{user.username}/boards/'],
+        }
+        try:
+            for path_kind in options['paths']:
+                for path in endpoints[path_kind]:
+                    self.run(url, path, headers, options)
+        finally:
+            if not options['keep']:
+                self.cleanup(user)
+
+    def seed(self, count):
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME,
+                                             defaults={'email': f'{BENCHMARK_USERNAME}@taskly.com'})
+        board = TaskBoard.objects.filter(owner=user).first()
+        if board is None:
+            board = TaskBoard.objects.create(title='API benchmark', owner=user)
+            create_tasks(board, user, [{'title': f'Benchmark task {number}'} for number in range(count)])
+        return user, board
+
+    def run(self, url, path, headers, options):
+        """Sends --requests GETs to path from --concurrency threads, each holding one keep-alive connection."""
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        latencies, failures = [], []
+        lock = threading.Lock()
+        remaining = iter(range(options['requests']))
+
+        def client():
+            connection = connection_class(url.netloc, timeout=30)
+            timings, failed = [], 0
+            while next(remaining, None) is not None:
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        failed += 1
+                except (OSError, http.client.HTTPException):
+                    failed += 1
+                    connection.close()
+                    connection = connection_class(url.netloc, timeout=30)
+                timings.append((time.perf_counter() - started) * 1000)
+            connection.close()
+            with lock:
+                latencies.extend(timings)
+                failures.append(failed)
+
+        threads = [threading.Thread(target=client) for _ in range(options['concurrency'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(self.style.SUCCESS(
+            f'{path}: {len(latencies) / elapsed:.1f} req/s, p50 {percentiles[49]:.1f}ms, '
+            f'p95 {percentiles[94]:.1f}ms, p99 {percentiles[98]:.1f}ms, {sum(failures)} failed'))
+
+    def cleanup(self, user):
+        self.stdout.write('Removing the seeded board...')
+        TaskBoard.objects.filter(owner=user).delete()
+        user.delete()
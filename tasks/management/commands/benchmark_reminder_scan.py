@@ -0,0 +1,89 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+
+from tasks.models import Task, TaskBoard
+
+BENCHMARK_USERNAME = 'reminder-scan-benchmark'
+
+
+class Command(BaseCommand):
+    help = ('Seeds a large number of tasks and times the hourly reminder scan against them, printing the query plan '
+            'so you can check it is an index range scan. Seeded rows are removed afterwards unless --keep is passed. '
+            'Run it against a development database, never production.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=2_000_000, help='Number of tasks to seed.')
+        parser.add_argument('--tasks-per-board', type=int, default=50_000)
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows per bulk_create.')
+        parser.add_argument('--due-ratio', type=float, default=0.01,
+                            help='Share of tasks due within the next 24 hours.')
+        parser.add_argument('--runs', type=int, default=20, help='Number of timed scans.')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded tasks for further runs.')
+
+    def handle(self, *args, **options):
+        user = self.get_benchmark_user()
+        seeded = Task.objects.filter(created_by=user).count()
+        if seeded < options['tasks']:
+            self.seed(user, options['tasks'] - seeded, options)
+
+        queryset = Task.pending_reminders()
+        self.stdout.write(queryset.explain())
+
+        timings = []
+        for _ in range(options['runs']):
+            started = time.perf_counter()
+            due = len(queryset.values_list('id', flat=True))
+            timings.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {options['tasks']} tasks, {due} due: median {statistics.median(timings):.2f}ms, "
+            f"max {max(timings):.2f}ms over {options['runs']} runs"))
+
+        if not options['keep']:
+            self.cleanup(user)
+
+    def get_benchmark_user(self):
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME,
+                                             defaults={'email': f'{BENCHMARK_USERNAME}@taskly.com'})
+        return user
+
+    def seed(self, user, count, options):
+        """Bulk inserts count tasks, mostly far-off, completed or already reminded, like a real table."""
+        self.stdout.write(f'Seeding {count} tasks...')
+        current_time = now()
+        created = 0
+        while created < count:
+            board_size = min(options['tasks_per_board'], count - created)
+            board = TaskBoard.objects.create(title='Reminder scan benchmark', owner=user)
+            with transaction.atomic():
+                first_local_id = board.reserve_local_ids(board_size)
+                for offset in range(0, board_size, options['batch_size']):
+                    batch = []
+                    for local_id in range(first_local_id + offset,
+                                          first_local_id + min(offset + options['batch_size'], board_size)):
+                        if random.random() < options['due_ratio']:
+                            deadline = current_time + timedelta(minutes=random.randint(1, 24 * 60))
+                        else:
+                            deadline = current_time + timedelta(days=random.randint(-90, 90), hours=25)
+                        batch.append(Task(
+                            title=f'Benchmark task {local_id}', slug=f'{board.slug}-{local_id}', local_id=local_id,
+                            deadline=deadline, created_by=user, task_board=board,
+                            completed=random.random() < 0.3, reminder_notification=random.random() < 0.2,
+                        ))
+                    Task.objects.bulk_create(batch)
+            created += board_size
+            self.stdout.write(f'  {created}/{count}')
+
+    def cleanup(self, user):
+        self.stdout.write('Removing seeded tasks...')
+        # The tasks go with their boards, bulk inserted tasks were never counted in the stats a task delete updates
+        TaskBoard.objects.filter(owner=user).delete()
+        user.delete()
@@ -0,0 +1,94 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# The stack production ran before taskly/settings/prod.py became a lean profile, which only added DEBUG = False and
+# the secrets to common.py, against the profile itself
+PROFILES = {
+    'current': 'taskly.settings.common',
+    'lean': 'taskly.settings.prod',
+}
+
+# Runs in a fresh interpreter per profile. Startup is measured up to the first response, so it includes loading the
+# apps, the middleware and the URLconf. No database is configured, so the path should be one that answers without
+# one, such as an unauthenticated API request.
+MEASURE = '''
+import io, json, logging, os, sys, time
+started = time.perf_counter()
+from django.conf import settings
+settings.SECRET_KEY = os.environ['SECRET_KEY']
+settings.ALLOWED_HOSTS = ['*']
+from django.core.wsgi import get_wsgi_application
+from wsgiref.util import setup_testing_defaults
+
+path, requests = sys.argv[1], int(sys.argv[2])
+application = get_wsgi_application()
+logging.disable(logging.CRITICAL) # 4xx responses would otherwise be logged, to the console and general.log
+
+def request():
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', 'wsgi.input': io.BytesIO()}
+    setup_testing_defaults(environ)
+    statuses = []
+    body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    b''.join(body)
+    body.close()
+    return statuses[0]
+
+status = request()
+startup = time.perf_counter() - started
+started = time.perf_counter()
+for _ in range(requests):
+    request()
+per_request = (time.perf_counter() - started) / requests
+print(json.dumps({'status': status, 'startup': startup, 'per_request': per_request,
+                  'apps': len(settings.INSTALLED_APPS), 'middleware': len(settings.MIDDLEWARE)}))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Compares the lean production settings profile with the stack production ran before it: the time a fresh '
+            'process takes to load Django and answer its first request, and the time each further request takes '
+            'through the middleware and the view. Each profile is measured in --runs new processes and the medians '
+            'are reported. No database is needed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/tasks/',
+                            help='Path to request, answered without a database query. Defaults to the task feed, '
+                                 'which answers 401 without a token.')
+        parser.add_argument('--requests', type=int, default=2000, help='Timed requests per process.')
+        parser.add_argument('--runs', type=int, default=5, help='Processes started per profile.')
+
+    def handle(self, *args, **options):
+        results = {}
+        for profile, module in PROFILES.items():
+            runs = [self.measure(module, options) for _ in range(options['runs'])]
+            results[profile] = {
+                'status': runs[0]['status'],
+                'startup': statistics.median(run['startup'] for run in runs) * 1000,
+                'per_request': statistics.median(run['per_request'] for run in runs) * 1_000_000,
+            }
+            self.stdout.write(
+                f"{profile} ({module}): {runs[0]['apps']} apps, {runs[0]['middleware']} middleware, "
+                f"startup {results[profile]['startup']:.1f}ms, {results[profile]['per_request']:.1f}us per request, "
+                f"answered {runs[0]['status']}")
+
+        current, lean = results['current'], results['lean']
+        self.stdout.write(self.style.SUCCESS(
+            f"lean vs current: startup {self.change(current['startup'], lean['startup'])}, "
+            f"per request {self.change(current['per_request'], lean['per_request'])}"))
+
+    def measure(self, module, options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': module, 'SECRET_KEY': 'benchmark-only'}
+        process = subprocess.run([sys.executable, '-c', MEASURE, options['path'], str(options['requests'])],
+                                 env=env, cwd=settings.BASE_DIR.parent, capture_output=True, text=True)
+        if process.returncode:
+            raise CommandError(f'Measuring {module} failed:\n{process.stderr}')
+        return json.loads(process.stdout.splitlines()[-1])
+
+    def change(self, before, after):
+        return f'{before:.1f} -> {after:.1f} ({(after - before) / before:+.1%})'
@@ -0,0 +1,44 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.imports import IMPORT_BATCH_SIZE, IMPORT_READERS, guess_import_format, import_tasks
+from tasks.models import TaskBoard
+
+
+class Command(BaseCommand):
+    help = ('Imports tasks into a board from an NDJSON or CSV file, validating and inserting them in batches. '
+            'Rows that fail validation are skipped and reported by line on stderr.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('board', help='Slug of the board to import into.')
+        parser.add_argument('path', help='NDJSON or CSV file to import.')
+        parser.add_argument('--input', choices=list(IMPORT_READERS),
+                            help='Format of the file, guessed from its extension by default.')
+        parser.add_argument('--user', help='Username recorded as the creator of the tasks, the board owner by default.')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Tasks created per transaction.')
+
+    def handle(self, *args, **options):
+        task_board = TaskBoard.objects.select_related('owner').filter(slug=options['board']).first()
+        if task_board is None:
+            raise CommandError(f"Board '{options['board']}' does not exist")
+        user = task_board.owner
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        input_format = options['input'] or guess_import_format(options['path'])
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_tasks(task_board, user, file, input_format, batch_size=options['batch_size'])
+        except (OSError, UnicodeDecodeError) as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+
+        for error in report['errors']:
+            self.stderr.write(f"Line {error['line']}: {json.dumps(error['errors'])}")
+        if report['failed'] > len(report['errors']):
+            self.stderr.write(f"... and {report['failed'] - len(report['errors'])} more failed rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['imported']} tasks into '{task_board.title}', {report['failed']} rows failed"))
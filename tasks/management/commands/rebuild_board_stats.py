@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from tasks.models import BoardStats, TaskBoard
+
+
+class Command(BaseCommand):
+    help = ('Recounts the task stats of every board, e.g. after bulk loading tasks with the ORM bypassed, or an '
+            'outage of the overdue refresh job longer than a day. Run it with --missing once when deploying stats.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Boards recounted per batch.')
+        parser.add_argument('--missing', action='store_true',
+                            help='Only count the boards without stats yet, the boards created before stats were kept.')
+
+    def handle(self, *args, **options):
+        boards = TaskBoard.objects.filter(stats__isnull=True) if options['missing'] else TaskBoard.objects.all()
+        last_id, rebuilt = 0, 0
+        while True:
+            board_ids = list(boards.filter(id__gt=last_id).order_by('id')
+                             .values_list('id', flat=True)[:options['batch_size']])
+            if not board_ids:
+                break
+            BoardStats.rebuild(board_ids)
+            last_id = board_ids[-1]
+            rebuilt += len(board_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the stats of {rebuilt} boards'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from tasks.models import TaskBoard
+
+
+class Command(BaseCommand):
+    help = ('Moves the local_id counter of every board past its highest task local_id. Run it once after deploying '
+            'the counter, creates on boards that already had tasks fail on the (task_board, local_id) constraint '
+            'until it has run, and after loading tasks with the ORM bypassed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Boards updated per batch.')
+
+    def handle(self, *args, **options):
+        last_id, fixed = 0, 0
+        while True:
+            board_ids = list(TaskBoard.objects.filter(id__gt=last_id).order_by('id')
+                             .values_list('id', flat=True)[:options['batch_size']])
+            if not board_ids:
+                break
+            fixed += TaskBoard.rebuild_local_id_counters(board_ids)
+            last_id = board_ids[-1]
+        self.stdout.write(self.style.SUCCESS(f'Fixed the local_id counters of {fixed} boards'))
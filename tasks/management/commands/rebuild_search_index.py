@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from tasks.models import Task
+from tasks.search import index_tasks
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the task search index, e.g. after deploying search or bulk loading tasks with signals bypassed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tasks reindexed per batch.')
+
+    def handle(self, *args, **options):
+        queryset = Task.objects.only('id', 'task_board_id', 'title', 'description').order_by('id')
+        last_id, indexed = 0, 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            index_tasks(batch)
+            last_id = batch[-1].id
+            indexed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} tasks'))
@@ -0,0 +1,192 @@
+"""
+Production instrumentation of the API views. A sampled share of requests, API_METRICS_SAMPLE_RATE, is measured for its
+query count, database time, serialisation time (rendering the response data) and total time. The numbers go back to
+the client as a Server-Timing header and into per-process totals that Prometheus scrapes from /metrics/. Requests
+that are not sampled only pay for one random number.
+"""
+import hmac
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+from .cache import get_response_cache_stats
+
+# Upper bounds in seconds of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FIELDS = ('requests', 'queries', 'db_seconds', 'serialize_seconds', 'seconds')
+
+_views = defaultdict(lambda: {'totals': dict.fromkeys(FIELDS, 0), 'buckets': [0] * len(DURATION_BUCKETS)})
+_views_lock = threading.Lock()
+
+
+class RequestMetrics:
+    """What one sampled request spent, filled in by the database wrapper and the render callbacks."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.render_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper(), so it times every query the request runs
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+    def rendered(self, response):
+        self.serialize_seconds += time.perf_counter() - self.render_started
+
+
+def wrap_queries(metrics):
+    """Times the queries of every database connection of the calling thread until the returned stack is closed."""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(metrics))
+    return stack
+
+
+def get_view_name(request):
+    """ViewSet.action or view class name, the label metrics are grouped by. None for requests no view resolved."""
+    match = request.resolver_match
+    if match is None:
+        return None
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return view.__name__
+    action = (getattr(view, 'actions', None) or {}).get(request.method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+def record(view_name, metrics, seconds):
+    with _views_lock:
+        stats = _views[view_name]
+        totals = stats['totals']
+        totals['requests'] += 1
+        totals['queries'] += metrics.queries
+        totals['db_seconds'] += metrics.db_seconds
+        totals['serialize_seconds'] += metrics.serialize_seconds
+        totals['seconds'] += seconds
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                stats['buckets'][index] += 1
+                break
+
+
+def get_view_metrics():
+    """Totals of the sampled requests of each view in this process since it started."""
+    with _views_lock:
+        return {name: {**stats['totals'], 'buckets': list(stats['buckets'])} for name, stats in _views.items()}
+
+
+class APIMetricsMiddleware:
+    """
+    Measures a sample of the requests that resolve to a view, under WSGI and ASGI alike. Under ASGI the database
+    wrapper is installed from the thread-sensitive executor, the thread every sync view and async ORM call of the
+    request runs its queries in. Streaming responses, such as the event streams, are left out: their time is the
+    stream's lifetime.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= settings.API_METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        metrics = request._api_metrics = RequestMetrics()
+        started = time.perf_counter()
+        with wrap_queries(metrics):
+            response = self.get_response(request)
+        return self.report(request, response, metrics, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.API_METRICS_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        metrics = request._api_metrics = RequestMetrics()
+        started = time.perf_counter()
+        wrappers = await sync_to_async(wrap_queries)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.close)()
+        return self.report(request, response, metrics, time.perf_counter() - started)
+
+    def report(self, request, response, metrics, seconds):
+        view_name = get_view_name(request)
+        if view_name is None or response.streaming:
+            return response
+        record(view_name, metrics, seconds)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.queries} queries"',
+            f'serialize;dur={metrics.serialize_seconds * 1000:.1f}',
+            f'total;dur={seconds * 1000:.1f}',
+        ))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook runs, so rendering is timed from here to the callback
+        metrics = getattr(request, '_api_metrics', None)
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(metrics.rendered)
+        return response
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of the sampled view metrics and the response cache statistics of this process.
+    Each server process keeps its own totals, so scrape every process. Answers 404 unless API_METRICS_TOKEN is set,
+    and then only to requests bearing it.
+    """
+    token = settings.API_METRICS_TOKEN
+    if not token:
+        raise Http404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=403)
+
+    lines = []
+    views = sorted(get_view_metrics().items())
+    for field, kind, help_text in (
+            ('requests', 'counter', 'Sampled requests.'),
+            ('queries', 'counter', 'Database queries run by sampled requests.'),
+            ('db_seconds', 'counter', 'Time sampled requests spent in the database.'),
+            ('serialize_seconds', 'counter', 'Time sampled requests spent rendering their response.')):
+        name = f'taskly_view_{field}_total'
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        lines += [f'{name}{{view="{view}"}} {stats[field]}' for view, stats in views]
+
+    name = 'taskly_view_duration_seconds'
+    lines += [f'# HELP {name} Total time of sampled requests.', f'# TYPE {name} histogram']
+    for view, stats in views:
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+            cumulative += count
+            lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+        lines += [f'{name}_bucket{{view="{view}",le="+Inf"}} {stats["requests"]}',
+                  f'{name}_sum{{view="{view}"}} {stats["seconds"]}',
+                  f'{name}_count{{view="{view}"}} {stats["requests"]}']
+
+    for outcome, count in get_response_cache_stats().items():
+        name = f'taskly_response_cache_{outcome}_total'
+        lines += [f'# TYPE {name} counter', f'{name} {count}']
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,14 +1,21 @@
 from datetime import timedelta
 
+from asgiref.sync import sync_to_async
 from django.core.validators import MaxValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
 from django.utils.text import slugify
 
 import secrets
 
 from django.utils.timezone import now
 
+from tasks.cache import bump_board_versions
+from tasks.events import publish_changes
 from tasks.validators import validate_deadline
 
 
@@ -26,16 +33,144 @@ class TaskBoard(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    guests = models.ManyToManyField(settings.AUTH_USER_MODEL, blank=True, related_name='guests')
+    guests = models.ManyToManyField(settings.AUTH_USER_MODEL, through='BoardGuest', blank=True, related_name='guests')
+    next_local_id = models.PositiveIntegerField(default=1, editable=False) # Counter handing out Task.local_id
     def save(self, *args, **kwargs):
         if not self.slug: # Prevents changing URLs on updates
             self.slug = secrets.token_urlsafe(8)
-        super().save(*args, **kwargs)
+        if self.pk is not None:
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            BoardStats.objects.create(task_board=self)
+
+    def reserve_local_ids(self, count=1):
+        """
+        Reserves count consecutive local_ids and returns the first one.
+        The UPDATE locks the board row until the surrounding transaction ends, so concurrent creates queue on the
+        counter instead of racing on unique_together, and the cost stays the same however many tasks the board has.
+        New tasks change the board's representation, so the same UPDATE also bumps last_updated.
+        """
+        with transaction.atomic(savepoint=False):
+            self.last_updated = now()
+            TaskBoard.objects.filter(pk=self.pk).update(next_local_id=F('next_local_id') + count,
+                                                        last_updated=self.last_updated)
+            self.next_local_id = TaskBoard.objects.values_list('next_local_id', flat=True).get(pk=self.pk)
+            bump_board_versions([self.pk])
+        return self.next_local_id - count
+
+    @classmethod
+    def rebuild_local_id_counters(cls, board_ids):
+        """
+        Moves the local_id counters of the given boards past their highest task local_id, for boards whose tasks were
+        numbered before the counter existed or loaded with the ORM bypassed. Counters are only ever raised, one UPDATE
+        for all the boards. Returns the number of boards fixed.
+        """
+        highest = Subquery(Task.objects.filter(task_board=OuterRef('pk')).order_by().values('task_board')
+                           .annotate(highest=Max('local_id')).values('highest'))
+        return (cls.objects.filter(pk__in=board_ids, next_local_id__lte=highest)
+                .update(next_local_id=highest + 1))
+
+    @classmethod
+    def touch(cls, board_ids):
+        """
+        Bumps last_updated, the validator for conditional GETs of the boards and their tasks, with one UPDATE, and
+        the boards' response cache versions. Needed wherever tasks or guests change without a board save.
+        """
+        board_ids = list(board_ids)
+        updated = cls.objects.filter(pk__in=board_ids).update(last_updated=now())
+        bump_board_versions(board_ids)
+        return updated
+
+    def get_stats(self):
+        """
+        The board's BoardStats, select_related by the board views. Boards from before stats are recounted once here,
+        until rebuild_board_stats --missing has filled them all in.
+        """
+        try:
+            return self.stats
+        except BoardStats.DoesNotExist:
+            BoardStats.rebuild([self.pk])
+            self.stats = BoardStats.objects.get(task_board=self)
+            return self.stats
+
+    @staticmethod
+    async def aload_missing_stats(boards):
+        """
+        For async views, recounts the stats get_stats() would otherwise recount synchronously, of boards loaded with
+        select_related('stats') whose stats row is missing because rebuild_board_stats --missing was never run.
+        """
+        missing = {board.pk: board for board in boards if not hasattr(board, 'stats')}
+        if not missing:
+            return
+        await sync_to_async(BoardStats.rebuild)(missing)
+        async for stats in BoardStats.objects.filter(task_board_id__in=missing):
+            missing[stats.task_board_id].stats = stats
+
+    def get_guest_role(self, user):
+        """Returns the guest's BoardGuest role, or None if user is not a guest. One lookup on the unique index."""
+        if not user.is_authenticated:
+            return None
+        return self.memberships.filter(user_id=user.pk).values_list('role', flat=True).first()
+
+    async def aget_guest_role(self, user):
+        """get_guest_role for async views."""
+        if not user.is_authenticated:
+            return None
+        return await self.memberships.filter(user_id=user.pk).values_list('role', flat=True).afirst()
+
+    def has_guest(self, user):
+        """Checks guest membership with an EXISTS on the unique index rather than loading every guest."""
+        if not user.is_authenticated:
+            return False
+        return self.memberships.filter(user_id=user.pk).exists()
 
     def __str__(self):
         return self.title
 
 
+class BoardGuest(models.Model):
+    """Through model for TaskBoard.guests, records what a guest may do and when they joined."""
+    ROLE_EDITOR = 'E'
+    ROLE_VIEWER = 'V'
+    ROLE_CHOICES = [
+        (ROLE_EDITOR, 'Editor'),
+        (ROLE_VIEWER, 'Viewer'),
+    ]
+    task_board = models.ForeignKey(TaskBoard, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='board_memberships')
+    role = models.CharField(max_length=1, choices=ROLE_CHOICES, default=ROLE_EDITOR)
+    joined_at = models.DateTimeField(auto_now_add=True)
+    invitation_sent_at = models.DateTimeField(null=True, blank=True) # Claimed by the invitation email job
+
+    class Meta:
+        unique_together = ('task_board', 'user') # Also the index every membership check runs on
+        indexes = [
+            # The boards a user guests on, read by the cross-board task feed without touching the table
+            models.Index(fields=['user', 'task_board'], name='board_guest_user_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} on {self.task_board}'
+
+
+class TaskQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        Deletes through Task.delete_tasks, so bulk deletes, the admin's "delete selected" action included, keep the
+        boards' stats, change logs and caches right like Task.delete() does.
+        """
+        if self.query.is_sliced:
+            raise TypeError("Cannot use 'limit' or 'offset' with delete().")
+        tasks = (self.select_related(None).prefetch_related(None)
+                 .only('task_board_id', 'completed', 'priority', 'deadline'))
+        return Task.delete_tasks(list(tasks))
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Task(models.Model):
     PRIORITY_LOW = 'L'
     PRIORITY_MEDIUM = 'M'
@@ -49,10 +184,11 @@ class Task(models.Model):
     # Set max_length lower that slug due to having slug at 255 so if title was 255 characters, the slug, that is
     # local_id + title, would be > that 255 causing error.
     slug = models.SlugField(max_length=255, unique=True)
-    local_id = models.PositiveSmallIntegerField()
-    # Max value to abide with slug max_length
+    local_id = models.PositiveIntegerField(validators=[MaxValueValidator(999_999_999)])
+    # Max value to abide with slug max_length, 9 digits + '-' + 245 title characters fit in 255
     description = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     deadline = models.DateTimeField(validators=[validate_deadline], null=True, blank=True)
     priority = models.CharField(max_length=1, choices=PRIORITY_CHOICES, null=True, blank=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -60,35 +196,342 @@ class Task(models.Model):
     task_board = models.ForeignKey(TaskBoard, on_delete=models.CASCADE, related_name='tasks')
     reminder_notification = models.BooleanField(default=False) # If deadline < 24 hours user notified.
 
+    objects = TaskQuerySet.as_manager()
+
     class Meta:
-        unique_together = ('task_board', 'local_id')  # Ensures no duplicates per board
+        unique_together = ('task_board', 'local_id')  # Ensures no duplicates per board, also the local_id keyset index
+        indexes = [
+            # Keyset index for TaskCursorPagination's default (created_at, id) ordering within a board
+            models.Index(fields=['task_board', 'created_at', 'id'], name='task_board_created_at_idx'),
+            # Reminder scan: equality on both flags then a range on deadline. A composite rather than a partial
+            # index, MySQL has no partial indexes and Django skips creating conditional ones there.
+            models.Index(fields=['completed', 'reminder_notification', 'deadline'], name='task_pending_reminder_idx'),
+            # BoardStats.overdue recounts: one board's open tasks up to a deadline
+            models.Index(fields=['task_board', 'completed', 'deadline'], name='task_board_overdue_idx'),
+        ]
+
+    @classmethod
+    def pending_reminders(cls, within=timedelta(hours=24)):
+        """Open tasks due within the given window whose owner has not been reminded yet."""
+        current_time = now()
+        return cls.objects.filter(completed=False, reminder_notification=False,
+                                  deadline__gt=current_time, deadline__lte=current_time + within)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Snapshot the loaded values so save() can tell which columns changed without re-reading the row
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def save(self, *args, **kwargs):
         if not self.pk:
-            # Only set local_id on creation
-            max_local_id = Task.objects.filter(task_board=self.task_board
-                                               ).aggregate(models.Max('local_id'))['local_id__max']
-            self.local_id = (max_local_id or 0) + 1
+            # Only set local_id on creation, in the same transaction as the insert so a failed insert frees it
+            with transaction.atomic(savepoint=False):
+                self.local_id = self.task_board.reserve_local_ids()
+                if not self.slug:
+                    self.slug = slugify(f"{self.local_id}-{self.title}")
+                super().save(*args, **kwargs)
+                ChangeLogEntry.record([(self.task_board_id, self.pk)])
+                BoardStats.apply([(self.task_board_id, None, self.get_stats_state())])
+            self._snapshot()
+            return
 
+        self.refresh_derived_fields()
+
+        dirty_fields = self.get_dirty_fields()
+        if dirty_fields is not None and 'update_fields' not in kwargs:
+            # Only write the columns that changed, an untouched task is not written at all
+            kwargs['update_fields'] = dirty_fields
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not update_fields:
+            return
+        if update_fields is not None and 'updated_at' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'updated_at'] # auto_now only applies to written fields
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            TaskBoard.touch([self.task_board_id])
+            ChangeLogEntry.record([(self.task_board_id, self.pk)])
+            BoardStats.apply([(self.task_board_id, self.get_stats_state(loaded=True), self.get_stats_state())])
+        self._snapshot()
+
+    def delete(self, *args, **kwargs):
+        task_id = self.pk
+        with transaction.atomic(savepoint=False):
+            TaskBoard.touch([self.task_board_id])
+            deleted = super().delete(*args, **kwargs)
+            ChangeLogEntry.record([(self.task_board_id, task_id)], ChangeLogEntry.ACTION_DELETE)
+            BoardStats.apply([(self.task_board_id, self.get_stats_state(loaded=True), None)])
+        return deleted
+
+    @classmethod
+    def delete_tasks(cls, tasks):
+        """
+        Deletes loaded tasks, possibly of several boards, with one DELETE, touching their boards and recording their
+        tombstones and stats like delete() does for one task.
+        """
+        with transaction.atomic(savepoint=False):
+            TaskBoard.touch({task.task_board_id for task in tasks})
+            # The plain QuerySet.delete(), TaskQuerySet.delete() comes through here
+            deleted = models.QuerySet.delete(cls.objects.filter(pk__in=[task.pk for task in tasks]))
+            ChangeLogEntry.record(((task.task_board_id, task.pk) for task in tasks), ChangeLogEntry.ACTION_DELETE)
+            BoardStats.apply((task.task_board_id, task.get_stats_state(loaded=True), None) for task in tasks)
+        return deleted
+
+    def get_stats_state(self, loaded=False):
+        """
+        The (completed, priority, deadline) values BoardStats counts the task by, as currently set or, with
+        loaded=True, as last loaded from or saved to the database, BoardStats.UNKNOWN if those were not loaded.
+        """
+        if not loaded:
+            return self.completed, self.priority, self.deadline
+        loaded_values = getattr(self, '_loaded_values', None) or {}
+        if not {'completed', 'priority', 'deadline'} <= loaded_values.keys():
+            return BoardStats.UNKNOWN
+        return loaded_values['completed'], loaded_values['priority'], loaded_values['deadline']
+
+    def refresh_derived_fields(self):
+        """Updates the fields derived from others before an update, shared by save() and bulk updates."""
         if not self.slug or self.title_changed(): # if slug is None, or if title has changed update slug
             self.slug = slugify(f"{self.local_id}-{self.title}")
-        if self.pk and self.deadline and self.deadline > (now() + timedelta(hours=24)):
+        if self.deadline and self.deadline > (now() + timedelta(hours=24)):
             self.reminder_notification = False
-        super().save(*args, **kwargs)
 
+    def get_dirty_fields(self):
+        """
+        Returns the names of the fields changed since the task was loaded, or None if the task was not loaded from
+        the database and there is nothing to compare against.
+        """
+        loaded_values = getattr(self, '_loaded_values', None)
+        if loaded_values is None:
+            return None
+        dirty_fields = []
+        for field in self._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            if field.attname in loaded_values:
+                if getattr(self, field.attname) != loaded_values[field.attname]:
+                    dirty_fields.append(field.name)
+            elif field.attname in self.__dict__: # A deferred field that was assigned after loading
+                dirty_fields.append(field.name)
+        return dirty_fields
 
     def title_changed(self):
         """Check if the title has changed."""
-        if self.pk:
-            old_title = Task.objects.get(pk=self.pk).title
-            return old_title != self.title
-        return False
+        if not self.pk:
+            return False
+        loaded_values = getattr(self, '_loaded_values', None)
+        if loaded_values is not None and 'title' in loaded_values:
+            return loaded_values['title'] != self.title
+        # Only tasks that were never loaded from the database need the extra query
+        old_title = Task.objects.get(pk=self.pk).title
+        return old_title != self.title
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # The refreshed values are what the row holds now, so they are the baseline for the next save
+        if fields is None:
+            self._snapshot()
+        else:
+            self._snapshot(set(fields))
+
+    def _snapshot(self, fields=None):
+        """Records the current values as loaded, of every loaded field or only of the given field names."""
+        values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields
+                  if field.attname in self.__dict__ and (fields is None or {field.name, field.attname} & fields)}
+        if fields is not None:
+            values = {**(getattr(self, '_loaded_values', None) or {}), **values}
+        self._loaded_values = values
 
     def __str__(self):
         return self.title
 
 
+class TaskSearchTerm(models.Model):
+    """
+    Inverted index over Task.title and Task.description, maintained by tasks.search. One row per distinct term of
+    a task, weighted by where the term appears, so searches are prefix range scans on (task_board, term).
+    """
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='search_terms')
+    task_board = models.ForeignKey(TaskBoard, on_delete=models.CASCADE, related_name='+')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ('task', 'term')
+        indexes = [
+            models.Index(fields=['task_board', 'term'], name='task_search_term_idx'),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Append-only log of task and board writes, read by the ?since= change feed. Holds plain ids rather than enforced
+    foreign keys, so delete tombstones outlive the rows they record. Every write adds its entries after locking the
+    board row (reserve_local_ids, touch or the board's own UPDATE), so the entries of a board get their ids in commit
+    order and a cursor can never move past a slower concurrent write.
+    """
+    ACTION_UPSERT = 'U'
+    ACTION_DELETE = 'D'
+    ACTION_CHOICES = [
+        (ACTION_UPSERT, 'Created or updated'),
+        (ACTION_DELETE, 'Deleted'),
+    ]
+    ACTION_NAMES = {ACTION_UPSERT: 'upsert', ACTION_DELETE: 'delete'} # As clients see them
+    task_board = models.ForeignKey(TaskBoard, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                                   related_name='+')
+    task = models.ForeignKey(Task, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True,
+                             related_name='+') # None for changes to the board itself
+    action = models.CharField(max_length=1, choices=ACTION_CHOICES, default=ACTION_UPSERT)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Every feed read is one range scan: the board's entries after the cursor
+            models.Index(fields=['task_board', 'id'], name='change_log_board_idx'),
+        ]
+
+    @classmethod
+    def record(cls, changes, action=ACTION_UPSERT):
+        """
+        Appends one entry per (task_board_id, task_id) pair, a task_id of None records a change to the board. The
+        changes are announced to the boards' live event streams once committed.
+        """
+        changes = list(changes)
+        cls.objects.bulk_create([cls(task_board_id=task_board_id, task_id=task_id, action=action)
+                                 for task_board_id, task_id in changes], batch_size=1000)
+        publish_changes(changes, cls.ACTION_NAMES[action])
+
+    def __str__(self):
+        return f'{self.get_action_display()} {self.task_id or "board"} on board {self.task_board_id}'
+
+
+class BoardStats(models.Model):
+    """
+    Task counts of a board, maintained by every task write so reading them is a single row lookup. Writes add their
+    deltas in their own transaction. overdue depends on the clock as well, it is recounted through the
+    (task_board, completed, deadline) index by writes that change a task's overdue state, and by the
+    refresh_overdue_stats job for deadlines that pass without a write.
+    """
+    task_board = models.OneToOneField(TaskBoard, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    tasks = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    overdue = models.PositiveIntegerField(default=0) # Open tasks whose deadline has passed
+    high_priority = models.PositiveIntegerField(default=0)
+    medium_priority = models.PositiveIntegerField(default=0)
+    low_priority = models.PositiveIntegerField(default=0)
+    no_priority = models.PositiveIntegerField(default=0)
+
+    UNKNOWN = 'unknown' # State before of a task saved without being loaded first
+
+    PRIORITY_FIELDS = {
+        Task.PRIORITY_HIGH: 'high_priority',
+        Task.PRIORITY_MEDIUM: 'medium_priority',
+        Task.PRIORITY_LOW: 'low_priority',
+        None: 'no_priority',
+    }
+
+    @classmethod
+    def counts_of(cls, state):
+        """The counts one task with the given (completed, priority, deadline) state adds to its board."""
+        completed, priority, _ = state
+        counts = {'tasks': 1, cls.PRIORITY_FIELDS.get(priority or None, 'no_priority'): 1}
+        if completed:
+            counts['completed'] = 1
+        return counts
+
+    @staticmethod
+    def is_overdue(state, current_time):
+        completed, _, deadline = state
+        return not completed and deadline is not None and deadline <= current_time
+
+    @classmethod
+    def apply(cls, changes):
+        """
+        Applies task changes given as (task_board_id, state before, state after) triples, None before for creates
+        and None after for deletes, with one UPDATE per changed board. Boards with a change whose state before is
+        UNKNOWN, or without stats yet, are recounted instead.
+        """
+        current_time = now()
+        deltas, recount_overdue, rebuild = {}, set(), set()
+        for task_board_id, before, after in changes:
+            if before == after:
+                continue
+            if before is cls.UNKNOWN:
+                rebuild.add(task_board_id)
+                continue
+            delta = deltas.setdefault(task_board_id, {})
+            for state, sign in ((before, -1), (after, 1)):
+                if state is not None:
+                    for field, count in cls.counts_of(state).items():
+                        delta[field] = delta.get(field, 0) + sign * count
+            was_overdue = before is not None and cls.is_overdue(before, current_time)
+            if was_overdue != (after is not None and cls.is_overdue(after, current_time)):
+                recount_overdue.add(task_board_id)
+
+        for task_board_id, delta in deltas.items():
+            fields = {field: F(field) + count for field, count in delta.items() if count}
+            if task_board_id in recount_overdue:
+                fields['overdue'] = cls.overdue_count(current_time)
+            if fields and not cls.objects.filter(task_board_id=task_board_id).update(**fields):
+                rebuild.add(task_board_id) # A board from before stats were kept
+        if rebuild:
+            cls.rebuild(rebuild)
+
+    @staticmethod
+    def overdue_count(current_time):
+        """Subquery counting the overdue tasks of the outer stats row's board."""
+        overdue_tasks = (Task.objects.filter(task_board=models.OuterRef('task_board'), completed=False,
+                                             deadline__lte=current_time)
+                         .order_by().values('task_board').annotate(count=models.Count('id')).values('count'))
+        return Coalesce(models.Subquery(overdue_tasks), 0)
+
+    @classmethod
+    def rebuild(cls, board_ids):
+        """Recounts the stats of the given boards from their tasks, creating missing rows."""
+        current_time = now()
+        counts = {task_board_id: {} for task_board_id in board_ids}
+        rows = (Task.objects.filter(task_board_id__in=counts).order_by()
+                .values('task_board_id', 'completed', 'priority')
+                .annotate(count=models.Count('id'),
+                          overdue=models.Count('id', filter=models.Q(completed=False, deadline__lte=current_time))))
+        for row in rows:
+            board_counts = counts[row['task_board_id']]
+            for field, count in cls.counts_of((row['completed'], row['priority'], None)).items():
+                board_counts[field] = board_counts.get(field, 0) + count * row['count']
+            board_counts['overdue'] = board_counts.get('overdue', 0) + row['overdue']
+        for task_board_id, board_counts in counts.items():
+            defaults = {field.name: board_counts.get(field.name, 0) for field in cls._meta.concrete_fields
+                        if not field.primary_key}
+            cls.objects.update_or_create(task_board_id=task_board_id, defaults=defaults)
+
+    def __str__(self):
+        return f'Stats of board {self.task_board_id}'
 
 
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def delete_tasks_of_deleted_user(sender, instance, **kwargs):
+    """
+    created_by cascades, and the deletion collector never calls Task.delete(), so the user's tasks on other users'
+    boards are deleted first through Task.delete_tasks to keep those boards' stats, change logs and caches right.
+    Tasks on the user's own boards go with the boards.
+    """
+    tasks = list(Task.objects.filter(created_by=instance).exclude(task_board__owner=instance)
+                 .only('task_board_id', 'completed', 'priority', 'deadline'))
+    if tasks:
+        Task.delete_tasks(tasks)
 
 
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def touch_boards_of_deleted_guest(sender, instance, **kwargs):
+    """
+    The user's memberships cascade without a word to their boards, whose guest lists are part of the board
+    representation, so those boards are touched to retire their validators and cached responses.
+    """
+    board_ids = list(BoardGuest.objects.filter(user=instance).values_list('task_board_id', flat=True))
+    if board_ids:
+        TaskBoard.touch(board_ids)
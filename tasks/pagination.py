@@ -0,0 +1,176 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import IntegerField, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on a unique, composite keyset instead of using OFFSET.
+
+    Every orderable field maps to a keyset that ends in a unique column, so rows sharing a timestamp are never
+    skipped or repeated, and each page is a single index range scan no matter how deep the cursor is.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    ordering = '-created_at' # Used when the view's OrderingFilter did not apply an ordering
+    keysets = {}
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request)
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views, the page is read with async iteration."""
+        page_queryset = self.get_page_queryset(queryset, request)
+        return self.set_page([obj async for obj in page_queryset])
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.keyset = self.get_keyset(queryset)
+
+        cursor = self.decode_cursor(request)
+        self.reverse, self.position = cursor if cursor else (False, None)
+        ordering = self._reversed(self.keyset) if self.reverse else self.keyset
+
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.seek(queryset.model, ordering, self.position))
+        # Fetch one extra row to find out if there is another page in the direction we are reading.
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_keyset(self, queryset):
+        """Expands the first ordering term (from OrderingFilter or the default) into its full keyset."""
+        ordering = queryset.query.order_by or (self.ordering,)
+        term = ordering[0]
+        descending = term.startswith('-')
+        fields = self.keysets.get(term.lstrip('-'), (term.lstrip('-'), 'id'))
+        return tuple(f'-{field}' if descending else field for field in fields)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.build_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.build_link(self.page[0], reverse=True)
+
+    def build_link(self, obj, reverse):
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(obj, reverse))
+
+    def encode_cursor(self, obj, reverse=False, keyset=None):
+        """Encodes the keyset values of obj, the cursor then points at the rows directly after it."""
+        keyset = keyset or self.keyset
+        position = [self._to_json(obj, field.lstrip('-')) for field in keyset]
+        payload = json.dumps({'r': int(reverse), 'p': position}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            reverse, position = bool(payload['r']), payload['p']
+        except (TypeError, ValueError, KeyError, binascii.Error, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.keyset):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def seek(self, model, ordering, position):
+        """
+        Builds the row-value comparison (a, b) > (x, y) as (a > x) OR (a = x AND b > y), plus a redundant bound
+        on the leading column so the database can use it for the index range.
+        """
+        values = []
+        for term, value in zip(ordering, position):
+            try:
+                field = model._meta.get_field(term.lstrip('-'))
+            except FieldDoesNotExist:
+                field = IntegerField() # Keysets only ever include integer annotations such as search_rank
+            try:
+                values.append(field.to_python(value))
+            except Exception:
+                raise NotFound(self.invalid_cursor_message)
+
+        seek = Q()
+        for index, term in enumerate(ordering):
+            lookup = 'lt' if term.startswith('-') else 'gt'
+            condition = Q(**{f'{term.lstrip("-")}__{lookup}': values[index]})
+            for previous_term, previous_value in zip(ordering[:index], values[:index]):
+                condition &= Q(**{previous_term.lstrip('-'): previous_value})
+            seek |= condition
+
+        leading = ordering[0]
+        bound = Q(**{f'{leading.lstrip("-")}__{"lte" if leading.startswith("-") else "gte"}': values[0]})
+        return bound & seek
+
+    @staticmethod
+    def _reversed(ordering):
+        return tuple(term[1:] if term.startswith('-') else f'-{term}' for term in ordering)
+
+    @staticmethod
+    def _to_json(obj, field):
+        value = getattr(obj, field)
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+
+class TaskCursorPagination(KeysetPagination):
+    """Tasks page over (created_at, id) or (task_board, local_id), both backed by composite indexes on Task."""
+    ordering = '-created_at'
+    keysets = {
+        'created_at': ('created_at', 'id'),
+        'local_id': ('task_board_id', 'local_id'),
+        'search_rank': ('search_rank', 'id'), # Set by TaskSearchFilter
+    }
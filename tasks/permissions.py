@@ -1,6 +1,91 @@
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework.permissions import BasePermission, SAFE_METHODS
-from .models import TaskBoard
+from .models import TaskBoard, BoardGuest
+
+ROLE_OWNER = 'owner'
+WRITE_ROLES = (ROLE_OWNER, BoardGuest.ROLE_EDITOR)
+
+
+def get_task_board(request, board_slug):
+    """
+    Returns the task board for board_slug, looked up once per request. The permission classes and the views all
+    resolve the board through here, so a single request never fetches the same board twice.
+    """
+    board = getattr(request, '_task_board', None)
+    if board is None or board.slug != board_slug:
+        board = get_object_or_404(TaskBoard, slug=board_slug)
+        request._task_board = board
+    return board
+
+
+async def aget_task_board(request, board_slug):
+    """get_task_board for async views, sharing its per-request cache."""
+    board = getattr(request, '_task_board', None)
+    if board is None or board.slug != board_slug:
+        try:
+            board = await TaskBoard.objects.aget(slug=board_slug)
+        except TaskBoard.DoesNotExist:
+            raise Http404('No TaskBoard matches the given query.')
+        request._task_board = board
+    return board
+
+
+def get_board_role(request, board):
+    """
+    Returns ROLE_OWNER, the guest's BoardGuest role or None for the requesting user, cached on the request like the
+    board.
+    """
+    cached = getattr(request, '_task_board_role', None)
+    if cached and cached[0] == board.pk:
+        return cached[1]
+
+    user = request.user
+    if not user.is_authenticated:
+        role = None
+    elif board.owner_id == user.id: # Compare ids so the owner is never loaded
+        role = ROLE_OWNER
+    else:
+        role = board.get_guest_role(user)
+    request._task_board_role = (board.pk, role)
+    return role
+
+
+async def aget_board_role(request, board):
+    """get_board_role for async views."""
+    cached = getattr(request, '_task_board_role', None)
+    if cached and cached[0] == board.pk:
+        return cached[1]
+
+    user = request.user
+    if not user.is_authenticated:
+        role = None
+    elif board.owner_id == user.id:
+        role = ROLE_OWNER
+    else:
+        role = await board.aget_guest_role(user)
+    request._task_board_role = (board.pk, role)
+    return role
+
+
+def reads_public_board(request, board):
+    """Reading a public board needs no membership lookup."""
+    return (request.method in SAFE_METHODS and request.user.is_authenticated
+            and board.visibility == TaskBoard.VISIBILITY_PUBLIC)
+
+
+def role_allows(request, role):
+    if request.method in SAFE_METHODS:
+        return role is not None
+    return role in WRITE_ROLES
+
+
+async def ahas_task_board_access(request, board):
+    """TaskBoardAccess.has_permission for async views."""
+    if reads_public_board(request, board):
+        return True
+    return role_allows(request, await aget_board_role(request, board))
+
 
 class TaskBoardAccess(BasePermission):
     def has_permission(self, request, view):
@@ -8,32 +93,23 @@ class TaskBoardAccess(BasePermission):
         if not board_id: # Find out a board exists
             return False
 
-        board = get_object_or_404(TaskBoard, slug=board_id)
+        board = get_task_board(request, board_id)
 
-        if request.user == board.owner: return True
-        if request.user in board.guests.all(): return True
-        if request.method in SAFE_METHODS and request.user.is_authenticated and board.visibility == 'PUB': return True
-        return False
+        if reads_public_board(request, board): return True
+        return role_allows(request, get_board_role(request, board))
 
 
     def has_object_permission(self, request, view, obj):
         if request.method in SAFE_METHODS and request.user.is_authenticated: return True
         if request.method in [*SAFE_METHODS, 'POST', 'PUT', 'PATCH', 'DELETE']:
-            if request.user == obj.task_board.owner: return True
-            if request.user in obj.task_board.guests.all(): return True
+            board = get_task_board(request, view.kwargs.get('board_slug'))
+            if obj.task_board_id != board.pk: return False
+            return get_board_role(request, board) in WRITE_ROLES
         return False
 
 class IsTaskBoardOwner(BasePermission):
     def has_permission(self, request, view):
         board_slug = view.kwargs.get('board_slug')
-        board = get_object_or_404(TaskBoard, slug=board_slug)
-
-        if board.owner == request.user:
-            return True
-        return False
-
-
-
-
-
+        board = get_task_board(request, board_slug)
 
+        return get_board_role(request, board) == ROLE_OWNER
@@ -0,0 +1,107 @@
+import re
+
+from django.db.models import Case, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Task, TaskSearchTerm
+
+TITLE_WEIGHT = 3 # A term in the title ranks above the same term in the description
+DESCRIPTION_WEIGHT = 1
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64 # TaskSearchTerm.term max_length, longer words are indexed by their prefix
+MAX_QUERY_TERMS = 8
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Splits text into distinct lowercase terms, in order of first appearance."""
+    terms = {}
+    for token in TOKEN_PATTERN.findall((text or '').lower()):
+        if len(token) >= MIN_TERM_LENGTH:
+            terms.setdefault(token[:MAX_TERM_LENGTH], None)
+    return list(terms)
+
+
+def build_search_terms(task):
+    """Returns the TaskSearchTerm rows for a task, one per distinct term with its summed weight."""
+    weights = {}
+    for term in tokenize(task.title):
+        weights[term] = weights.get(term, 0) + TITLE_WEIGHT
+    for term in tokenize(task.description):
+        weights[term] = weights.get(term, 0) + DESCRIPTION_WEIGHT
+    return [TaskSearchTerm(task_id=task.pk, task_board_id=task.task_board_id, term=term, weight=weight)
+            for term, weight in weights.items()]
+
+
+def index_tasks(tasks, created=False):
+    """
+    (Re)builds the search terms of the given saved tasks with one DELETE and one bulk INSERT. Pass created=True for
+    freshly inserted tasks, which have no terms to delete.
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return
+    if not created:
+        TaskSearchTerm.objects.filter(task_id__in=[task.pk for task in tasks]).delete()
+    TaskSearchTerm.objects.bulk_create([term for task in tasks for term in build_search_terms(task)],
+                                       batch_size=1000)
+
+
+@receiver(post_save, sender=Task)
+def index_saved_task(sender, instance, created, update_fields=None, **kwargs):
+    """Keeps the index in step with single task saves, skipping saves that did not touch the searched text."""
+    if created or update_fields is None or {'title', 'description'} & set(update_fields):
+        index_tasks([instance], created=created)
+
+
+def search_tasks(queryset, query, board_ids):
+    """
+    Filters queryset to the tasks matching every term of query by prefix, annotated with search_rank, the summed
+    weight of the matching terms. Runs against the (task_board, term) index of the given boards rather than
+    scanning task text. A query without a term of MIN_TERM_LENGTH or more, such as "x" or "?", matches nothing.
+    """
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return queryset.none() # Short words are not indexed, and matching every task would ignore the search
+
+    matches_any = Q()
+    for term in terms:
+        matches_any |= Q(term__istartswith=term) # Terms are stored lowercase, LIKE 'term%' is an index range
+
+    # A task matches when each query term prefix-matches at least one of its indexed terms
+    matched_terms = sum(
+        (Max(Case(When(term__istartswith=term, then=Value(1)), default=Value(0), output_field=IntegerField()))
+         for term in terms),
+        start=Value(0),
+    )
+    matching_tasks = (TaskSearchTerm.objects.filter(matches_any, task_board_id__in=board_ids)
+                      .values('task_id')
+                      .annotate(matched_terms=matched_terms)
+                      .filter(matched_terms=len(terms))
+                      .values('task_id'))
+    rank = (TaskSearchTerm.objects.filter(matches_any, task=OuterRef('pk'))
+            .values('task_id')
+            .annotate(rank=Sum('weight'))
+            .values('rank'))
+    return (queryset
+            .filter(pk__in=Subquery(matching_tasks))
+            .annotate(search_rank=Subquery(rank, output_field=IntegerField()))
+            .order_by('-search_rank'))
+
+
+class TaskSearchFilter(BaseFilterBackend):
+    """
+    Full-text search over task titles and descriptions through the TaskSearchTerm index, replacing SearchFilter's
+    LIKE '%term%' scans. Results are ranked best match first unless the request asks for another ordering.
+    Views using it implement get_search_board_ids() to scope the index lookup.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return search_tasks(queryset, query, view.get_search_board_ids())
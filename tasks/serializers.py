@@ -2,10 +2,13 @@ from django.core.exceptions import ValidationError as DjangoValidationError
 
 from rest_framework import serializers
 
-from .models import TaskBoard, Task
+from .bulk import BULK_MAX_ITEMS
+from .models import BoardStats, TaskBoard, Task
+from .pagination import TaskCursorPagination
 from .validators import validate_deadline
 
-
+TASK_PREVIEW_SIZE = 5 # Number of tasks nested in each board representation
+TASK_PREVIEW_ORDERING = ('-created_at', '-id') # Newest tasks first, id breaks ties on identical timestamps
 
 
 class DeadlineValidationMixin:
@@ -23,18 +26,125 @@ class TaskSerializer(serializers.ModelSerializer, DeadlineValidationMixin):
     task_board_visibility = serializers.CharField(source='task_board.visibility', read_only=True)
     class Meta:
         model = Task
-        fields = ['id', 'title', 'slug', 'local_id', 'description', 'created_at','deadline', 'priority', 'created_by',
-                  'completed','task_board', 'task_board_visibility', 'reminder_notification']
-        read_only_fields = ['id', 'created_by', 'slug', 'task_board', 'local_id', 'reminder_notification']
+        fields = ['id', 'title', 'slug', 'local_id', 'description', 'created_at', 'updated_at', 'deadline', 'priority',
+                  'created_by', 'completed','task_board', 'task_board_visibility', 'reminder_notification']
+        read_only_fields = ['id', 'created_by', 'slug', 'task_board', 'local_id', 'reminder_notification', 'updated_at']
+
+
+class TaskFeedSerializer(TaskSerializer):
+    """A task in the cross-board feed, which also names the board the task is on."""
+    task_board_slug = serializers.CharField(source='task_board.slug', read_only=True)
+
+    class Meta(TaskSerializer.Meta):
+        fields = [*TaskSerializer.Meta.fields, 'task_board_slug']
+
+
+class TaskBulkUpdateSerializer(TaskSerializer):
+    """A task update inside a bulk request, the task to update is identified by its slug."""
+    slug = serializers.SlugField(max_length=255)
+
+    class Meta(TaskSerializer.Meta):
+        extra_kwargs = {'title': {'required': False}}
+
+
+class TaskBulkSerializer(serializers.Serializer):
+    """
+    Validates a bulk request on the board given as the task_board context. The tasks to update and delete are
+    loaded with a single query and exposed as tasks_by_slug, unknown or repeated slugs are reported per item.
+    """
+    create = TaskSerializer(many=True, required=False, max_length=BULK_MAX_ITEMS)
+    update = TaskBulkUpdateSerializer(many=True, required=False, max_length=BULK_MAX_ITEMS)
+    delete = serializers.ListField(child=serializers.SlugField(max_length=255), required=False,
+                                   max_length=BULK_MAX_ITEMS)
+
+    def validate(self, attrs):
+        item_count = sum(len(attrs.get(operation, [])) for operation in ('create', 'update', 'delete'))
+        if not item_count:
+            raise serializers.ValidationError('No tasks to create, update or delete.')
+        if item_count > BULK_MAX_ITEMS:
+            raise serializers.ValidationError(f'A bulk request can change at most {BULK_MAX_ITEMS} tasks.')
+
+        update_slugs = [item['slug'] for item in attrs.get('update', [])]
+        delete_slugs = attrs.get('delete', [])
+        self.tasks_by_slug = {}
+        if update_slugs or delete_slugs:
+            tasks = (Task.objects.filter(task_board=self.context['task_board'], slug__in=update_slugs + delete_slugs)
+                     .select_related('task_board'))
+            self.tasks_by_slug = {task.slug: task for task in tasks}
+
+        # Errors are keyed by item index, the same shape the nested list fields report them in
+        seen, errors = set(), {}
+        update_errors = {index: {'slug': [error]} for index, error in enumerate(self._slug_error(slug, seen)
+                                                                                for slug in update_slugs) if error}
+        if update_errors:
+            errors['update'] = update_errors
+        delete_errors = {index: [error] for index, error in enumerate(self._slug_error(slug, seen)
+                                                                      for slug in delete_slugs) if error}
+        if delete_errors:
+            errors['delete'] = delete_errors
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def _slug_error(self, slug, seen):
+        if slug not in self.tasks_by_slug:
+            return 'Task not found.'
+        if slug in seen:
+            return 'Task is changed more than once.'
+        seen.add(slug)
+        return None
+
+
+class TaskPreviewSerializer(serializers.ModelSerializer):
+    """Slim task representation used for the preview nested in a task board."""
+    class Meta:
+        model = Task
+        fields = ['id', 'title', 'slug', 'local_id', 'created_at', 'deadline', 'priority', 'completed']
+        read_only_fields = fields
 
 
+class BoardStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BoardStats
+        fields = ['tasks', 'completed', 'overdue', 'high_priority', 'medium_priority', 'low_priority', 'no_priority']
+        read_only_fields = fields
+
 
 class TaskBoardSerializer(serializers.ModelSerializer):
-    tasks = TaskSerializer(many=True, read_only=True)
+    # Boards only carry their stats and the newest few tasks, the full list is paginated under /boards/{slug}/tasks/
+    tasks_count = serializers.SerializerMethodField()
+    stats = serializers.SerializerMethodField()
+    tasks_preview = serializers.SerializerMethodField()
+    tasks_next = serializers.SerializerMethodField()
 
     class Meta:
         model = TaskBoard
-        fields = ['id', 'slug', 'title', 'visibility', 'created_at', 'last_updated', 'owner', 'guests', 'tasks']
-        read_only_fields = ['id', 'slug', 'created_at', 'last_updated', 'owner', 'guests', 'tasks']
+        fields = ['id', 'slug', 'title', 'visibility', 'created_at', 'last_updated', 'owner', 'guests', 'tasks_count',
+                  'stats', 'tasks_preview', 'tasks_next']
+        read_only_fields = ['id', 'slug', 'created_at', 'last_updated', 'owner', 'guests', 'tasks_count', 'stats',
+                            'tasks_preview', 'tasks_next']
+
+    def get_tasks_count(self, board):
+        return board.get_stats().tasks
+
+    def get_stats(self, board):
+        return BoardStatsSerializer(board.get_stats()).data
+
+    def get_tasks_preview(self, board):
+        """Uses the preview_tasks prefetch when available, otherwise falls back to a single bounded query."""
+        return TaskPreviewSerializer(self._preview_tasks(board), many=True).data
 
+    def get_tasks_next(self, board):
+        """Link to the page of /boards/{slug}/tasks/ that continues directly after the preview."""
+        preview_tasks = self._preview_tasks(board)
+        if len(preview_tasks) < TASK_PREVIEW_SIZE or self.get_tasks_count(board) <= len(preview_tasks):
+            return None
+        cursor = TaskCursorPagination().encode_cursor(preview_tasks[-1], keyset=TASK_PREVIEW_ORDERING)
+        url = f'/boards/{board.slug}/tasks/?{TaskCursorPagination.cursor_query_param}={cursor}'
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
+    def _preview_tasks(self, board):
+        if getattr(board, 'preview_tasks', None) is None:
+            board.preview_tasks = list(board.tasks.order_by(*TASK_PREVIEW_ORDERING)[:TASK_PREVIEW_SIZE])
+        return board.preview_tasks
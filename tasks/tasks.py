@@ -1,38 +1,208 @@
+import logging
+import time
 from datetime import timedelta
-from celery import shared_task
-from django.core.mail import send_mail
-from django.utils.timezone import now
+from itertools import groupby
+from smtplib import SMTPException
+
+from celery import shared_task, group
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.mail import send_mail, get_connection, EmailMessage
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Mod
+from django.utils.timezone import localtime, now
+
+from .changes import prune_change_log
+from .models import Task, TaskBoard, BoardGuest, BoardStats, ChangeLogEntry
+
+logger = logging.getLogger(__name__)
+
+REMINDER_CHUNK_SIZE = 2000 # Task rows claimed per transaction and read per round trip
+OVERDUE_CHECKED_AT_KEY = 'tasks:stats:overdue_checked_at'
 
-from .models import Task
 
 @shared_task
-def notify_user_task_is_due_within_24_hours():
-    tasks = Task.objects.filter(deadline__lte=now() + timedelta(hours=24), deadline__gt=now(),
-                                reminder_notification=False, completed=False)
-    for task in tasks:
-        try:
-            send_mail(
-                subject='Task Due Reminder',
-                message=f'Hello {task.created_by.username}! Reminder, your task "{task.title}" is due within 24 hours.',
-                from_email='reminder@taskly.com',
-                recipient_list=[task.created_by.email]
-            )
-            task.reminder_notification=True
-            task.save()
-        except Exception as e:
-            print("Failed to send email for task: {task.title}. Error: {e}")
+def dispatch_due_task_reminders():
+    """
+    Beat entry point. Fans the reminder run out as one Celery group of shards, so every worker sends a share.
+    Shards split recipients (created_by_id modulo the shard count) rather than task ids, which keeps all of a
+    user's tasks in one shard and one digest.
+    """
+    shard_count = settings.TASK_REMINDER_SHARDS
+    group(notify_user_task_is_due_within_24_hours.s(shard, shard_count) for shard in range(shard_count)).apply_async()
+    return {'shards': shard_count}
+
 
 @shared_task
-def notify_user_invitation_to_task_board(user, invited_by, task_board):
+def notify_user_task_is_due_within_24_hours(shard=0, shard_count=1):
+    """
+    Emails every user in this shard one digest of their tasks due within 24 hours.
+    The shard claims its tasks a chunk at a time, flagging them as notified in one transaction per chunk, so
+    overlapping runs and other workers can never email the same reminder, then sends the chunk's digests. Digests go
+    out over a single SMTP connection, and the tasks of any digest that fails are released for the next run.
+    Delivery is at most once: a worker that dies between claiming a chunk and sending it leaves those tasks flagged.
+    Returns the run's throughput as the task result.
+    """
+    started = time.monotonic()
+    stats = {'shard': shard, 'tasks_notified': 0, 'emails_sent': 0, 'emails_failed': 0}
+
+    with get_connection() as connection: # Reuse one SMTP connection for every digest
+        after, more = None, True
+        while more:
+            claimed, more = claim_due_reminders(shard, shard_count, after)
+            if not claimed:
+                break
+            task_id, recipient_id = claimed[-1]
+            after = recipient_id, task_id
+            send_reminder_digests(connection, claimed, stats)
+
+    duration = time.monotonic() - started
+    stats['duration_seconds'] = round(duration, 3)
+    stats['tasks_per_second'] = round(stats['tasks_notified'] / duration, 1) if duration else None
+    logger.info(f"Task reminders sent: {stats}")
+    return stats
+
+
+def claim_due_reminders(shard, shard_count, after=None, chunk_size=REMINDER_CHUNK_SIZE):
+    """
+    Locks up to chunk_size of this shard's pending reminders past the (recipient id, task id) after, skipping rows
+    another worker holds, and flags them with one UPDATE in the same transaction. A full chunk leaves out its last
+    recipient, who may have more tasks past it, so each recipient gets one digest unless they alone fill a chunk.
+    Returns the claimed (task id, recipient id) pairs ordered by recipient, and whether more may be pending.
+    """
+    pending = (Task.pending_reminders()
+               .alias(shard=Mod('created_by_id', shard_count)).filter(shard=shard))
+    if after is not None:
+        recipient_id, task_id = after
+        pending = pending.filter(Q(created_by_id__gt=recipient_id) | Q(created_by_id=recipient_id, id__gt=task_id))
+    with transaction.atomic(savepoint=False):
+        rows = list(pending.select_for_update(skip_locked=True)
+                    .order_by('created_by_id', 'id')
+                    .values_list('id', 'created_by_id', 'task_board_id')[:chunk_size])
+        more = len(rows) == chunk_size
+        if more and rows[0][1] != rows[-1][1]:
+            rows = [row for row in rows if row[1] != rows[-1][1]]
+        Task.objects.filter(pk__in=[task_id for task_id, _, _ in rows]).update(reminder_notification=True,
+                                                                              updated_at=now())
+        if rows:
+            TaskBoard.touch({task_board_id for _, _, task_board_id in rows})
+            ChangeLogEntry.record((task_board_id, task_id) for task_id, _, task_board_id in rows)
+    return [(task_id, recipient_id) for task_id, recipient_id, _ in rows], more
+
+
+def send_reminder_digests(connection, claimed, stats):
+    """Sends the digests of a claimed chunk, then releases every task of it that was not emailed."""
+    sent_ids = set()
+    try:
+        due_tasks = (Task.objects.filter(pk__in=[task_id for task_id, _ in claimed])
+                     .select_related('created_by', 'task_board')
+                     .only('title', 'deadline', 'created_by__username', 'created_by__email', 'task_board__title')
+                     .order_by('created_by_id', 'deadline', 'id'))
+        for _, user_tasks in groupby(due_tasks, key=lambda task: task.created_by_id):
+            user_tasks = list(user_tasks)
+            user = user_tasks[0].created_by
+            try:
+                connection.send_messages([build_reminder_digest(user, user_tasks)])
+            except Exception as e:
+                stats['emails_failed'] += 1
+                logger.error(f"Failed to send reminder digest to {user.username}. Error: {e}")
+                continue
+            sent_ids.update(task.pk for task in user_tasks)
+            stats['emails_sent'] += 1
+            stats['tasks_notified'] += len(user_tasks)
+    finally:
+        # Whatever stopped the chunk, failed digests, an SMTP server that stopped answering or a query error, every
+        # claimed task that was not emailed is released, or it would stay flagged and never be reminded
+        release_reminders([task_id for task_id, _ in claimed if task_id not in sent_ids])
+
+
+def build_reminder_digest(user, tasks):
+    """One email listing all of a user's tasks that are due within 24 hours."""
+    lines = [f'- "{task.title}" on \'{task.task_board.title}\' is due {localtime(task.deadline):%d %b %Y %H:%M}'
+             for task in tasks]
+    return EmailMessage(
+        subject='Task Due Reminder',
+        body=f'Hello {user.username}! Reminder, you have {len(tasks)} task(s) due within 24 hours:\n' + '\n'.join(lines),
+        from_email='reminder@taskly.com',
+        to=[user.email],
+    )
+
+
+def release_reminders(task_ids):
+    """Unflags tasks whose digest could not be sent so the next run picks them up again."""
+    if not task_ids:
+        return 0
+    with transaction.atomic(savepoint=False):
+        released = list(Task.objects.filter(pk__in=task_ids).values_list('task_board_id', 'id'))
+        TaskBoard.touch({task_board_id for task_board_id, _ in released})
+        ChangeLogEntry.record(released)
+        return Task.objects.filter(pk__in=task_ids).update(reminder_notification=False, updated_at=now())
+
+@shared_task(bind=True, autoretry_for=(SMTPException, OSError), retry_backoff=True, retry_backoff_max=600,
+             retry_jitter=True, max_retries=5)
+def notify_user_invitation_to_task_board(self, user_id, invited_by_id, task_board_id):
+    """
+    Emails a guest that they were invited to a task board. Takes primary keys so the job serialises cleanly.
+    The guest's BoardGuest row is the idempotency key: the job claims it by stamping invitation_sent_at, so a
+    duplicate delivery or a retry after a successful send does nothing, and a removed guest is never emailed.
+    SMTP and connection errors release the claim and retry with exponential backoff.
+    """
+    claimed = BoardGuest.objects.filter(task_board_id=task_board_id, user_id=user_id,
+                                        invitation_sent_at__isnull=True).update(invitation_sent_at=now())
+    if not claimed:
+        logger.info(f"Invitation for user {user_id} to task board {task_board_id} already sent or withdrawn")
+        return False
+
+    membership = BoardGuest.objects.select_related('user', 'task_board').get(task_board_id=task_board_id,
+                                                                            user_id=user_id)
+    invited_by = get_user_model().objects.only('username').get(pk=invited_by_id)
+    user, task_board = membership.user, membership.task_board
+    access = ("add, edit and delete tasks" if membership.role == BoardGuest.ROLE_EDITOR else "view its tasks")
     try:
-        print("Sending Invitation to Task Board")
         send_mail(
             subject=f"Invitation to {task_board.title}",
             message=f"{user.username} you have been added as a guest to '{task_board.title}' by {invited_by.username}"
-                    f" you are now able to add, edit and delete tasks.",
+                    f" you are now able to {access}.",
             from_email='invitations@taskly.com',
             recipient_list=[user.email]
         )
-        print("Invitation to Task Board Successfully sent")
     except Exception as e:
-        print(f"Failed to send email for invitation to task. Error: {e}")
\ No newline at end of file
+        BoardGuest.objects.filter(pk=membership.pk).update(invitation_sent_at=None)
+        logger.warning(f"Failed to send invitation to task board {task_board_id} to {user.username}. Error: {e}")
+        raise
+    logger.info(f"Invitation to task board {task_board_id} sent to {user.username}")
+    return True
+
+
+@shared_task
+def prune_change_log_entries():
+    """
+    Beat entry point. Drops change log entries older than CHANGE_LOG_RETENTION_DAYS, clients syncing from an older
+    cursor get 410 Gone and download their boards again.
+    """
+    deleted = prune_change_log(now() - timedelta(days=settings.CHANGE_LOG_RETENTION_DAYS))
+    logger.info(f"Pruned {deleted} change log entries")
+    return {'deleted': deleted}
+
+
+@shared_task
+def refresh_overdue_stats():
+    """
+    Beat entry point. Recounts BoardStats.overdue of the boards with open tasks whose deadline passed since the
+    previous run, which no write did. Looks back a day when the previous run is unknown, run rebuild_board_stats
+    after longer outages.
+    """
+    current_time = now()
+    checked_at = cache.get(OVERDUE_CHECKED_AT_KEY) or current_time - timedelta(days=1)
+    board_ids = list(Task.objects.filter(completed=False, deadline__gt=checked_at, deadline__lte=current_time)
+                     .values_list('task_board_id', flat=True).distinct())
+    if board_ids:
+        with transaction.atomic(savepoint=False):
+            BoardStats.objects.filter(task_board_id__in=board_ids).update(
+                overdue=BoardStats.overdue_count(current_time))
+            TaskBoard.touch(board_ids) # The stats are part of the board representation
+    cache.set(OVERDUE_CHECKED_AT_KEY, current_time, timeout=None)
+    return {'boards_refreshed': len(board_ids)}
+
@@ -4,23 +4,12 @@ import pytest
 from django.contrib.auth import get_user_model
 from django.utils.timezone import now
 from model_bakery import baker
-from rest_framework.test import APIClient
 
 from celery.contrib.testing.app import setup_default_app
 from celery.contrib.testing.worker import start_worker
 
 
 
-@pytest.fixture
-def user():
-    User = get_user_model()
-    return User.objects.create_user(username='testuser', password='testpassword', email="testuser@example.com")
-
-@pytest.fixture
-def api_client():
-    return APIClient()
-
-
 @pytest.fixture
 def valid_task_data(user):
     task = baker.prepare(
@@ -60,15 +49,6 @@ def valid_board_data(user):
 def board_slug(valid_board_data):
     return valid_board_data["slug"]
 
-@pytest.fixture
-def created_task_board(user):
-    task_board = baker.make(
-        "TaskBoard",
-        owner=user
-    )
-    return task_board
-
-
 @pytest.fixture
 def create_task(created_task_board):
     dl = now() + timedelta(hours=23)
@@ -0,0 +1,122 @@
+import pytest
+from model_bakery import baker
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+from tasks.models import BoardStats, Task, TaskBoard
+
+
+@pytest.mark.django_db
+class TestAsyncTaskViews:
+    def authenticate(self, api_client, user):
+        api_client.credentials(HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(user)}')
+
+    def test_list_matches_the_sync_view(self, user, api_client, created_task_board, create_task):
+        """
+        Test that the async task list returns the same page as the DRF view.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        for _ in range(3):
+            create_task()
+        self.authenticate(api_client, user)
+
+        sync_response = api_client.get(f'/boards/{created_task_board.slug}/tasks/?page_size=2')
+        async_response = api_client.get(f'/async/boards/{created_task_board.slug}/tasks/?page_size=2')
+
+        assert async_response.status_code == status.HTTP_200_OK
+        assert async_response.json()['results'] == sync_response.json()['results']
+        assert async_response.json()['next'] is not None
+
+    def test_create_task_returns_201(self, user, api_client, created_task_board, valid_task_data):
+        """
+        Test that a task posted to the async view is created on the board.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param valid_task_data:
+        """
+        self.authenticate(api_client, user)
+
+        response = api_client.post(f'/async/boards/{created_task_board.slug}/tasks/', valid_task_data,
+                                   format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Task.objects.filter(task_board=created_task_board, slug=response.json()['slug']).exists()
+
+    def test_if_user_is_anonymous_return_401(self, api_client, created_task_board):
+        """
+        Test that the async views require a token.
+        :param api_client:
+        :param created_task_board:
+        """
+        response = api_client.get(f'/async/boards/{created_task_board.slug}/tasks/')
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_private_board_of_another_user_returns_403(self, api_client, action_user, created_task_board):
+        """
+        Test that the async views apply the same board permissions as the DRF views.
+        :param api_client:
+        :param action_user:
+        :param created_task_board:
+        """
+        created_task_board.visibility = TaskBoard.VISIBILITY_PRIVATE
+        created_task_board.save()
+        self.authenticate(api_client, action_user)
+
+        response = api_client.get(f'/async/boards/{created_task_board.slug}/tasks/')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_missing_task_returns_404(self, user, api_client, created_task_board):
+        """
+        Test that retrieving a task that does not exist returns 404.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        self.authenticate(api_client, user)
+
+        response = api_client.get(f'/async/boards/{created_task_board.slug}/tasks/missing/')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestAsyncTaskBoardViews:
+    def test_list_matches_the_sync_view(self, user, api_client):
+        """
+        Test that the async board list returns the same boards as the DRF view.
+        :param user:
+        :param api_client:
+        """
+        baker.make('TaskBoard', owner=user, _quantity=2)
+        api_client.credentials(HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(user)}')
+
+        sync_response = api_client.get(f'/{user.username}/boards/')
+        async_response = api_client.get(f'/async/{user.username}/boards/')
+
+        assert async_response.status_code == status.HTTP_200_OK
+        assert async_response.json() == sync_response.json()
+
+    def test_boards_from_before_stats_are_counted(self, user, api_client, create_task, created_task_board):
+        """
+        Test that boards without a stats row are recounted off the event loop rather than failing the request.
+        :param user:
+        :param api_client:
+        :param create_task:
+        :param created_task_board:
+        """
+        create_task()
+        BoardStats.objects.all().delete()
+        api_client.credentials(HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(user)}')
+
+        list_response = api_client.get(f'/async/{user.username}/boards/')
+        BoardStats.objects.all().delete()
+        detail_response = api_client.get(f'/async/{user.username}/boards/{created_task_board.slug}/')
+
+        assert list_response.status_code == detail_response.status_code == status.HTTP_200_OK
+        assert list_response.json()[0]['stats']['tasks'] == detail_response.json()['stats']['tasks'] == 1
@@ -1,8 +1,11 @@
 import pytest
 from django.contrib.auth import get_user_model
+from model_bakery import baker
 
 from rest_framework import status
 
+from tasks.serializers import TASK_PREVIEW_SIZE
+
 
 @pytest.mark.django_db
 class TestGetTaskBoards:
@@ -425,3 +428,142 @@ class TestDeleteTaskBoard:
         assert response.status_code == status.HTTP_404_NOT_FOUND
 
 
+@pytest.mark.django_db
+class TestTaskBoardRepresentation:
+    def test_board_list_runs_a_fixed_number_of_queries(self, user, api_client, django_assert_num_queries):
+        """
+        Test that listing task boards costs the same number of queries no matter how many boards or tasks exist.
+        Queries: the conditional GET validators, then the boards, guests and task previews in one query each.
+        :param user:
+        :param api_client:
+        :param django_assert_num_queries:
+        """
+        api_client.force_authenticate(user=user)
+        for _ in range(3):
+            board = baker.make("TaskBoard", owner=user)
+            baker.make("Task", task_board=board, created_by=user, deadline=None, _quantity=TASK_PREVIEW_SIZE + 3)
+
+        with django_assert_num_queries(4):
+            response = api_client.get(f'/{user.username}/boards/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 3
+
+        board = baker.make("TaskBoard", owner=user)
+        baker.make("Task", task_board=board, created_by=user, deadline=None, _quantity=20)
+
+        with django_assert_num_queries(4):
+            response = api_client.get(f'/{user.username}/boards/')
+
+        assert len(response.data) == 4
+
+    def test_board_returns_task_count_and_bounded_preview(self, user, api_client, created_task_board):
+        """
+        Test that a task board instance returns the total number of tasks, but only previews the newest tasks.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(user=user)
+        tasks = baker.make("Task", task_board=created_task_board, created_by=user, deadline=None,
+                           _quantity=TASK_PREVIEW_SIZE + 2)
+
+        response = api_client.get(f'/{user.username}/boards/{created_task_board.slug}/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['tasks_count'] == len(tasks)
+        assert len(response.data['tasks_preview']) == TASK_PREVIEW_SIZE
+        assert response.data['tasks_preview'][0]['id'] == tasks[-1].id
+
+    def test_board_links_to_the_task_page_after_the_preview(self, user, api_client, created_task_board):
+        """
+        Test that tasks_next continues the task list directly after the last previewed task.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(user=user)
+        tasks = baker.make("Task", task_board=created_task_board, created_by=user, deadline=None,
+                           _quantity=TASK_PREVIEW_SIZE + 2)
+        board = api_client.get(f'/{user.username}/boards/{created_task_board.slug}/')
+
+        response = api_client.get(board.data['tasks_next'])
+
+        assert [task['id'] for task in response.data['results']] == [tasks[1].id, tasks[0].id]
+
+
+@pytest.mark.django_db
+class TestTaskBoardConditionalGet:
+    def test_unchanged_board_list_returns_304(self, user, api_client, created_task_board,
+                                              django_assert_num_queries):
+        """
+        Test that the board list answers a matching If-None-Match with 304 after a single validator query.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param django_assert_num_queries:
+        """
+        api_client.force_authenticate(user=user)
+        etag = api_client.get(f'/{user.username}/boards/')['ETag']
+
+        with django_assert_num_queries(1):
+            response = api_client.get(f'/{user.username}/boards/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_inviting_a_guest_invalidates_the_board_etag(self, user, api_client, created_task_board, action_user):
+        """
+        Test that guest list changes, which do not save the board, still change its ETag.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param action_user:
+        """
+        api_client.force_authenticate(user=user)
+        url = f'/{user.username}/boards/{created_task_board.slug}/'
+        etag = api_client.get(url)['ETag']
+
+        api_client.post(f'/boards/{created_task_board.slug}/invite/',
+                        data={'action': 'invite', 'username': action_user.username})
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert action_user.pk in response.data['guests']
+
+    def test_deleting_a_guest_invalidates_the_board_etag(self, user, api_client, created_task_board, action_user):
+        """
+        Test that deleting a guest's account, whose membership cascades, changes the ETag of the boards they were on.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param action_user:
+        """
+        created_task_board.guests.add(action_user)
+        api_client.force_authenticate(user=user)
+        url = f'/{user.username}/boards/{created_task_board.slug}/'
+        etag = api_client.get(url)['ETag']
+
+        action_user.delete()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['guests'] == []
+
+    def test_task_edits_invalidate_the_board_etag(self, user, api_client, created_task_board, create_task):
+        """
+        Test that editing one of its tasks changes the board's ETag, as the board shows a task preview.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        task = create_task()
+        api_client.force_authenticate(user=user)
+        url = f'/{user.username}/boards/{created_task_board.slug}/'
+        etag = api_client.get(url)['ETag']
+
+        task.title = 'Edited'
+        task.save()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
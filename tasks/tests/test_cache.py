@@ -0,0 +1,280 @@
+import pytest
+from model_bakery import baker
+
+from rest_framework import status
+
+from tasks.cache import PUBLIC_BOARD_KEY, get_response_cache_stats
+from tasks.models import BoardGuest, TaskBoard
+
+
+@pytest.mark.django_db
+class TestResponseCache:
+    def test_repeated_task_list_is_served_from_the_cache(self, user, api_client, created_task_board, create_task,
+                                                         django_assert_num_queries):
+        """
+        Test that the second identical task list request skips the task query and serialisation.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        :param django_assert_num_queries:
+        """
+        create_task()
+        api_client.force_authenticate(user=user)
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        first = api_client.get(url)
+
+        with django_assert_num_queries(1): # The board lookup for the permission check
+            second = api_client.get(url)
+
+        assert (first['X-Cache'], second['X-Cache']) == ('MISS', 'HIT')
+        assert second.data == first.data
+
+    def test_task_writes_orphan_cached_responses(self, user, api_client, created_task_board, create_task):
+        """
+        Test that editing a task through the API makes the next list request miss and show the edit.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        task = create_task()
+        api_client.force_authenticate(user=user)
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        api_client.get(url)
+
+        api_client.patch(f'{url}{task.slug}/', data={'title': 'Edited'})
+        response = api_client.get(url)
+
+        assert response['X-Cache'] == 'MISS'
+        assert response.data['results'][0]['title'] == 'Edited'
+
+    def test_cached_responses_still_check_access(self, user, api_client, created_task_board, create_task,
+                                                 action_user):
+        """
+        Test that a response cached for the owner of a private board is not served to other users.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        :param action_user:
+        """
+        created_task_board.visibility = TaskBoard.VISIBILITY_PRIVATE
+        created_task_board.save()
+        create_task()
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        api_client.force_authenticate(user=user)
+        api_client.get(url)
+
+        api_client.force_authenticate(user=action_user)
+        response = api_client.get(url)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_inviting_a_guest_orphans_the_cached_board(self, user, api_client, created_task_board, action_user):
+        """
+        Test that the board detail shows a new guest straight after the invitation.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param action_user:
+        """
+        api_client.force_authenticate(user=user)
+        url = f'/{user.username}/boards/{created_task_board.slug}/'
+        api_client.get(url)
+
+        api_client.post(f'/boards/{created_task_board.slug}/invite/',
+                        data={'action': 'invite', 'username': action_user.username, 'role': BoardGuest.ROLE_VIEWER})
+        response = api_client.get(url)
+
+        assert response['X-Cache'] == 'MISS'
+        assert response.data['guests'] == [action_user.pk]
+
+    def test_board_list_is_cached_per_user(self, user, api_client, created_task_board, action_user):
+        """
+        Test that one user's cached board list is never served to another user.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param action_user:
+        """
+        baker.make('TaskBoard', owner=action_user)
+        api_client.force_authenticate(user=user)
+        api_client.get(f'/{user.username}/boards/')
+
+        api_client.force_authenticate(user=action_user)
+        response = api_client.get(f'/{action_user.username}/boards/')
+
+        assert response['X-Cache'] == 'MISS'
+        assert [board['owner'] for board in response.data] == [action_user.pk]
+
+    def test_hits_and_misses_are_counted(self, user, api_client, created_task_board):
+        """
+        Test that the cache statistics count every hit and miss.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(user=user)
+        before = get_response_cache_stats()
+
+        for _ in range(3):
+            api_client.get(f'/boards/{created_task_board.slug}/tasks/')
+
+        after = get_response_cache_stats()
+        assert after['misses'] - before['misses'] == 1
+        assert after['hits'] - before['hits'] == 2
+
+    def test_unreachable_cache_falls_back_to_the_database(self, user, api_client, created_task_board, create_task,
+                                                          settings):
+        """
+        Test that requests and writes keep working when Redis is down, just without caching.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        :param settings:
+        """
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                       'LOCATION': 'redis://127.0.0.1:1/0'}}
+        api_client.force_authenticate(user=user)
+        before = get_response_cache_stats()
+
+        create = api_client.post(f'/boards/{created_task_board.slug}/tasks/', data={'title': 'Offline'})
+        response = api_client.get(f'/boards/{created_task_board.slug}/tasks/')
+
+        assert create.status_code == status.HTTP_201_CREATED
+        assert response.status_code == status.HTTP_200_OK
+        assert get_response_cache_stats()['errors'] > before['errors']
+
+
+@pytest.mark.django_db
+class TestPublicResponseCache:
+    def warm(self, api_client, url):
+        # The first read learns the board id, the second stores the response under the version read before it
+        for _ in range(2):
+            api_client.get(url)
+
+    def test_public_board_reads_are_shared_and_skip_the_database(self, user, action_user, api_client,
+                                                                 created_task_board, create_task,
+                                                                 django_assert_num_queries):
+        """
+        Test that once warmed by one user, a public board's tasks are served to another user without any query.
+        :param user:
+        :param action_user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        :param django_assert_num_queries:
+        """
+        task = create_task()
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        api_client.force_authenticate(user=user)
+        self.warm(api_client, url)
+        self.warm(api_client, f'{url}{task.slug}/')
+        expected = api_client.get(url).data
+
+        api_client.force_authenticate(user=action_user)
+        with django_assert_num_queries(0):
+            response = api_client.get(url)
+            detail = api_client.get(f'{url}{task.slug}/')
+
+        assert (response['X-Cache'], detail['X-Cache']) == ('HIT', 'HIT')
+        assert response.data == expected
+        assert detail.data['slug'] == task.slug
+
+    def test_public_hits_answer_conditional_requests(self, user, api_client, created_task_board, create_task):
+        """
+        Test that a public hit carries the validators and answers a matching If-None-Match with 304.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        create_task()
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        api_client.force_authenticate(user=user)
+        self.warm(api_client, url)
+
+        etag = api_client.get(url)['ETag']
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_task_writes_retire_public_responses(self, user, api_client, created_task_board, create_task):
+        """
+        Test that editing a task makes the next public read go back to the database and show the edit.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        task = create_task()
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        api_client.force_authenticate(user=user)
+        self.warm(api_client, url)
+
+        api_client.patch(f'{url}{task.slug}/', data={'title': 'Edited'})
+        response = api_client.get(url)
+
+        assert response['X-Cache'] == 'MISS'
+        assert response.data['results'][0]['title'] == 'Edited'
+
+    def test_making_a_board_private_evicts_it_at_once(self, user, action_user, api_client, created_task_board,
+                                                      create_task, local_cache):
+        """
+        Test that as soon as a public board turns private, other users get 403 instead of its cached tasks.
+        :param user:
+        :param action_user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        :param local_cache:
+        """
+        create_task()
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        api_client.force_authenticate(user=action_user)
+        self.warm(api_client, url)
+
+        api_client.force_authenticate(user=user)
+        api_client.patch(f'/{user.username}/boards/{created_task_board.slug}/',
+                         data={'visibility': TaskBoard.VISIBILITY_PRIVATE})
+        api_client.force_authenticate(user=action_user)
+        response = api_client.get(url)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert local_cache.get(PUBLIC_BOARD_KEY.format(created_task_board.slug)) is None
+
+    def test_private_boards_are_never_shared(self, user, api_client, created_task_board, create_task, local_cache):
+        """
+        Test that reading a private board, even as its owner, stores nothing in the public tier.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        :param local_cache:
+        """
+        created_task_board.visibility = TaskBoard.VISIBILITY_PRIVATE
+        created_task_board.save()
+        create_task()
+        api_client.force_authenticate(user=user)
+
+        self.warm(api_client, f'/boards/{created_task_board.slug}/tasks/')
+
+        assert local_cache.get(PUBLIC_BOARD_KEY.format(created_task_board.slug)) is None
+
+    def test_anonymous_users_are_not_served(self, user, api_client, created_task_board):
+        """
+        Test that the public tier still requires authentication.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        api_client.force_authenticate(user=user)
+        self.warm(api_client, url)
+
+        api_client.force_authenticate(user=None)
+        response = api_client.get(url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -1,5 +1,6 @@
 import pytest
 from datetime import timedelta
+from smtplib import SMTPException
 from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
@@ -7,25 +8,22 @@ from django.utils.timezone import now
 from model_bakery import baker
 from rest_framework import status
 
-from tasks.models import Task, TaskBoard
-from tasks.tasks import notify_user_task_is_due_within_24_hours, notify_user_invitation_to_task_board
+from tasks.models import Task, TaskBoard, BoardGuest
+from tasks.tasks import (notify_user_task_is_due_within_24_hours, notify_user_invitation_to_task_board,
+                         dispatch_due_task_reminders, claim_due_reminders)
 
 
 @pytest.mark.django_db
-@patch('tasks.tasks.send_mail') # Mocking the send_mail function
-def test_reminder_email_sent_for_task_due_soon(
-        mock_send_mail, create_task):
+def test_reminder_email_sent_for_task_due_soon(mailoutbox, create_task):
     """
     Testing if the celery task for reminding users via email only sends email if their task is within 24 hours,
     and both reminder_notification and completed are both set to False.
-    Email should  be sent, and mock_send_mail should be called only once, reminder_notification
+    Email should be sent, only one email should be in the outbox, reminder_notification
     should be dynamically updated to True.
 
-    :param mock_send_mail: Comes from the @patch('tasks.tasks.send_mail') decorator and replaces the real send_mail
-    function allowing us to test email sending without spamming real emails, also allows us to use assert_called_
-    with and once to check if emails are sending the correct amount and details.
-
-    :param celery_worker: Sets up a temporary celery worker for our test to be independently tested
+    :param mailoutbox: pytest-django swaps the email backend for the in-memory one, every email sent during the test
+    lands in this list instead of being sent for real.
+    :param create_task:
     """
     due_task = create_task()
 
@@ -33,43 +31,38 @@ def test_reminder_email_sent_for_task_due_soon(
     # Running the task immediately, allowing us to run the task without a broker or worker.
     notify_user_task_is_due_within_24_hours.apply()
 
-    mock_send_mail.assert_called_once() # Ensure only one email is sent to "user"
-    args, kwargs = mock_send_mail.call_args
-    assert kwargs['recipient_list'] == [due_task.created_by.email]
+    assert len(mailoutbox) == 1 # Ensure only one email is sent to "user"
+    assert mailoutbox[0].to == [due_task.created_by.email]
     due_task.refresh_from_db() # fetches the updated due_task object after completing the task, and refreshes
     # the test database to show correct, newly updated value of reminder_notification.
     assert due_task.reminder_notification is True
 
 
 @pytest.mark.django_db
-@patch('tasks.tasks.send_mail')
-def test_no_email_sent_for_task_with_reminder_already_sent(
-        mock_send_mail, create_task):
+def test_no_email_sent_for_task_with_reminder_already_sent(mailoutbox, create_task):
     """
     Testing if the celery task for reminding users via email doesn't send an email if the reminder notification is
     True.
-    Email should not be sent, and mock_send_mail should not be called.
-    :param mock_send_mail:
-    :param celery_worker:
+    Email should not be sent, and the outbox should stay empty.
+    :param mailoutbox:
+    :param create_task:
     """
     due_task = create_task(reminder_notification=True)
 
     notify_user_task_is_due_within_24_hours.apply()
 
-    mock_send_mail.assert_not_called()
+    assert not mailoutbox
 
     due_task.refresh_from_db()
     assert due_task.reminder_notification is True
 
 @pytest.mark.django_db
-@patch('tasks.tasks.send_mail')
-def test_no_email_sent_for_completed_tasks(mock_send_mail, user, create_task):
+def test_no_email_sent_for_completed_tasks(mailoutbox, user, create_task):
     """
     Test if celery task for reminding users via email doesn't send an email if the task is marked as completed.
     reminder_notification is set to false in order to simulate user completing task within 24 hours of due date
-    Email should not be sent, and mock_send_mail should not be called.
-    :param mock_send_mail:
-    :param celery_worker:
+    Email should not be sent, and the outbox should stay empty.
+    :param mailoutbox:
     :param user:
     :param create_task:
     """
@@ -77,22 +70,19 @@ def test_no_email_sent_for_completed_tasks(mock_send_mail, user, create_task):
 
     notify_user_task_is_due_within_24_hours.apply()
 
-    mock_send_mail.assert_not_called()
+    assert not mailoutbox
 
     completed_task.refresh_from_db()
     assert not completed_task.reminder_notification
     assert completed_task.completed is True
 
 @pytest.mark.django_db
-@patch('tasks.tasks.send_mail')
-def test_no_email_sent_if_task_due_in_more_than_24_hours(
-        mock_send_mail, user, create_task):
+def test_no_email_sent_if_task_due_in_more_than_24_hours(mailoutbox, user, create_task):
     """
     Test if celery task for reminding users via email doesn't send an email if the task due date is greater
     than 24 hours.
-    Email should not be sent, and mock_send_mail should not be called.
-    :param mock_send_mail:
-    :param celery_worker:
+    Email should not be sent, and the outbox should stay empty.
+    :param mailoutbox:
     :param user:
     :param create_task:
     """
@@ -101,109 +91,282 @@ def test_no_email_sent_if_task_due_in_more_than_24_hours(
 
     notify_user_task_is_due_within_24_hours.apply()
 
-    mock_send_mail.assert_not_called()
+    assert not mailoutbox
 
     not_yet_due_task.refresh_from_db()
     assert not not_yet_due_task.reminder_notification
     assert not_yet_due_task.completed is False
 
+
+@pytest.mark.django_db
+class TestReminderDigest:
+    def test_one_digest_per_user_lists_all_their_due_tasks(self, mailoutbox, create_task, action_user,
+                                                           created_task_board):
+        """
+        Test that a user with several due tasks receives one email listing all of them, and each user gets their
+        own digest.
+        :param mailoutbox:
+        :param create_task:
+        :param action_user:
+        :param created_task_board:
+        """
+        tasks = [create_task(title=f'due task {i}') for i in range(3)]
+        other_task = baker.make("Task", title='other user task', created_by=action_user, task_board=created_task_board,
+                                deadline=now() + timedelta(hours=23))
+
+        notify_user_task_is_due_within_24_hours.apply()
+
+        assert len(mailoutbox) == 2
+        digest = next(email for email in mailoutbox if email.to == [tasks[0].created_by.email])
+        assert all(task.title in digest.body for task in tasks)
+        assert other_task.title not in digest.body
+
+    def test_reminders_are_claimed_and_read_in_five_queries(self, mailoutbox, create_task, action_user,
+                                                              created_task_board, django_assert_num_queries):
+        """
+        Test that the job claims tasks with one locking SELECT, one UPDATE, one bump of their boards' last_updated and
+        one change log insert, then reads them with their users in one query, however many tasks and users there are.
+        :param mailoutbox:
+        :param create_task:
+        :param action_user:
+        :param created_task_board:
+        :param django_assert_num_queries:
+        """
+        for i in range(4):
+            create_task()
+            baker.make("Task", created_by=action_user, task_board=created_task_board,
+                       deadline=now() + timedelta(hours=23))
+
+        with django_assert_num_queries(5):
+            notify_user_task_is_due_within_24_hours.apply()
+
+        assert not Task.objects.filter(reminder_notification=False).exists()
+
+    def test_failed_digest_leaves_tasks_unflagged(self, create_task):
+        """
+        Test that if a digest can't be sent, its tasks are not marked as notified so the next run retries them.
+        :param create_task:
+        """
+        due_task = create_task()
+
+        with patch('tasks.tasks.get_connection') as mock_get_connection:
+            connection = mock_get_connection.return_value.__enter__.return_value
+            connection.send_messages.side_effect = ConnectionRefusedError
+            result = notify_user_task_is_due_within_24_hours.apply()
+
+        due_task.refresh_from_db()
+        assert due_task.reminder_notification is False
+        assert result.result['emails_failed'] == 1
+
+    def test_unreachable_smtp_server_releases_every_claim(self, create_task):
+        """
+        Test that if the SMTP connection can't even be opened, the due tasks are left unflagged for the next run.
+        :param create_task:
+        """
+        due_task = create_task()
+
+        with patch('tasks.tasks.get_connection') as mock_get_connection:
+            mock_get_connection.return_value.__enter__.side_effect = ConnectionRefusedError
+            with pytest.raises(ConnectionRefusedError):
+                notify_user_task_is_due_within_24_hours.apply(throw=True)
+
+        due_task.refresh_from_db()
+        assert due_task.reminder_notification is False
+
+    def test_reminders_are_claimed_in_bounded_chunks(self, create_task, action_user, created_task_board):
+        """
+        Test that each claim flags at most a chunk of tasks, never splits a recipient's tasks across chunks, and
+        resumes after the last task it claimed.
+        :param create_task:
+        :param action_user:
+        :param created_task_board:
+        """
+        owner_tasks = [create_task(), create_task()]
+        guest_tasks = baker.make('Task', created_by=action_user, task_board=created_task_board,
+                                 deadline=now() + timedelta(hours=23), _quantity=2)
+        recipients = sorted([(created_task_board.owner_id, owner_tasks), (action_user.pk, guest_tasks)])
+
+        first, more = claim_due_reminders(0, 1, chunk_size=3)
+        task_id, recipient_id = first[-1]
+        second, more_after_second = claim_due_reminders(0, 1, after=(recipient_id, task_id), chunk_size=3)
+
+        assert more and not more_after_second
+        assert [[task_id for task_id, _ in claimed] for claimed in (first, second)] == [
+            [task.pk for task in tasks] for _, tasks in recipients]
+        assert not Task.objects.filter(reminder_notification=False).exists()
+
+    def test_run_reports_throughput(self, mailoutbox, create_task):
+        """
+        Test that the job returns how many tasks and emails it handled and how long the run took.
+        :param mailoutbox:
+        :param create_task:
+        """
+        create_task()
+        create_task()
+
+        result = notify_user_task_is_due_within_24_hours.apply()
+
+        assert result.result['tasks_notified'] == 2
+        assert result.result['emails_sent'] == 1
+        assert result.result['duration_seconds'] >= 0
+        assert 'tasks_per_second' in result.result
+
+@pytest.mark.django_db
+class TestReminderShards:
+    def test_shards_split_recipients_without_overlap(self, mailoutbox, create_task, action_user, created_task_board):
+        """
+        Test that running every shard sends each user exactly one digest, and together the shards flag every task.
+        :param mailoutbox:
+        :param create_task:
+        :param action_user:
+        :param created_task_board:
+        """
+        create_task()
+        baker.make("Task", created_by=action_user, task_board=created_task_board, deadline=now() + timedelta(hours=23))
+
+        results = [notify_user_task_is_due_within_24_hours.apply(args=(shard, 2)).result for shard in range(2)]
+
+        assert sorted(email.to[0] for email in mailoutbox) == sorted([created_task_board.owner.email, action_user.email])
+        assert sum(result['tasks_notified'] for result in results) == 2
+        assert not Task.objects.filter(reminder_notification=False).exists()
+
+    def test_claimed_reminders_are_not_sent_twice(self, mailoutbox, create_task):
+        """
+        Test that once a run has claimed a reminder, an overlapping or later run does not email it again.
+        :param mailoutbox:
+        :param create_task:
+        """
+        create_task()
+
+        notify_user_task_is_due_within_24_hours.apply()
+        result = notify_user_task_is_due_within_24_hours.apply()
+
+        assert len(mailoutbox) == 1
+        assert result.result['tasks_notified'] == 0
+
+    @patch('tasks.tasks.group')
+    def test_dispatch_fans_out_one_job_per_shard(self, mock_group, settings):
+        """
+        Test that the beat entry point dispatches a Celery group with one reminder job per configured shard.
+        :param mock_group:
+        :param settings:
+        """
+        settings.TASK_REMINDER_SHARDS = 3
+
+        dispatch_due_task_reminders.apply()
+
+        signatures = list(mock_group.call_args.args[0])
+        assert [signature.args for signature in signatures] == [(0, 3), (1, 3), (2, 3)]
+        mock_group.return_value.apply_async.assert_called_once()
+
+
 @pytest.mark.django_db
-@patch('tasks.tasks.send_mail')
+@patch('tasks.views.notify_user_invitation_to_task_board.delay') # Mocking the queueing of the background job
 class TestSendInvitationEmail:
-    def test_send_invitation_email(self, mock_send_mail, api_client, valid_board_data, user, action_user):
+    def test_send_invitation_email(self, mock_delay, api_client, valid_board_data, user, action_user,
+                                   django_capture_on_commit_callbacks):
         """
-        Testing celery task for sending invitation email. Email should be sent and mock_send_mail should only be
-        called once, ensuring only one email is sent to the user.
-        :param mock_send_mail:
+        Testing the invitation email is queued as a background job once the invite is committed. It should be
+        queued only once, with primary keys rather than model instances.
+        :param mock_delay:
         :param api_client:
         :param valid_board_data:
         :param user:
+        :param django_capture_on_commit_callbacks: Runs the transaction.on_commit callbacks, the test itself runs
+        inside a transaction that is never committed.
         :return:
         """
         api_client.force_authenticate(user)
         api_client.post(f'/{user.username}/boards/', data=valid_board_data)
 
-        api_client.post(f"/boards/{valid_board_data['slug']}/invite/", data={
-            'action': 'invite',
-            'username': action_user.username
-        })
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(f"/boards/{valid_board_data['slug']}/invite/", data={
+                'action': 'invite',
+                'username': action_user.username
+            })
 
-        mock_send_mail.assert_called_once()
-        args, kwargs = mock_send_mail.call_args
-        assert kwargs['recipient_list'] == [action_user.email]
+        task_board = TaskBoard.objects.get(slug=valid_board_data['slug'])
+        mock_delay.assert_called_once_with(action_user.pk, user.pk, task_board.pk)
 
     def test_send_invitation_email_doesnt_send_if_not_authorized(
-            self, mock_send_mail, api_client, valid_board_data, user, action_user):
+            self, mock_delay, api_client, valid_board_data, user, action_user, django_capture_on_commit_callbacks):
         """
-        Test celery task for sending invitation email isn't sent if inviting user is not authorized.
-        :param mock_send_mail:
+        Test invitation email job isn't queued if inviting user is not authorized.
+        :param mock_delay:
         :param api_client:
         :param valid_board_data:
         :param user:
         :param invited_user:
+        :param django_capture_on_commit_callbacks:
         :return:
         """
         api_client.force_authenticate(user)
         api_client.post(f'/{user.username}/boards/', data=valid_board_data)
         api_client.logout()
 
-        api_client.post(f"/boards/{valid_board_data['slug']}/invite/", data={
-            'action': 'invite',
-            'username': action_user.username
-        })
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(f"/boards/{valid_board_data['slug']}/invite/", data={
+                'action': 'invite',
+                'username': action_user.username
+            })
 
-        mock_send_mail.assert_not_called()
+        mock_delay.assert_not_called()
 
     def test_send_invitation_email_not_called_if_invalid_invited_user(
-            self, mock_send_mail, api_client, valid_board_data, user, action_user):
+            self, mock_delay, api_client, valid_board_data, user, action_user, django_capture_on_commit_callbacks):
         """
-        Test celery task for sending invitation email doesn't send if invalid user for invited user.
-        :param mock_send_mail:
+        Test invitation email job isn't queued if invalid user for invited user.
+        :param mock_delay:
         :param api_client:
         :param valid_board_data:
         :param user:
         :param invited_user:
+        :param django_capture_on_commit_callbacks:
         :return:
         """
         api_client.force_authenticate(user)
         api_client.post(f'/{user.username}/boards/', data=valid_board_data)
 
-        api_client.post(f"/boards/{valid_board_data['slug']}/invite/", data={
-            'action': 'invite',
-            'username': 'usernamedoesnotexist'
-        })
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(f"/boards/{valid_board_data['slug']}/invite/", data={
+                'action': 'invite',
+                'username': 'usernamedoesnotexist'
+            })
 
-        mock_send_mail.assert_not_called()
+        mock_delay.assert_not_called()
 
     def test_send_invitation_email_doesnt_send_if_board_slug_invalid(
-            self, mock_send_mail, api_client, valid_board_data, user, action_user):
+            self, mock_delay, api_client, valid_board_data, user, action_user, django_capture_on_commit_callbacks):
         """
-        Test celery task for sending invitation email doesn't send if board slug is invalid.
-        :param mock_send_mail:
+        Test invitation email job isn't queued if board slug is invalid.
+        :param mock_delay:
         :param api_client:
         :param valid_board_data:
         :param user:
         :param invited_user:
+        :param django_capture_on_commit_callbacks:
         :return:
         """
         api_client.force_authenticate(user)
         api_client.post(f'/{user.username}/boards/', data=valid_board_data)
 
-        api_client.post(f"/boards/slug-doesnt-exist/invite/", data={
-            'action': 'invite',
-            'username': action_user.username
-        })
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(f"/boards/slug-doesnt-exist/invite/", data={
+                'action': 'invite',
+                'username': action_user.username
+            })
 
-        mock_send_mail.assert_not_called()
+        mock_delay.assert_not_called()
 
     def test_send_invitation_email_does_not_send_if_not_board_owner(
-            self, mock_send_mail, api_client, user, action_user):
+            self, mock_delay, api_client, user, action_user, django_capture_on_commit_callbacks):
         """
-        Test celery task for sending invitation email doesn't send if user inviting another is not the board owner.
-        :param mock_send_mail:
+        Test invitation email job isn't queued if user inviting another is not the board owner.
+        :param mock_delay:
         :param api_client:
         :param user:
         :param invited_user:
+        :param django_capture_on_commit_callbacks:
         :return:
         """
         User = get_user_model()
@@ -225,15 +388,77 @@ class TestSendInvitationEmail:
         api_client.logout()
         api_client.force_authenticate(user) # authenticating test user - not the board owner
 
-        api_client.post(f"/boards/{data['slug']}/invite/", data={
-            'action': 'invite',
-            'username': action_user.username
-        }) # trying to invite user as test user - not the board owner
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(f"/boards/{data['slug']}/invite/", data={
+                'action': 'invite',
+                'username': action_user.username
+            }) # trying to invite user as test user - not the board owner
 
-        mock_send_mail.assert_not_called()
+        mock_delay.assert_not_called()
 
 
+@pytest.mark.django_db
+class TestInvitationEmailJob:
+    def test_invitation_email_sent_to_guest(self, mailoutbox, user, action_user, created_task_board):
+        """
+        Test the invitation job emails the invited guest and records when the invitation was sent.
+        :param mailoutbox:
+        :param user:
+        :param action_user:
+        :param created_task_board:
+        """
+        created_task_board.guests.add(action_user)
+
+        notify_user_invitation_to_task_board.apply(args=(action_user.pk, user.pk, created_task_board.pk))
+
+        assert len(mailoutbox) == 1
+        assert mailoutbox[0].to == [action_user.email]
+        assert BoardGuest.objects.get(task_board=created_task_board, user=action_user).invitation_sent_at
+
+    def test_duplicate_invitation_job_does_not_resend(self, mailoutbox, user, action_user, created_task_board):
+        """
+        Test that delivering the same invitation job twice only sends one email.
+        :param mailoutbox:
+        :param user:
+        :param action_user:
+        :param created_task_board:
+        """
+        created_task_board.guests.add(action_user)
 
+        notify_user_invitation_to_task_board.apply(args=(action_user.pk, user.pk, created_task_board.pk))
+        result = notify_user_invitation_to_task_board.apply(args=(action_user.pk, user.pk, created_task_board.pk))
 
+        assert len(mailoutbox) == 1
+        assert result.result is False
+
+    def test_removed_guest_is_not_emailed(self, mailoutbox, user, action_user, created_task_board):
+        """
+        Test that a guest removed before the job runs is not sent an invitation.
+        :param mailoutbox:
+        :param user:
+        :param action_user:
+        :param created_task_board:
+        """
+        created_task_board.guests.add(action_user)
+        created_task_board.guests.remove(action_user)
+
+        notify_user_invitation_to_task_board.apply(args=(action_user.pk, user.pk, created_task_board.pk))
+
+        assert not mailoutbox
+
+    @patch('tasks.tasks.send_mail', side_effect=SMTPException('mail server down'))
+    def test_failed_invitation_is_retried_and_released(self, mock_send_mail, user, action_user, created_task_board):
+        """
+        Test that an SMTP failure retries the job, and releases the claim so a later delivery can still send it.
+        :param mock_send_mail:
+        :param user:
+        :param action_user:
+        :param created_task_board:
+        """
+        created_task_board.guests.add(action_user)
 
+        result = notify_user_invitation_to_task_board.apply(args=(action_user.pk, user.pk, created_task_board.pk))
 
+        assert result.failed()
+        assert mock_send_mail.call_count > 1
+        assert BoardGuest.objects.get(task_board=created_task_board, user=action_user).invitation_sent_at is None
@@ -0,0 +1,177 @@
+from datetime import timedelta
+
+import pytest
+from django.utils.timezone import now
+from model_bakery import baker
+
+from rest_framework import status
+
+from tasks.changes import prune_change_log
+from tasks.models import ChangeLogEntry
+
+
+@pytest.mark.django_db
+class TestTaskChangeFeed:
+    def changes(self, api_client, board, **params):
+        return api_client.get(f'/boards/{board.slug}/tasks/changes/', data=params)
+
+    def test_returns_only_the_changes_after_the_cursor(self, api_client, created_task_board, create_task):
+        """
+        Test that a client syncing from a cursor gets the created, updated and deleted tasks and nothing older.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        unchanged, updated, deleted = create_task(), create_task(), create_task()
+        api_client.force_authenticate(created_task_board.owner)
+        cursor = self.changes(api_client, created_task_board).data['cursor']
+
+        created = create_task()
+        updated.title = 'Renamed'
+        updated.save()
+        deleted_id = deleted.pk
+        deleted.delete()
+        response = self.changes(api_client, created_task_board, since=cursor)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [(change['action'], change['id']) for change in response.data['changes']] == [
+            ('upsert', created.pk), ('upsert', updated.pk), ('delete', deleted_id)]
+        assert response.data['changes'][1]['data']['title'] == 'Renamed'
+        assert response.data['changes'][2]['data'] is None
+        assert unchanged.pk not in [change['id'] for change in response.data['changes']]
+
+        response = self.changes(api_client, created_task_board, since=response.data['cursor'])
+        assert response.data['changes'] == []
+
+    def test_repeated_edits_are_sent_once(self, api_client, created_task_board, create_task):
+        """
+        Test that a task changed many times since the cursor appears once, at the position of its last change.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        first, second = create_task(), create_task()
+        api_client.force_authenticate(created_task_board.owner)
+        cursor = self.changes(api_client, created_task_board).data['cursor']
+
+        for title in ('One', 'Two', 'Three'):
+            first.title = title
+            first.save()
+            second.completed = title != 'Three'
+            second.save()
+        first.title = 'Four'
+        first.save()
+        response = self.changes(api_client, created_task_board, since=cursor)
+
+        assert [change['id'] for change in response.data['changes']] == [second.pk, first.pk]
+        assert response.data['changes'][1]['data']['title'] == 'Four'
+
+    def test_bulk_writes_are_recorded(self, api_client, created_task_board, create_task):
+        """
+        Test that tasks created, updated and deleted through the bulk endpoint appear in the feed.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        updated, deleted = create_task(), create_task()
+        api_client.force_authenticate(created_task_board.owner)
+        cursor = self.changes(api_client, created_task_board).data['cursor']
+
+        bulk = api_client.post(f'/boards/{created_task_board.slug}/tasks/bulk/', data={
+            'create': [{'title': 'New'}],
+            'update': [{'slug': updated.slug, 'completed': True}],
+            'delete': [deleted.slug],
+        }, format='json')
+        response = self.changes(api_client, created_task_board, since=cursor)
+
+        assert {(change['action'], change['id']) for change in response.data['changes']} == {
+            ('upsert', bulk.data['create'][0]['id']), ('upsert', updated.pk), ('delete', deleted.pk)}
+
+    def test_pages_follow_the_cursor(self, api_client, created_task_board, create_task, monkeypatch):
+        """
+        Test that a long backlog of changes is paged, and has_more stays true until the last page.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        :param monkeypatch:
+        """
+        monkeypatch.setattr('tasks.changes.CHANGE_FEED_PAGE_SIZE', 2)
+        api_client.force_authenticate(created_task_board.owner)
+        cursor = self.changes(api_client, created_task_board).data['cursor']
+        tasks = [create_task() for _ in range(3)]
+
+        first_page = self.changes(api_client, created_task_board, since=cursor).data
+        last_page = self.changes(api_client, created_task_board, since=first_page['cursor']).data
+
+        assert first_page['has_more'] and not last_page['has_more']
+        assert [change['id'] for change in first_page['changes'] + last_page['changes']] == [
+            task.pk for task in tasks]
+
+    def test_board_changes_are_recorded(self, api_client, created_task_board):
+        """
+        Test that saving the board itself shows up as a board change.
+        :param api_client:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(created_task_board.owner)
+        cursor = self.changes(api_client, created_task_board).data['cursor']
+
+        created_task_board.title = 'Renamed board'
+        created_task_board.save()
+        response = self.changes(api_client, created_task_board, since=cursor)
+
+        assert response.data['changes'] == [
+            {'type': 'board', 'action': 'upsert', 'id': created_task_board.pk, 'data': None}]
+
+    def test_pruned_cursor_returns_410(self, api_client, created_task_board, create_task):
+        """
+        Test that a cursor older than the retained log is refused, so the client downloads the board again.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        api_client.force_authenticate(created_task_board.owner)
+        cursor = self.changes(api_client, created_task_board).data['cursor']
+        create_task(), create_task()
+
+        prune_change_log(now() + timedelta(seconds=1))
+        response = self.changes(api_client, created_task_board, since=cursor)
+
+        assert response.status_code == status.HTTP_410_GONE
+        assert ChangeLogEntry.objects.count() == 1 # The newest entry is always kept
+
+    def test_quiet_board_cursor_survives_pruning(self, api_client, created_task_board, create_task, action_user):
+        """
+        Test that a client in sync with a board nobody touches keeps a valid cursor while other boards fill the log
+        and old entries are pruned.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        :param action_user:
+        """
+        api_client.force_authenticate(created_task_board.owner)
+        create_task()
+        cursor = self.changes(api_client, created_task_board).data['cursor']
+        busy_board = baker.make('TaskBoard', owner=action_user)
+        baker.make('Task', task_board=busy_board, created_by=action_user, _quantity=3)
+        ChangeLogEntry.objects.update(created_at=now() - timedelta(days=40)) # Time passing
+
+        cursor = self.changes(api_client, created_task_board, since=cursor).data['cursor']
+        baker.make('Task', task_board=busy_board, created_by=action_user)
+        prune_change_log(now() - timedelta(days=30))
+        response = self.changes(api_client, created_task_board, since=cursor)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['changes'] == []
+
+    def test_invalid_cursor_returns_400(self, api_client, created_task_board):
+        """
+        Test that a cursor that is not a non-negative integer is rejected.
+        :param api_client:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(created_task_board.owner)
+
+        response = self.changes(api_client, created_task_board, since='abc')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,108 @@
+import re
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from tasks.models import Task, TaskBoard, TaskSearchTerm
+
+
+@pytest.mark.django_db
+class TestBenchmarkReminderScan:
+    def test_benchmark_seeds_scans_and_cleans_up(self):
+        """
+        Test that the reminder scan benchmark runs end to end on a small table and removes its seeded tasks.
+        """
+        out = StringIO()
+
+        call_command('benchmark_reminder_scan', tasks=300, tasks_per_board=100, batch_size=40, runs=2, stdout=out)
+
+        assert 'Scanned 300 tasks' in out.getvalue()
+        assert not Task.objects.exists()
+
+
+@pytest.mark.django_db
+class TestRebuildSearchIndex:
+    def test_rebuild_indexes_every_task(self, create_task):
+        """
+        Test that rebuilding the index restores the terms of tasks whose terms are missing.
+        :param create_task:
+        """
+        tasks = [create_task(title=f'Rebuild {index}', description='') for index in range(3)]
+        TaskSearchTerm.objects.all().delete()
+
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+
+        assert set(TaskSearchTerm.objects.filter(term='rebuild').values_list('task_id', flat=True)) == \
+            {task.pk for task in tasks}
+
+
+@pytest.mark.django_db
+class TestRebuildLocalIdCounters:
+    def test_counters_move_past_existing_tasks(self, created_task_board, create_task):
+        """
+        Test that a board whose counter lags behind its tasks, as on boards from before the counter, can create tasks
+        again once the command has run.
+        :param created_task_board:
+        :param create_task:
+        """
+        create_task(), create_task()
+        TaskBoard.objects.filter(pk=created_task_board.pk).update(next_local_id=1)
+        out = StringIO()
+
+        call_command('rebuild_local_id_counters', batch_size=1, stdout=out)
+        task = create_task()
+
+        assert 'Fixed the local_id counters of 1 boards' in out.getvalue()
+        assert task.local_id == 3
+
+    def test_counters_are_never_lowered(self, created_task_board, create_task):
+        """
+        Test that a counter already past the tasks, e.g. after deletes, keeps its value so ids are never reused.
+        :param created_task_board:
+        :param create_task:
+        """
+        create_task()
+        TaskBoard.objects.filter(pk=created_task_board.pk).update(next_local_id=10)
+
+        call_command('rebuild_local_id_counters', stdout=StringIO())
+
+        created_task_board.refresh_from_db()
+        assert created_task_board.next_local_id == 10
+
+
+@pytest.mark.django_db
+class TestImportTasks:
+    def test_import_creates_tasks_and_reports_failed_lines(self, created_task_board, tmp_path):
+        """
+        Test that the command imports a CSV file into the board and reports failed rows by line on stderr.
+        :param created_task_board:
+        :param tmp_path:
+        """
+        path = tmp_path / 'tasks.csv'
+        path.write_text('title,priority\nFirst,L\nSecond,X\nThird,\n')
+        out, err = StringIO(), StringIO()
+
+        call_command('import_tasks', created_task_board.slug, str(path), batch_size=1, stdout=out, stderr=err)
+
+        assert 'Imported 2 tasks' in out.getvalue()
+        assert err.getvalue().startswith('Line 3:')
+        assert list(Task.objects.filter(task_board=created_task_board).order_by('local_id')
+                    .values_list('title', flat=True)) == ['First', 'Third']
+
+
+class TestBenchmarkSettings:
+    def test_both_profiles_start_and_answer(self):
+        """
+        Test that the current stack and the lean production profile both load and answer the API's 401, and that the
+        lean one leaves out the development apps and browser middleware.
+        """
+        out = StringIO()
+
+        call_command('benchmark_settings', requests=10, runs=1, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        current, lean = (re.match(r'\w+ \([\w.]+\): (\d+) apps, (\d+) middleware', line).groups() for line in lines[:2])
+        assert int(lean[0]) < int(current[0]) and int(lean[1]) < int(current[1])
+        assert all(line.endswith('answered 401 Unauthorized') for line in lines[:2])
+        assert lines[2].startswith('lean vs current:')
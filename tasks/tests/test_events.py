@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+import pytest
+import redis.asyncio
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+from tasks.async_views import board_events
+from tasks.events import CHANNEL, RedisBroker, get_broker
+from tasks.models import BoardGuest, TaskBoard
+
+
+def open_stream(user, board):
+    request = RequestFactory().get(f'/boards/{board.slug}/events/',
+                                   HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(user)}')
+    return board_events(request, board_slug=board.slug)
+
+
+class FakePubSub:
+    """Stands in for a Redis pub/sub connection, messages are put on its inbox by the test."""
+
+    def __init__(self):
+        self.channels, self.inbox, self.closed = set(), asyncio.Queue(), False
+
+    async def subscribe(self, channel):
+        self.channels.add(channel)
+
+    async def unsubscribe(self, channel):
+        self.channels.discard(channel)
+
+    async def get_message(self, timeout):
+        return await self.inbox.get()
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeRedis:
+    def __init__(self):
+        self.connection = FakePubSub()
+
+    def pubsub(self, **options):
+        return self.connection
+
+    async def aclose(self):
+        pass
+
+
+@pytest.mark.django_db
+class TestBoardEvents:
+    def test_task_writes_are_published_once_committed(self, created_task_board, create_task, monkeypatch,
+                                                      django_capture_on_commit_callbacks):
+        """
+        Test that creating and deleting a task announces both on the board's channel, and only after the commit.
+        :param created_task_board:
+        :param create_task:
+        :param monkeypatch:
+        :param django_capture_on_commit_callbacks:
+        """
+        published = []
+        monkeypatch.setattr(get_broker(), 'publish', lambda board_id, message: published.append((board_id, message)))
+
+        with django_capture_on_commit_callbacks(execute=True):
+            task = create_task()
+            assert published == []
+        task_id = task.pk
+        with django_capture_on_commit_callbacks(execute=True):
+            task.delete()
+
+        assert published == [(created_task_board.pk, {'action': 'upsert', 'ids': [task_id]}),
+                             (created_task_board.pk, {'action': 'delete', 'ids': [task_id]})]
+
+    def test_stream_relays_board_events(self, created_task_board):
+        """
+        Test that the event stream sends the reconnect delay, then every event published for the board.
+        :param created_task_board:
+        """
+        async def scenario():
+            response = await open_stream(created_task_board.owner, created_task_board)
+            stream = aiter(response.streaming_content)
+            chunks = [await anext(stream)]
+            get_broker().publish(created_task_board.pk, {'action': 'upsert', 'ids': [1]})
+            chunks.append(await anext(stream))
+            await stream.aclose()
+            return response, chunks
+
+        response, chunks = async_to_sync(scenario)()
+
+        assert response['Content-Type'] == 'text/event-stream'
+        assert chunks == [b'retry: 5000\n\n', b'event: changes\ndata: {"action": "upsert", "ids": [1]}\n\n']
+
+    def test_private_board_of_another_user_returns_403(self, action_user, created_task_board):
+        """
+        Test that the stream applies the same access rules as the task endpoints.
+        :param action_user:
+        :param created_task_board:
+        """
+        created_task_board.visibility = TaskBoard.VISIBILITY_PRIVATE
+        created_task_board.save()
+
+        response = async_to_sync(open_stream)(action_user, created_task_board)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_stream_ends_once_access_is_revoked(self, action_user, created_task_board, settings):
+        """
+        Test that a guest removed from a private board stops receiving its events at the next access check.
+        :param action_user:
+        :param created_task_board:
+        :param settings:
+        """
+        settings.SSE_HEARTBEAT_SECONDS = 0
+        created_task_board.visibility = TaskBoard.VISIBILITY_PRIVATE
+        created_task_board.save()
+        created_task_board.guests.add(action_user)
+
+        async def scenario():
+            response = await open_stream(action_user, created_task_board)
+            stream = aiter(response.streaming_content)
+            await anext(stream)
+            await BoardGuest.objects.filter(task_board=created_task_board, user=action_user).adelete()
+            return [chunk async for chunk in stream]
+
+        assert async_to_sync(scenario)() == []
+
+
+class TestRedisBroker:
+    def test_streams_of_a_process_share_one_connection(self, monkeypatch):
+        """
+        Test that every stream of an event loop reads from one pub/sub connection, which delivers each message to the
+        streams of its board only and closes with the last stream.
+        :param monkeypatch:
+        """
+        clients = []
+
+        def connect(location):
+            clients.append(FakeRedis())
+            return clients[-1]
+
+        monkeypatch.setattr(redis.asyncio.Redis, 'from_url', connect)
+        broker = RedisBroker('redis://localhost:6379')
+
+        async def scenario():
+            first, second, other = [await broker.subscribe(board_id) for board_id in (1, 1, 2)]
+            connection = clients[0].connection
+            subscribed = set(connection.channels)
+            connection.inbox.put_nowait({'channel': CHANNEL.format(1).encode(),
+                                         'data': json.dumps({'action': 'upsert', 'ids': [7]})})
+            received = [await first.get(1), await second.get(1), await other.get(0.05)]
+            for subscription in (first, second, other):
+                await subscription.close()
+            return subscribed, received, connection.closed
+
+        subscribed, received, closed = async_to_sync(scenario)()
+
+        assert len(clients) == 1
+        assert subscribed == {CHANNEL.format(1), CHANNEL.format(2)}
+        assert received == [{'action': 'upsert', 'ids': [7]}] * 2 + [None]
+        assert closed and broker.hubs == {}
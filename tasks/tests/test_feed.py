@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+import pytest
+from django.utils.timezone import now
+from model_bakery import baker
+
+from rest_framework import status
+
+from tasks.models import Task
+
+
+@pytest.mark.django_db
+class TestTaskFeed:
+    def test_feed_spans_owned_and_guest_boards(self, user, action_user, api_client, create_task):
+        """
+        Test that the feed lists the tasks of boards the user owns or guests on, and nothing else.
+        :param user:
+        :param action_user:
+        :param api_client:
+        :param create_task:
+        """
+        owned = create_task()
+        guest_board = baker.make('TaskBoard', owner=action_user)
+        guest_board.guests.add(user)
+        on_guest_board = baker.make('Task', task_board=guest_board, created_by=action_user)
+        baker.make('Task', task_board=baker.make('TaskBoard', owner=action_user), created_by=action_user)
+        api_client.force_authenticate(user=user)
+
+        response = api_client.get('/tasks/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [task['id'] for task in response.data['results']] == [on_guest_board.pk, owned.pk]
+        assert response.data['results'][0]['task_board_slug'] == guest_board.slug
+
+    def test_feed_filters(self, user, api_client, create_task):
+        """
+        Test that the feed filters by completed, priority and deadline range.
+        :param user:
+        :param api_client:
+        :param create_task:
+        """
+        soon = create_task(priority=Task.PRIORITY_HIGH, deadline=now() + timedelta(hours=2))
+        create_task(priority=Task.PRIORITY_HIGH, deadline=now() + timedelta(days=10))
+        create_task(priority=Task.PRIORITY_LOW, deadline=now() + timedelta(hours=2))
+        create_task(priority=Task.PRIORITY_HIGH, deadline=now() + timedelta(hours=2), completed=True)
+        api_client.force_authenticate(user=user)
+
+        response = api_client.get('/tasks/', data={
+            'completed': 'false', 'priority': Task.PRIORITY_HIGH,
+            'deadline_before': (now() + timedelta(days=1)).isoformat(),
+        })
+
+        assert [task['id'] for task in response.data['results']] == [soon.pk]
+
+    def test_feed_is_one_query_per_page(self, user, action_user, api_client, create_task,
+                                        django_assert_num_queries):
+        """
+        Test that a page of the feed costs one query however many boards the tasks come from.
+        :param user:
+        :param action_user:
+        :param api_client:
+        :param create_task:
+        :param django_assert_num_queries:
+        """
+        create_task()
+        for _ in range(3):
+            board = baker.make('TaskBoard', owner=action_user)
+            board.guests.add(user)
+            baker.make('Task', task_board=board, created_by=action_user, _quantity=2)
+        api_client.force_authenticate(user=user)
+
+        with django_assert_num_queries(1):
+            response = api_client.get('/tasks/', data={'page_size': 5})
+
+        assert len(response.data['results']) == 5
+        assert response.data['next'] is not None
+
+    def test_if_user_is_anonymous_return_401(self, api_client):
+        """
+        Test that the feed requires authentication.
+        :param api_client:
+        """
+        response = api_client.get('/tasks/')
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
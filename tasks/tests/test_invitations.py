@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 
 from rest_framework import status
 
+from tasks.models import BoardGuest, TaskBoard
+
 @pytest.mark.django_db
 class TestPostInvitation:
     def test_post_invitation_if_user_is_anonymous_returns_401(self, api_client, user, valid_board_data, action_user):
@@ -350,7 +352,118 @@ class TestPostInvitationRemove:
         assert response.data
 
 
+@pytest.mark.django_db
+class TestGuestRoles:
+    def test_viewer_guest_can_read_private_board_tasks_returns_200(self, api_client, user, created_task_board,
+                                                                   action_user):
+        """
+        Test that a guest invited as a viewer can read the tasks of a private task board.
+        :param api_client:
+        :param user:
+        :param created_task_board:
+        :param action_user:
+        """
+        created_task_board.visibility = TaskBoard.VISIBILITY_PRIVATE
+        created_task_board.save()
+        api_client.force_authenticate(user)
+        api_client.post(f"/boards/{created_task_board.slug}/invite/", data={
+            "action": "invite",
+            "username": action_user.username,
+            "role": BoardGuest.ROLE_VIEWER})
+        api_client.force_authenticate(action_user)
+
+        response = api_client.get(f"/boards/{created_task_board.slug}/tasks/")
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_viewer_guest_cannot_create_tasks_returns_403(self, api_client, user, created_task_board, action_user,
+                                                          valid_task_data):
+        """
+        Test that a guest invited as a viewer cannot add tasks to the task board.
+        :param api_client:
+        :param user:
+        :param created_task_board:
+        :param action_user:
+        :param valid_task_data:
+        """
+        created_task_board.guests.add(action_user, through_defaults={'role': BoardGuest.ROLE_VIEWER})
+        api_client.force_authenticate(action_user)
+
+        response = api_client.post(f"/boards/{created_task_board.slug}/tasks/", data=valid_task_data)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_invited_guests_are_editors_by_default_returns_201(self, api_client, user, created_task_board, action_user,
+                                                               valid_task_data):
+        """
+        Test that a guest invited without a role can add tasks, and their membership records when they joined.
+        :param api_client:
+        :param user:
+        :param created_task_board:
+        :param action_user:
+        :param valid_task_data:
+        """
+        api_client.force_authenticate(user)
+        api_client.post(f"/boards/{created_task_board.slug}/invite/", data={
+            "action": "invite",
+            "username": action_user.username})
+        api_client.force_authenticate(action_user)
+
+        response = api_client.post(f"/boards/{created_task_board.slug}/tasks/", data=valid_task_data)
+
+        membership = BoardGuest.objects.get(task_board=created_task_board, user=action_user)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert membership.role == BoardGuest.ROLE_EDITOR
+        assert membership.joined_at
+
+    def test_invite_with_invalid_role_returns_400(self, api_client, user, created_task_board, action_user):
+        """
+        Test that inviting a guest with a role that doesn't exist returns 400 and does not add the guest.
+        :param api_client:
+        :param user:
+        :param created_task_board:
+        :param action_user:
+        """
+        api_client.force_authenticate(user)
 
+        response = api_client.post(f"/boards/{created_task_board.slug}/invite/", data={
+            "action": "invite",
+            "username": action_user.username,
+            "role": "ADMIN"})
 
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not created_task_board.has_guest(action_user)
 
+    def test_invite_with_non_string_role_returns_400(self, api_client, user, created_task_board, action_user):
+        """
+        Test that a role sent as a JSON list or object returns 400 rather than failing the request.
+        :param api_client:
+        :param user:
+        :param created_task_board:
+        :param action_user:
+        """
+        api_client.force_authenticate(user)
+
+        responses = [api_client.post(f"/boards/{created_task_board.slug}/invite/", data={
+            "action": "invite",
+            "username": action_user.username,
+            "role": role}, format='json') for role in ([BoardGuest.ROLE_VIEWER], {"role": BoardGuest.ROLE_VIEWER})]
+
+        assert [response.status_code for response in responses] == [status.HTTP_400_BAD_REQUEST] * 2
+        assert not created_task_board.has_guest(action_user)
+
+    def test_membership_check_is_a_single_query(self, created_task_board, action_user, django_assert_num_queries):
+        """
+        Test that checking guest membership runs one query, however many guests the task board has.
+        :param created_task_board:
+        :param action_user:
+        :param django_assert_num_queries:
+        """
+        User = get_user_model()
+        for i in range(20):
+            created_task_board.guests.add(
+                User.objects.create(username=f'guest{i}', email=f'guest{i}@example.com'))
+        created_task_board.guests.add(action_user)
 
+        with django_assert_num_queries(1):
+            assert created_task_board.has_guest(action_user)
@@ -0,0 +1,120 @@
+import re
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from rest_framework import status
+
+from tasks.metrics import get_view_metrics
+
+
+@pytest.mark.django_db
+class TestAPIMetrics:
+    def test_sampled_requests_report_server_timing(self, user, api_client, created_task_board, create_task,
+                                                   settings):
+        """
+        Test that a sampled request reports its queries and timings in Server-Timing and in the view's totals.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        :param settings:
+        """
+        settings.API_METRICS_SAMPLE_RATE = 1
+        create_task()
+        api_client.force_authenticate(user=user)
+        before = get_view_metrics().get('TaskViewSet.list', {'requests': 0, 'queries': 0})
+
+        response = api_client.get(f'/boards/{created_task_board.slug}/tasks/')
+
+        timing = re.fullmatch(r'db;dur=[\d.]+;desc="(\d+) queries", serialize;dur=[\d.]+, total;dur=[\d.]+',
+                              response['Server-Timing'])
+        assert timing is not None
+        after = get_view_metrics()['TaskViewSet.list']
+        assert after['requests'] - before['requests'] == 1
+        assert after['queries'] - before['queries'] == int(timing.group(1)) > 0
+
+    def test_asgi_requests_are_measured(self, user, created_task_board, create_task, settings):
+        """
+        Test that under ASGI the queries of the async views are counted too, as well as those of the sync views.
+        :param user:
+        :param created_task_board:
+        :param create_task:
+        :param settings:
+        """
+        settings.API_METRICS_SAMPLE_RATE = 1
+        create_task()
+        token = f'JWT {AccessToken.for_user(user)}'
+
+        responses = [async_to_sync(AsyncClient().get)(f'{prefix}/boards/{created_task_board.slug}/tasks/',
+                                                      headers={'Authorization': token})
+                     for prefix in ('', '/async')]
+
+        for response in responses:
+            assert response.status_code == status.HTTP_200_OK
+            queries = re.search(r'desc="(\d+) queries"', response['Server-Timing'])
+            assert int(queries.group(1)) > 0
+
+    def test_unsampled_requests_are_left_alone(self, user, api_client, created_task_board, settings):
+        """
+        Test that requests outside the sample carry no Server-Timing header.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param settings:
+        """
+        settings.API_METRICS_SAMPLE_RATE = 0
+        api_client.force_authenticate(user=user)
+
+        response = api_client.get(f'/boards/{created_task_board.slug}/tasks/')
+
+        assert 'Server-Timing' not in response
+
+    def test_metrics_endpoint_exports_prometheus_text(self, user, api_client, created_task_board, settings):
+        """
+        Test that the scrape endpoint lists the sampled views once given the configured token.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param settings:
+        """
+        settings.API_METRICS_SAMPLE_RATE = 1
+        settings.API_METRICS_TOKEN = 'scrape-token'
+        api_client.force_authenticate(user=user)
+        api_client.get(f'/{user.username}/boards/')
+        api_client.force_authenticate(user=None)
+
+        response = api_client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-token')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        body = response.content.decode()
+        assert 'taskly_view_requests_total{view="TaskBoardViewSet.list"}' in body
+        assert 'taskly_view_duration_seconds_bucket{view="TaskBoardViewSet.list",le="+Inf"}' in body
+        assert 'taskly_response_cache_hits_total' in body
+
+    def test_metrics_endpoint_is_hidden_without_a_token(self, api_client, settings):
+        """
+        Test that the scrape endpoint does not exist until a token is configured.
+        :param api_client:
+        :param settings:
+        """
+        settings.API_METRICS_TOKEN = None
+
+        response = api_client.get('/metrics/', HTTP_AUTHORIZATION='Bearer None')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_metrics_endpoint_refuses_a_wrong_token(self, api_client, settings):
+        """
+        Test that the scrape endpoint refuses requests without the configured token.
+        :param api_client:
+        :param settings:
+        """
+        settings.API_METRICS_TOKEN = 'scrape-token'
+
+        response = api_client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,138 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+
+from rest_framework import status
+
+from tasks.models import TaskSearchTerm
+
+
+@pytest.mark.django_db
+class TestTaskSearch:
+    def search(self, api_client, board, query, **params):
+        return api_client.get(f'/boards/{board.slug}/tasks/', data={'search': query, **params})
+
+    def test_search_matches_title_and_description(self, api_client, created_task_board, create_task):
+        """
+        Test that search looks at both the title and the description of tasks.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        in_title = create_task(title='Quarterly report', description='')
+        in_description = create_task(title='Send it', description='Attach the quarterly numbers')
+        create_task(title='Unrelated', description='Nothing to see')
+        api_client.force_authenticate(created_task_board.owner)
+
+        response = self.search(api_client, created_task_board, 'quarterly')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [task['slug'] for task in response.data['results']] == [in_title.slug, in_description.slug]
+
+    def test_search_matches_term_prefixes(self, api_client, created_task_board, create_task):
+        """
+        Test that a partial word matches the terms it is a prefix of.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        task = create_task(title='Deploy the release', description='')
+        api_client.force_authenticate(created_task_board.owner)
+
+        response = self.search(api_client, created_task_board, 'REL')
+
+        assert [result['slug'] for result in response.data['results']] == [task.slug]
+
+    def test_search_requires_every_term(self, api_client, created_task_board, create_task):
+        """
+        Test that only tasks containing all the query terms are returned.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        both = create_task(title='Fix login bug', description='')
+        create_task(title='Fix typo', description='')
+        api_client.force_authenticate(created_task_board.owner)
+
+        response = self.search(api_client, created_task_board, 'fix login')
+
+        assert [task['slug'] for task in response.data['results']] == [both.slug]
+
+    def test_search_without_indexable_terms_matches_nothing(self, api_client, created_task_board, create_task):
+        """
+        Test that a query made only of words too short to be indexed returns no tasks rather than every task.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        create_task(title='Fix x axis', description='')
+        api_client.force_authenticate(created_task_board.owner)
+
+        responses = [self.search(api_client, created_task_board, query) for query in ('x', 'a b', '?!')]
+
+        assert [response.status_code for response in responses] == [status.HTTP_200_OK] * 3
+        assert [response.data['results'] for response in responses] == [[], [], []]
+
+    def test_search_is_scoped_to_the_board(self, api_client, created_task_board, create_task):
+        """
+        Test that matching tasks of other boards are not returned.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        other_board = baker.make('TaskBoard', owner=created_task_board.owner)
+        baker.make('Task', task_board=other_board, created_by=created_task_board.owner, title='Invoice', description='')
+        api_client.force_authenticate(created_task_board.owner)
+
+        response = self.search(api_client, created_task_board, 'invoice')
+
+        assert response.data['results'] == []
+
+    def test_search_results_paginate(self, api_client, created_task_board, create_task):
+        """
+        Test that the search_rank keyset pages through results without repeating or skipping tasks.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        tasks = [create_task(title=f'Budget review {index}', description='budget' if index % 2 else '')
+                 for index in range(5)]
+        api_client.force_authenticate(created_task_board.owner)
+
+        first_page = self.search(api_client, created_task_board, 'budget', page_size=3)
+        second_page = api_client.get(first_page.data['next'])
+
+        slugs = [task['slug'] for task in first_page.data['results'] + second_page.data['results']]
+        assert sorted(slugs) == sorted(task.slug for task in tasks)
+        assert second_page.data['next'] is None
+
+    def test_updating_title_reindexes_task(self, api_client, created_task_board, create_task):
+        """
+        Test that a title change replaces the task's search terms.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        task = create_task(title='Old name', description='')
+        task.title = 'Renamed'
+        task.save()
+
+        terms = set(TaskSearchTerm.objects.filter(task=task).values_list('term', flat=True))
+
+        assert terms == {'renamed'}
+
+    def test_search_does_not_scan_task_text(self, api_client, created_task_board, create_task):
+        """
+        Test that search never falls back to a LIKE '%term%' scan over task titles.
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        create_task(title='Plan sprint', description='')
+        api_client.force_authenticate(created_task_board.owner)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.search(api_client, created_task_board, 'sprint')
+
+        assert not any('%sprint' in query['sql'] for query in queries.captured_queries)
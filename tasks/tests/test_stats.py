@@ -0,0 +1,204 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.forms.models import model_to_dict
+from django.utils.timezone import now
+from model_bakery import baker
+
+from rest_framework import status
+
+from tasks.models import BoardStats, ChangeLogEntry, Task
+from tasks.tasks import OVERDUE_CHECKED_AT_KEY, refresh_overdue_stats
+
+
+def stats_of(board):
+    return model_to_dict(BoardStats.objects.get(task_board=board), exclude=['task_board'])
+
+
+def recounted_stats_of(board):
+    BoardStats.rebuild([board.pk])
+    return stats_of(board)
+
+
+@pytest.mark.django_db
+class TestBoardStats:
+    def test_task_writes_keep_the_stats_exact(self, created_task_board, create_task):
+        """
+        Test that creating, updating and deleting tasks leaves the same stats as recounting the board from scratch.
+        :param created_task_board:
+        :param create_task:
+        """
+        high = create_task(priority=Task.PRIORITY_HIGH)
+        create_task(priority=Task.PRIORITY_LOW, completed=True)
+        deleted = create_task(priority=None)
+        high.priority = Task.PRIORITY_MEDIUM
+        high.completed = True
+        high.save()
+        deleted.delete()
+
+        stats = stats_of(created_task_board)
+
+        assert stats == recounted_stats_of(created_task_board)
+        assert stats == {'tasks': 2, 'completed': 2, 'overdue': 0, 'high_priority': 0, 'medium_priority': 1,
+                         'low_priority': 1, 'no_priority': 0}
+
+    def test_overdue_follows_completion(self, created_task_board, create_task):
+        """
+        Test that an overdue task counts as overdue until it is completed.
+        :param created_task_board:
+        :param create_task:
+        """
+        task = create_task(deadline=now() - timedelta(hours=1))
+        assert stats_of(created_task_board)['overdue'] == 1
+
+        task.completed = True
+        task.save()
+
+        assert stats_of(created_task_board)['overdue'] == 0
+
+    def test_refresh_counts_deadlines_that_passed_without_a_write(self, created_task_board, create_task, local_cache):
+        """
+        Test that the refresh job picks up open tasks whose deadline passed since its previous run.
+        :param created_task_board:
+        :param create_task:
+        :param local_cache:
+        """
+        task = create_task(deadline=now() + timedelta(hours=1))
+        local_cache.set(OVERDUE_CHECKED_AT_KEY, now() - timedelta(minutes=5))
+        Task.objects.filter(pk=task.pk).update(deadline=now() - timedelta(minutes=1)) # Time passing
+
+        result = refresh_overdue_stats()
+
+        assert result == {'boards_refreshed': 1}
+        assert stats_of(created_task_board)['overdue'] == 1
+
+    def test_bulk_writes_keep_the_stats_exact(self, user, api_client, created_task_board, create_task):
+        """
+        Test that the bulk endpoint updates the stats for its creates, updates and deletes.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        updated, deleted = create_task(priority=Task.PRIORITY_LOW), create_task()
+        api_client.force_authenticate(user=user)
+
+        api_client.post(f'/boards/{created_task_board.slug}/tasks/bulk/', data={
+            'create': [{'title': 'New', 'priority': Task.PRIORITY_HIGH}],
+            'update': [{'slug': updated.slug, 'completed': True}],
+            'delete': [deleted.slug],
+        }, format='json')
+
+        assert stats_of(created_task_board) == recounted_stats_of(created_task_board)
+
+    def test_deleting_a_user_keeps_the_stats_of_other_boards_exact(self, created_task_board, create_task, action_user):
+        """
+        Test that the tasks a deleted user created on someone else's board leave its stats and are logged as deleted.
+        :param created_task_board:
+        :param create_task:
+        :param action_user:
+        """
+        create_task()
+        guest_task = baker.make('Task', task_board=created_task_board, created_by=action_user,
+                                priority=Task.PRIORITY_HIGH)
+        guest_task_id = guest_task.pk
+
+        action_user.delete()
+
+        assert stats_of(created_task_board) == recounted_stats_of(created_task_board)
+        assert stats_of(created_task_board)['tasks'] == 1
+        assert ChangeLogEntry.objects.filter(task_id=guest_task_id, action=ChangeLogEntry.ACTION_DELETE).exists()
+
+    def test_queryset_deletes_keep_the_stats_exact(self, user, api_client, created_task_board, create_task):
+        """
+        Test that deleting tasks through a queryset updates the stats, logs the tasks as deleted and touches the board,
+        so a conditional request for the board is answered in full.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        create_task()
+        deleted = create_task(priority=Task.PRIORITY_HIGH)
+        api_client.force_authenticate(user=user)
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        etag = api_client.get(url)['ETag']
+
+        Task.objects.filter(pk=deleted.pk).delete()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert stats_of(created_task_board) == recounted_stats_of(created_task_board)
+        assert stats_of(created_task_board)['tasks'] == 1
+        assert ChangeLogEntry.objects.filter(task_id=deleted.pk, action=ChangeLogEntry.ACTION_DELETE).exists()
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 1
+
+    def test_admin_delete_selected_keeps_the_stats_exact(self, admin_client, created_task_board, create_task):
+        """
+        Test that the admin's "delete selected" action goes through the same bookkeeping as other deletes.
+        :param admin_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        tasks = [create_task(), create_task(completed=True)]
+
+        response = admin_client.post('/admin/tasks/task/', {
+            'action': 'delete_selected', '_selected_action': [task.pk for task in tasks], 'post': 'yes'})
+
+        assert response.status_code == 302
+        assert stats_of(created_task_board) == recounted_stats_of(created_task_board)
+        assert stats_of(created_task_board)['tasks'] == 0
+        assert ChangeLogEntry.objects.filter(action=ChangeLogEntry.ACTION_DELETE).count() == 2
+
+    def test_stats_endpoint_reads_one_row(self, user, api_client, created_task_board, create_task,
+                                          django_assert_num_queries):
+        """
+        Test that the stats endpoint answers from the stats row, whatever the number of tasks.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        :param django_assert_num_queries:
+        """
+        for _ in range(3):
+            create_task(priority=Task.PRIORITY_HIGH)
+        api_client.force_authenticate(user=user)
+
+        with django_assert_num_queries(2): # The board, its stats
+            response = api_client.get(f'/boards/{created_task_board.slug}/tasks/stats/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['tasks'] == 3
+        assert response.data['high_priority'] == 3
+
+    def test_rebuild_restores_missing_stats(self, created_task_board, create_task):
+        """
+        Test that the rebuild command recounts boards whose stats are missing, e.g. boards from before stats.
+        :param created_task_board:
+        :param create_task:
+        """
+        create_task(completed=True)
+        BoardStats.objects.all().delete()
+
+        call_command('rebuild_board_stats', stdout=StringIO())
+
+        assert stats_of(created_task_board)['completed'] == 1
+
+    def test_rebuild_can_fill_in_only_the_missing_stats(self, created_task_board, create_task, user):
+        """
+        Test that with --missing, the rebuild command counts the boards without stats and leaves the others alone.
+        :param created_task_board:
+        :param create_task:
+        :param user:
+        """
+        create_task()
+        other_board = baker.make('TaskBoard', owner=user)
+        BoardStats.objects.filter(task_board=created_task_board).delete()
+        BoardStats.objects.filter(task_board=other_board).update(tasks=5) # Left as is, only missing rows are counted
+
+        call_command('rebuild_board_stats', missing=True, stdout=StringIO())
+
+        assert stats_of(created_task_board)['tasks'] == 1
+        assert stats_of(other_board)['tasks'] == 5
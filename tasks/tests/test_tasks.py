@@ -1,14 +1,23 @@
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from model_bakery import baker
 
+from django.utils.http import http_date
 from django.utils.timezone import now
 
 from rest_framework import status
 
-from tasks.models import Task
+from tasks.export import iter_task_rows
+from tasks.imports import import_tasks
+from tasks.models import BoardGuest, BoardStats, Task, TaskBoard
 
 
 @pytest.mark.django_db
@@ -367,3 +376,748 @@ class TestUpdateTask:
         assert response.status_code == status.HTTP_403_FORBIDDEN
 
 
+@pytest.mark.django_db
+class TestTaskPagination:
+    def _collect_pages(self, api_client, url):
+        """Follows the next links from url and returns every task id in the order they were served."""
+        ids = []
+        while url:
+            response = api_client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            ids += [task['id'] for task in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_every_task_once_newest_first(self, user, api_client, create_task, created_task_board):
+        """
+        Test that following the next cursor visits every task exactly once in (created_at, id) descending order.
+        :param user:
+        :param api_client:
+        :param create_task:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(user=user)
+        tasks = [create_task() for _ in range(7)]
+
+        ids = self._collect_pages(api_client, f'/boards/{created_task_board.slug}/tasks/?page_size=3')
+
+        assert ids == [task.id for task in reversed(tasks)]
+
+    def test_tasks_sharing_a_timestamp_are_not_skipped_or_repeated(self, user, api_client, create_task,
+                                                                   created_task_board):
+        """
+        Test that tasks with identical created_at values are still paged in a stable order, using id to break ties.
+        :param user:
+        :param api_client:
+        :param create_task:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(user=user)
+        tasks = [create_task() for _ in range(5)]
+        Task.objects.filter(task_board=created_task_board).update(created_at=now())
+
+        ids = self._collect_pages(api_client, f'/boards/{created_task_board.slug}/tasks/?page_size=2')
+
+        assert ids == sorted(task.id for task in tasks)[::-1]
+
+    def test_pages_can_be_ordered_by_local_id(self, user, api_client, create_task, created_task_board):
+        """
+        Test that the tasks can be paged by their per board local_id.
+        :param user:
+        :param api_client:
+        :param create_task:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(user=user)
+        tasks = [create_task() for _ in range(5)]
+
+        ids = self._collect_pages(api_client, f'/boards/{created_task_board.slug}/tasks/?ordering=local_id&page_size=2')
+
+        assert ids == [task.id for task in sorted(tasks, key=lambda task: task.local_id)]
+
+    def test_previous_link_returns_the_earlier_page(self, user, api_client, create_task, created_task_board):
+        """
+        Test that the previous link of the second page returns the first page again.
+        :param user:
+        :param api_client:
+        :param create_task:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(user=user)
+        for _ in range(5):
+            create_task()
+        first_page = api_client.get(f'/boards/{created_task_board.slug}/tasks/?page_size=2')
+        second_page = api_client.get(first_page.data['next'])
+
+        response = api_client.get(second_page.data['previous'])
+
+        assert response.data['results'] == first_page.data['results']
+        assert response.data['previous'] is None
+
+    def test_deep_pages_do_not_use_offset(self, user, api_client, create_task, created_task_board,
+                                          django_assert_max_num_queries):
+        """
+        Test that the page query seeks on the cursor instead of scanning past earlier rows with OFFSET.
+        :param user:
+        :param api_client:
+        :param create_task:
+        :param created_task_board:
+        :param django_assert_max_num_queries:
+        """
+        api_client.force_authenticate(user=user)
+        for _ in range(4):
+            create_task()
+        first_page = api_client.get(f'/boards/{created_task_board.slug}/tasks/?page_size=2')
+
+        with django_assert_max_num_queries(10) as queries:
+            api_client.get(first_page.data['next'])
+
+        assert all('OFFSET' not in query['sql'] for query in queries.captured_queries)
+
+    def test_invalid_cursor_returns_404(self, user, api_client, created_task_board):
+        """
+        Test that a tampered cursor is rejected with a 404.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(user=user)
+
+        response = api_client.get(f'/boards/{created_task_board.slug}/tasks/?cursor=not-a-cursor')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestTaskQueries:
+    def test_create_task_resolves_the_board_once(self, user, api_client, valid_task_data, created_task_board,
+                                                 django_assert_num_queries):
+        """
+        Test that creating a task looks the board up once, shared by the permission check and perform_create.
+        Queries: board, local_id counter increment and read, insert, search terms insert, change log insert, stats
+        update.
+        :param user:
+        :param api_client:
+        :param valid_task_data:
+        :param created_task_board:
+        :param django_assert_num_queries:
+        """
+        api_client.force_authenticate(user=user)
+
+        with django_assert_num_queries(7):
+            response = api_client.post(f'/boards/{created_task_board.slug}/tasks/', data=valid_task_data)
+
+        assert response.status_code == status.HTTP_201_CREATED
+
+    def test_list_tasks_runs_a_fixed_number_of_queries(self, user, api_client, create_task, created_task_board,
+                                                        django_assert_num_queries):
+        """
+        Test that listing tasks costs the board lookup and one page query, however many tasks are listed.
+        :param user:
+        :param api_client:
+        :param create_task:
+        :param created_task_board:
+        :param django_assert_num_queries:
+        """
+        api_client.force_authenticate(user=user)
+        for _ in range(5):
+            create_task()
+
+        with django_assert_num_queries(2):
+            response = api_client.get(f'/boards/{created_task_board.slug}/tasks/')
+
+        assert len(response.data['results']) == 5
+
+    def test_guest_membership_is_checked_once_per_request(self, api_client, action_user, create_task,
+                                                          created_task_board, django_assert_num_queries):
+        """
+        Test that a guest editing a task only has their membership looked up once.
+        Queries: board, membership, task, update, board last_updated bump, change log insert, stats update.
+        :param api_client:
+        :param action_user:
+        :param create_task:
+        :param created_task_board:
+        :param django_assert_num_queries:
+        """
+        created_task_board.guests.add(action_user)
+        task = create_task()
+        api_client.force_authenticate(user=action_user)
+
+        with django_assert_num_queries(7):
+            response = api_client.patch(f'/boards/{created_task_board.slug}/tasks/{task.slug}/',
+                                        data={'completed': True})
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db(transaction=True)
+class TestLocalIdAllocation:
+    def test_local_ids_are_allocated_from_the_board_counter(self, user, created_task_board, create_task):
+        """
+        Test that local_ids count up per board from the board's counter, and deleting a task never reuses its id.
+        :param user:
+        :param created_task_board:
+        :param create_task:
+        """
+        first, second = create_task(), create_task()
+        second.delete()
+
+        third = create_task()
+
+        created_task_board.refresh_from_db()
+        assert [first.local_id, third.local_id] == [1, 3]
+        assert created_task_board.next_local_id == 4
+
+    def test_reservations_are_contiguous_and_never_overlap(self, created_task_board):
+        """
+        Test that reserving blocks through separately loaded copies of the board, as concurrent requests do, hands out
+        consecutive blocks that never overlap. Runs on SQLite, unlike the threaded test below.
+        :param created_task_board:
+        """
+        first_copy = TaskBoard.objects.get(pk=created_task_board.pk)
+        second_copy = TaskBoard.objects.get(pk=created_task_board.pk)
+
+        starts = [first_copy.reserve_local_ids(3), second_copy.reserve_local_ids(2), first_copy.reserve_local_ids(4)]
+
+        assert starts == [1, 4, 6]
+        assert first_copy.next_local_id == 10
+        created_task_board.refresh_from_db()
+        assert created_task_board.next_local_id == 10
+
+    @pytest.mark.skipif(connection.vendor == 'sqlite', reason='SQLite locks whole tables, run this against MySQL')
+    def test_concurrent_creates_never_collide(self, user, created_task_board):
+        """
+        Stress test creating tasks on the same board from several threads at once. Every create should succeed
+        and the local_ids should be exactly 1..n without gaps or duplicates.
+        :param user:
+        :param created_task_board:
+        """
+        def create(i):
+            try:
+                board = TaskBoard.objects.get(pk=created_task_board.pk)
+                return Task.objects.create(title=f'task {i}', created_by=user, task_board=board)
+            finally:
+                connection.close() # Each thread has its own connection
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            tasks = list(pool.map(create, range(40)))
+
+        local_ids = sorted(task.local_id for task in tasks)
+        assert local_ids == list(range(1, 41))
+        assert Task.objects.filter(task_board=created_task_board).count() == 40
+
+
+@pytest.mark.django_db
+class TestTaskChangeTracking:
+    def test_title_change_updates_slug_without_reading_the_row(self, create_task, django_assert_num_queries):
+        """
+        Test that changing the title of a loaded task regenerates its slug without reading the row back.
+        Queries: update, search terms delete and insert, board last_updated bump, change log insert.
+        :param create_task:
+        :param django_assert_num_queries:
+        """
+        task = Task.objects.get(pk=create_task().pk)
+        task.title = 'A brand new title'
+
+        with django_assert_num_queries(5) as queries:
+            task.save()
+
+        task.refresh_from_db()
+        assert task.slug == f'{task.local_id}-a-brand-new-title'
+        assert not any(query['sql'].startswith('SELECT') for query in queries.captured_queries)
+
+    def test_save_only_writes_changed_columns(self, create_task, django_assert_num_queries):
+        """
+        Test that saving a task only updates the columns that changed since it was loaded, plus updated_at, then
+        bumps the board's last_updated, records the change and updates the board's stats.
+        :param create_task:
+        :param django_assert_num_queries:
+        """
+        task = Task.objects.get(pk=create_task().pk)
+        task.completed = True
+
+        with django_assert_num_queries(4) as queries:
+            task.save()
+
+        sql = queries.captured_queries[0]['sql']
+        quote = connection.ops.quote_name
+        assert quote('completed') in sql and quote('updated_at') in sql
+        assert quote('title') not in sql and quote('description') not in sql
+        assert quote('tasks_taskboard') in queries.captured_queries[1]['sql']
+
+    def test_unchanged_task_is_not_written(self, create_task, django_assert_num_queries):
+        """
+        Test that saving a task with no changes skips the database entirely.
+        :param create_task:
+        :param django_assert_num_queries:
+        """
+        task = Task.objects.get(pk=create_task().pk)
+
+        with django_assert_num_queries(0):
+            task.save()
+
+    def test_changes_after_a_save_are_tracked_from_the_saved_values(self, create_task):
+        """
+        Test that the snapshot moves forward on save, so a second save only sees the newer changes.
+        :param create_task:
+        """
+        task = Task.objects.get(pk=create_task().pk)
+        task.completed = True
+        task.save()
+
+        task.priority = Task.PRIORITY_HIGH
+
+        assert task.get_dirty_fields() == ['priority']
+
+    def test_refresh_from_db_moves_the_snapshot(self, created_task_board, create_task):
+        """
+        Test that after refreshing a task changed behind its back, reverting the change is saved, and the board's stats
+        follow.
+        :param created_task_board:
+        :param create_task:
+        """
+        task = Task.objects.get(pk=create_task().pk)
+        Task.objects.filter(pk=task.pk).update(completed=True)
+        BoardStats.rebuild([created_task_board.pk])
+
+        task.refresh_from_db()
+        task.completed = False
+        task.save()
+
+        assert Task.objects.get(pk=task.pk).completed is False
+        assert BoardStats.objects.get(task_board=created_task_board).completed == 0
+
+    def test_refreshing_some_fields_keeps_the_others_tracked(self, create_task):
+        """
+        Test that refreshing only some fields moves their snapshot and leaves pending changes to the others dirty.
+        :param create_task:
+        """
+        task = Task.objects.get(pk=create_task().pk)
+        Task.objects.filter(pk=task.pk).update(completed=True)
+        task.title = 'Pending'
+
+        task.refresh_from_db(fields=['completed'])
+
+        assert task.completed is True
+        assert task.get_dirty_fields() == ['title']
+
+
+@pytest.mark.django_db
+class TestBulkTasks:
+    def bulk(self, api_client, board, **data):
+        return api_client.post(f'/boards/{board.slug}/tasks/bulk/', data=data, format='json')
+
+    def test_bulk_create_allocates_a_contiguous_block_of_local_ids(self, user, api_client, created_task_board,
+                                                                   create_task):
+        """
+        Test that bulk created tasks follow the board's existing local_ids and are returned in request order.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        existing = create_task()
+        api_client.force_authenticate(user=user)
+
+        response = self.bulk(api_client, created_task_board,
+                             create=[{'title': f'Imported {index}'} for index in range(3)])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [task['local_id'] for task in response.data['create']] == [existing.local_id + offset
+                                                                           for offset in range(1, 4)]
+        assert [task['title'] for task in response.data['create']] == ['Imported 0', 'Imported 1', 'Imported 2']
+        assert response.data['create'][0]['slug'] == f'{existing.local_id + 1}-imported-0'
+
+    def test_bulk_create_does_not_run_a_query_per_task(self, user, api_client, created_task_board,
+                                                       django_assert_max_num_queries):
+        """
+        Test that creating many tasks costs a handful of queries rather than one per task.
+        Queries: board, local_id counter increment and read, then the task and search term inserts, which SQLite
+        splits into a few statements to stay under its parameter limit.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param django_assert_max_num_queries:
+        """
+        api_client.force_authenticate(user=user)
+
+        with django_assert_max_num_queries(12):
+            response = self.bulk(api_client, created_task_board,
+                                 create=[{'title': f'Imported {index}'} for index in range(200)])
+
+        assert len(response.data['create']) == 200
+        assert Task.objects.filter(task_board=created_task_board).count() == 200
+
+    def test_bulk_updates_and_deletes_in_one_request(self, user, api_client, created_task_board, create_task):
+        """
+        Test that updates regenerate derived fields and deletes remove the tasks, both reported per item.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        to_update, to_complete, to_delete = create_task(), create_task(), create_task()
+        api_client.force_authenticate(user=user)
+
+        response = self.bulk(api_client, created_task_board,
+                             update=[{'slug': to_update.slug, 'title': 'Renamed'},
+                                     {'slug': to_complete.slug, 'completed': True}],
+                             delete=[to_delete.slug])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['update'][0]['slug'] == f'{to_update.local_id}-renamed'
+        assert response.data['update'][1]['completed'] is True
+        assert response.data['delete'] == [to_delete.slug]
+        assert not Task.objects.filter(pk=to_delete.pk).exists()
+        assert Task.objects.get(pk=to_complete.pk).title == to_complete.title
+
+    def test_invalid_item_returns_per_item_errors_and_writes_nothing(self, user, api_client, created_task_board,
+                                                                     create_task):
+        """
+        Test that one invalid item fails the whole request with errors at that item's position.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        task = create_task()
+        api_client.force_authenticate(user=user)
+
+        response = self.bulk(api_client, created_task_board,
+                             create=[{'title': 'Valid'}, {'title': 'Too late', 'deadline': '2000-01-01T00:00:00Z'}],
+                             delete=[task.slug])
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert list(response.data['create']) == [1]
+        assert 'deadline' in response.data['create'][1]
+        assert list(Task.objects.filter(task_board=created_task_board)) == [task]
+
+    def test_unknown_slug_is_reported_per_item(self, user, api_client, created_task_board, create_task):
+        """
+        Test that updating a task that is not on the board fails at that item.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        task = create_task()
+        api_client.force_authenticate(user=user)
+
+        response = self.bulk(api_client, created_task_board,
+                             update=[{'slug': task.slug, 'completed': True}, {'slug': 'missing-task'}])
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['update'] == {1: {'slug': ['Task not found.']}}
+        assert not Task.objects.get(pk=task.pk).completed
+
+    def test_viewer_cannot_bulk_change_tasks(self, api_client, action_user, created_task_board):
+        """
+        Test that a guest with the viewer role is refused, like for single task writes.
+        :param api_client:
+        :param action_user:
+        :param created_task_board:
+        """
+        created_task_board.guests.add(action_user, through_defaults={'role': BoardGuest.ROLE_VIEWER})
+        api_client.force_authenticate(user=action_user)
+
+        response = self.bulk(api_client, created_task_board, create=[{'title': 'Sneaky'}])
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+class TestTaskExport:
+    def export(self, api_client, board, **params):
+        response = api_client.get(f'/boards/{board.slug}/tasks/export/', data=params)
+        return response, b''.join(response.streaming_content).decode() if response.streaming else None
+
+    def test_export_streams_ndjson_in_local_id_order(self, user, api_client, created_task_board, create_task):
+        """
+        Test that the default export is one JSON object per line, ordered by local_id.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        tasks = [create_task() for _ in range(3)]
+        api_client.force_authenticate(user=user)
+
+        response, content = self.export(api_client, created_task_board)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/x-ndjson'
+        rows = [json.loads(line) for line in content.splitlines()]
+        assert [row['local_id'] for row in rows] == [task.local_id for task in tasks]
+        assert rows[0]['title'] == tasks[0].title
+
+    def test_export_streams_csv(self, user, api_client, created_task_board, create_task):
+        """
+        Test that ?output=csv streams a header line followed by one line per task.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        tasks = [create_task(title=f'Task, number {index}') for index in range(2)]
+        api_client.force_authenticate(user=user)
+
+        response, content = self.export(api_client, created_task_board, output='csv')
+
+        rows = list(csv.DictReader(io.StringIO(content)))
+        assert response['Content-Type'] == 'text/csv'
+        assert [row['title'] for row in rows] == [task.title for task in tasks]
+
+    def test_export_reads_in_keyset_batches(self, created_task_board, create_task, django_assert_num_queries):
+        """
+        Test that rows are read in batches seeking on local_id, with a final short batch ending the export.
+        :param created_task_board:
+        :param create_task:
+        :param django_assert_num_queries:
+        """
+        tasks = [create_task() for _ in range(5)]
+
+        with django_assert_num_queries(3):
+            rows = list(iter_task_rows(created_task_board, batch_size=2))
+
+        assert [row['local_id'] for row in rows] == [task.local_id for task in tasks]
+
+    def test_export_with_unknown_output_returns_400(self, user, api_client, created_task_board):
+        """
+        Test that an unsupported output format is refused.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(user=user)
+
+        response, _ = self.export(api_client, created_task_board, output='xml')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_anonymous_user_cannot_export(self, api_client, created_task_board):
+        """
+        Test that exporting needs the same access as listing tasks.
+        :param api_client:
+        :param created_task_board:
+        """
+        response, _ = self.export(api_client, created_task_board)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+class TestTaskImport:
+    def upload(self, api_client, board, name, content, **data):
+        file = SimpleUploadedFile(name, content.encode())
+        return api_client.post(f'/boards/{board.slug}/tasks/import/', data={'file': file, **data},
+                               format='multipart')
+
+    def test_import_ndjson_reports_failed_lines(self, user, api_client, created_task_board):
+        """
+        Test that valid NDJSON rows are created and invalid ones are reported by line number.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(user=user)
+        content = '\n'.join([
+            json.dumps({'title': 'First', 'priority': 'H'}),
+            '{not json',
+            '',
+            json.dumps({'title': 'Late', 'deadline': '2000-01-01T00:00:00Z'}),
+            json.dumps({'title': 'Second', 'description': 'Imported'}),
+        ])
+
+        response = self.upload(api_client, created_task_board, 'tasks.ndjson', content)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['imported'] == 2
+        assert response.data['failed'] == 2
+        assert [error['line'] for error in response.data['errors']] == [2, 4]
+        assert 'deadline' in response.data['errors'][1]['errors']
+        assert list(Task.objects.filter(task_board=created_task_board).order_by('local_id')
+                    .values_list('title', flat=True)) == ['First', 'Second']
+
+    def test_csv_export_imports_into_another_board(self, user, api_client, created_task_board, create_task):
+        """
+        Test that a CSV export can be imported as is, read only columns such as slug and local_id are ignored.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        tasks = [create_task(title=f'Exported {index}', deadline=None) for index in range(3)]
+        other_board = baker.make('TaskBoard', owner=user)
+        api_client.force_authenticate(user=user)
+        export = api_client.get(f'/boards/{created_task_board.slug}/tasks/export/', data={'output': 'csv'})
+        content = b''.join(export.streaming_content).decode()
+
+        response = self.upload(api_client, other_board, 'export.csv', content)
+
+        assert response.data == {'imported': 3, 'failed': 0, 'errors': []}
+        assert list(Task.objects.filter(task_board=other_board).order_by('local_id')
+                    .values_list('title', flat=True)) == [task.title for task in tasks]
+
+    def test_import_batches_rows(self, user, created_task_board, django_assert_max_num_queries):
+        """
+        Test that rows are created a batch at a time rather than one insert per row.
+        :param user:
+        :param created_task_board:
+        :param django_assert_max_num_queries:
+        """
+        content = '\n'.join(json.dumps({'title': f'Row {index}'}) for index in range(50))
+
+        with django_assert_max_num_queries(2 * 6):
+            report = import_tasks(created_task_board, user, io.BytesIO(content.encode()), 'ndjson', batch_size=25)
+
+        assert report['imported'] == 50
+
+    def test_import_that_is_not_utf8_creates_nothing(self, user, api_client, created_task_board):
+        """
+        Test that a file whose first rows cannot be decoded is refused with no task created.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(user=user)
+        content = json.dumps({'title': 'Caf\u00e9'}, ensure_ascii=False).encode('latin-1')
+        file = SimpleUploadedFile('tasks.ndjson', content)
+
+        response = api_client.post(f'/boards/{created_task_board.slug}/tasks/import/', data={'file': file},
+                                   format='multipart')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not Task.objects.filter(task_board=created_task_board).exists()
+
+    def test_import_that_stops_being_utf8_reports_what_was_created(self, user, created_task_board):
+        """
+        Test that undecodable bytes found after batches were created are reported as a failed line, with the count of
+        the tasks created before them, rather than as a file nothing was imported from.
+        :param user:
+        :param created_task_board:
+        """
+        content = '\n'.join(json.dumps({'title': f'Row {index}'}) for index in range(1000)).encode()
+
+        report = import_tasks(created_task_board, user, io.BytesIO(content + b'\n\xff\xfe'), 'ndjson', batch_size=25)
+
+        imported = Task.objects.filter(task_board=created_task_board).count()
+        assert report['imported'] == imported > 0
+        assert report['failed'] == 1
+        assert report['errors'][0]['line'] == imported + 1
+
+    def test_import_without_file_returns_400(self, user, api_client, created_task_board):
+        """
+        Test that posting no file is refused.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        """
+        api_client.force_authenticate(user=user)
+
+        response = api_client.post(f'/boards/{created_task_board.slug}/tasks/import/', data={}, format='multipart')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestTaskConditionalGet:
+    def test_unchanged_task_list_returns_304_with_only_the_board_lookup(self, user, api_client, created_task_board,
+                                                                         create_task, django_assert_num_queries):
+        """
+        Test that repeating a task list request with its ETag is answered 304 without loading or serialising tasks.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        :param django_assert_num_queries:
+        """
+        create_task()
+        api_client.force_authenticate(user=user)
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        etag = api_client.get(url)['ETag']
+
+        with django_assert_num_queries(1):
+            response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert not response.content
+
+    def test_task_changes_invalidate_the_list_etag(self, user, api_client, created_task_board, create_task):
+        """
+        Test that creating, editing and deleting tasks each change the list's ETag.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        task = create_task()
+        api_client.force_authenticate(user=user)
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        etags = [api_client.get(url)['ETag']]
+
+        api_client.patch(f'{url}{task.slug}/', data={'completed': True})
+        etags.append(api_client.get(url, HTTP_IF_NONE_MATCH=etags[-1])['ETag'])
+        api_client.post(f'{url}bulk/', data={'create': [{'title': 'New'}]}, format='json')
+        etags.append(api_client.get(url, HTTP_IF_NONE_MATCH=etags[-1])['ETag'])
+        api_client.delete(f'{url}{task.slug}/')
+        etags.append(api_client.get(url, HTTP_IF_NONE_MATCH=etags[-1])['ETag'])
+
+        assert None not in etags and len(set(etags)) == 4
+
+    def test_if_modified_since_returns_304(self, user, api_client, created_task_board, create_task):
+        """
+        Test that a task answers If-Modified-Since with 304 when it has not changed since then.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        task = create_task()
+        Task.objects.filter(pk=task.pk).update(updated_at=now() - timedelta(minutes=1))
+        api_client.force_authenticate(user=user)
+        url = f'/boards/{created_task_board.slug}/tasks/{task.slug}/'
+        last_modified = api_client.get(url)['Last-Modified']
+
+        response = api_client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_changes_within_the_current_second_are_never_validated_by_date(self, user, api_client,
+                                                                           created_task_board, create_task):
+        """
+        Test that a task changed within the current second carries no Last-Modified and does not answer
+        If-Modified-Since with 304, since a second change in the same second would keep the same date.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        task = create_task()
+        # Pushed ahead so the change is still within the current second however long the test takes
+        updated_at = now() + timedelta(seconds=30)
+        Task.objects.filter(pk=task.pk).update(updated_at=updated_at)
+        api_client.force_authenticate(user=user)
+        url = f'/boards/{created_task_board.slug}/tasks/{task.slug}/'
+
+        first = api_client.get(url)
+        response = api_client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(updated_at.timestamp()))
+
+        assert 'Last-Modified' not in first
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_pages_have_different_etags(self, user, api_client, created_task_board, create_task):
+        """
+        Test that the query string is part of the ETag, so one page's tag never validates another page.
+        :param user:
+        :param api_client:
+        :param created_task_board:
+        :param create_task:
+        """
+        create_task()
+        api_client.force_authenticate(user=user)
+        url = f'/boards/{created_task_board.slug}/tasks/'
+        etag = api_client.get(url)['ETag']
+
+        response = api_client.get(url, data={'ordering': 'local_id'}, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
@@ -1,7 +1,9 @@
 from django.urls import path
 from django.urls.conf import include
 
-from .views import TaskBoardViewSet, TaskViewSet, InviteUserView
+from . import async_views
+from .metrics import metrics_view
+from .views import TaskBoardViewSet, TaskViewSet, InviteUserView, TaskFeedView
 
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested import routers
@@ -17,7 +19,15 @@ tasks_router = routers.NestedSimpleRouter(router, r'boards', lookup='board')
 tasks_router.register('tasks', TaskViewSet, basename='tasks')
 
 urlpatterns = [
+    # Async-native read and create paths, for clients of the ASGI deployment
+    path('async/boards/<str:board_slug>/tasks/', async_views.task_list),
+    path('async/boards/<str:board_slug>/tasks/<str:slug>/', async_views.task_detail),
+    path('async/<str:username>/boards/', async_views.board_list),
+    path('async/<str:username>/boards/<str:slug>/', async_views.board_detail),
+    path('tasks/', TaskFeedView.as_view()), # Ahead of <username>/ so it is not read as a username
+    path('metrics/', metrics_view), # Prometheus scrape target, see tasks.metrics
     path('<str:username>/', include(router.urls)),
     path('boards/<str:board_slug>/invite/', InviteUserView.as_view()),
+    path('boards/<str:board_slug>/events/', async_views.board_events),
 ] + tasks_router.urls
 
@@ -1,28 +1,75 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max, Prefetch, Q
+from django.http import StreamingHttpResponse
 from django.shortcuts import redirect, get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
+from rest_framework.generics import ListAPIView
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
-from .models import Task, TaskBoard
-from .permissions import TaskBoardAccess, IsTaskBoardOwner
-from .serializers import TaskSerializer, TaskBoardSerializer
+from .bulk import create_tasks, update_tasks
+from .cache import PublicResponseCacheMixin, ResponseCacheMixin, get_board_version
+from .changes import CursorExpired, get_current_cursor, read_changes
+from .conditional import ConditionalGetMixin
+from .export import EXPORT_FORMATS, iter_task_rows
+from .filters import TaskFeedFilter
+from .imports import IMPORT_READERS, guess_import_format, import_tasks
+from .models import Task, TaskBoard, BoardGuest, ChangeLogEntry
+from .pagination import TaskCursorPagination
+from .search import TaskSearchFilter
+from .permissions import TaskBoardAccess, IsTaskBoardOwner, get_task_board, ROLE_OWNER, get_board_role
+from .serializers import (TaskSerializer, TaskBoardSerializer, TaskBulkSerializer, BoardStatsSerializer,
+                          TaskFeedSerializer, TASK_PREVIEW_SIZE, TASK_PREVIEW_ORDERING)
 
 from .tasks import notify_user_invitation_to_task_board
 
 
+def get_board_queryset(user):
+    """
+    The boards of user as TaskBoardSerializer expects them. Three queries no matter how many boards or tasks: boards
+    joined with their stats, the guests, and a windowed prefetch that only fetches the newest TASK_PREVIEW_SIZE tasks
+    of each board.
+    """
+    preview_tasks = Task.objects.order_by(*TASK_PREVIEW_ORDERING)[:TASK_PREVIEW_SIZE]
+    return (TaskBoard.objects.filter(owner=user.id)
+            .select_related('stats')
+            .prefetch_related('guests', Prefetch('tasks', queryset=preview_tasks, to_attr='preview_tasks')))
+
+
 # Create your views here.
-class TaskBoardViewSet(ModelViewSet):
+class TaskBoardViewSet(ConditionalGetMixin, ResponseCacheMixin, ModelViewSet):
     serializer_class = TaskBoardSerializer
     lookup_field = "slug"
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return TaskBoard.objects.filter(owner=self.request.user.id)
+        return get_board_queryset(self.request.user)
+
+    def get_validators(self):
+        # Every change to a board, its guests or its tasks bumps last_updated, the count catches deleted boards
+        boards = TaskBoard.objects.filter(owner=self.request.user.id)
+        if self.action == 'list':
+            state = boards.aggregate(last_updated=Max('last_updated'), count=Count('id'))
+            return (state['last_updated'], (state['count'],)) if state['last_updated'] else None
+        board = boards.filter(slug=self.kwargs['slug']).values_list('id', 'last_updated').first()
+        return (board[1], (board[0],)) if board else None
+
+    def get_cache_scope(self):
+        # Boards are only served to their owner. A list spans boards, so it is keyed by the validators computed for
+        # the conditional GET rather than by one board's version.
+        if self.validators is None:
+            return None
+        last_updated, parts = self.validators
+        if self.action == 'list':
+            return self.request.user.pk, last_updated.isoformat(), *parts
+        return self.request.user.pk, get_board_version(parts[0])
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
@@ -55,24 +102,172 @@ class TaskBoardViewSet(ModelViewSet):
 
 
 
-class TaskViewSet(ModelViewSet):
+class TaskViewSet(PublicResponseCacheMixin, ConditionalGetMixin, ResponseCacheMixin, ModelViewSet):
     #TODO Check TaskBoardVisibility Permission & Write Tests for it
     permission_classes = [TaskBoardAccess]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, TaskSearchFilter, OrderingFilter]
     lookup_field = 'slug'
-    search_fields = ['title']
-    ordering_fields = ['created_at']
+    ordering_fields = ['created_at', 'local_id']
     serializer_class = TaskSerializer
+    pagination_class = TaskCursorPagination
 
     def get_queryset(self):
-        board_slug = self.kwargs.get('board_slug')
-        board = get_object_or_404(TaskBoard, slug=board_slug)
-        return Task.objects.filter(task_board=board)
+        # The board was already resolved by TaskBoardAccess for this request
+        board = get_task_board(self.request, self.kwargs.get('board_slug'))
+        return Task.objects.filter(task_board=board).select_related('task_board')
+
+    def get_validators(self):
+        # The board was loaded by the permission check, so validating a task list costs no extra query
+        task_board = get_task_board(self.request, self.kwargs.get('board_slug'))
+        if self.action == 'list':
+            return task_board.last_updated, ()
+        updated_at = (Task.objects.filter(task_board=task_board, slug=self.kwargs.get('slug'))
+                      .values_list('updated_at', flat=True).first())
+        # Tasks include the board's visibility, so it is part of their tag
+        return (updated_at, (task_board.visibility,)) if updated_at else None
+
+    def get_cache_scope(self):
+        # Tasks look the same to every viewer allowed past TaskBoardAccess, so the board version is the whole scope
+        return (get_board_version(get_task_board(self.request, self.kwargs.get('board_slug')).pk),)
+
+    def get_search_board_ids(self):
+        return [get_task_board(self.request, self.kwargs.get('board_slug')).pk]
 
     def perform_create(self, serializer):
-        task_board = TaskBoard.objects.get(slug=self.kwargs['board_slug'])
-        task = serializer.save(created_by=self.request.user, task_board=task_board)
-        task.save()
+        task_board = get_task_board(self.request, self.kwargs['board_slug'])
+        serializer.save(created_by=self.request.user, task_board=task_board)
+
+    def perform_destroy(self, instance):
+        instance.delete() # Also touches the board and records the tombstone
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Creates, updates and deletes many tasks of the board in one transaction. Takes
+        {"create": [task], "update": [task with its slug], "delete": [slug]} and answers with the per-item results in
+        request order. If any item is invalid nothing is written and the per-item errors are returned instead.
+        """
+        task_board = get_task_board(request, self.kwargs['board_slug'])
+        serializer = TaskBulkSerializer(data=request.data, context={'task_board': task_board})
+        with transaction.atomic():
+            serializer.is_valid(raise_exception=True)
+            tasks_by_slug = serializer.tasks_by_slug
+            created = create_tasks(task_board, request.user, serializer.validated_data.get('create', []))
+            updated = update_tasks([(tasks_by_slug[item.pop('slug')], item)
+                                    for item in serializer.validated_data.get('update', [])])
+            deleted = serializer.validated_data.get('delete', [])
+            if deleted:
+                Task.delete_tasks([tasks_by_slug[slug] for slug in deleted])
+
+        return Response({
+            'create': TaskSerializer(created, many=True).data,
+            'update': TaskSerializer(updated, many=True).data,
+            'delete': deleted,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request, *args, **kwargs):
+        """
+        Streams every task of the board as NDJSON, or as CSV with ?output=csv. The query parameter is not called
+        format, which DRF reserves for picking a renderer.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            return Response({'error': f"Invalid output, use one of: {', '.join(EXPORT_FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        task_board = get_task_board(request, self.kwargs['board_slug'])
+        render, content_type, extension = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(render(iter_task_rows(task_board)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{task_board.slug}-tasks.{extension}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request, *args, **kwargs):
+        """Task counts of the board by completion, priority and overdue deadlines, read from its BoardStats row."""
+        task_board = get_task_board(request, self.kwargs['board_slug'])
+        return Response(BoardStatsSerializer(task_board.get_stats()).data)
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request, *args, **kwargs):
+        """
+        Incremental sync. ?since=<cursor> answers with the board's changes after the cursor, at most one per task:
+        upserts carry the task, deletes only its id, and a change of type board means the board itself was saved or
+        deleted. Without since only the current cursor is returned, take it before downloading the tasks in full.
+        Pages follow while has_more is true. 410 Gone means the cursor outlived the change log and the client has to
+        download the board again.
+        """
+        task_board = get_task_board(request, self.kwargs['board_slug'])
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'cursor': get_current_cursor(task_board), 'has_more': False, 'changes': []})
+        try:
+            since = int(since)
+        except ValueError:
+            since = -1
+        if since < 0:
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            changes, cursor, has_more = read_changes(task_board, since)
+        except CursorExpired:
+            return Response({'error': 'Cursor expired, download the board again'}, status=status.HTTP_410_GONE)
+        return Response({
+            'cursor': cursor,
+            'has_more': has_more,
+            'changes': [{
+                'type': 'board' if task_id is None else 'task',
+                'action': ChangeLogEntry.ACTION_NAMES[action],
+                'id': task_board.pk if task_id is None else task_id,
+                'data': TaskSerializer(task).data if task is not None else None,
+            } for action, task_id, task in changes],
+        })
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_file(self, request, *args, **kwargs):
+        """
+        Creates tasks from an uploaded NDJSON or CSV file, sent as the file field. The format follows the file
+        extension unless the input field sets it. Valid rows are created in batches and failed rows are reported by
+        line, as is where a file stops being UTF-8 once rows were created. Very large files are better loaded with the
+        import_tasks management command.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Missing file'}, status=status.HTTP_400_BAD_REQUEST)
+        input_format = request.data.get('input') or guess_import_format(upload.name)
+        if input_format not in IMPORT_READERS:
+            return Response({'error': f"Invalid input, use one of: {', '.join(IMPORT_READERS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        task_board = get_task_board(request, self.kwargs['board_slug'])
+        try:
+            report = import_tasks(task_board, request.user, upload, input_format)
+        except UnicodeDecodeError: # Raised before any task was created
+            return Response({'error': 'The file must be UTF-8 encoded'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
+
+class TaskFeedView(ListAPIView):
+    """
+    Every task on the boards the user owns or guests on, newest first, as one keyset-paginated query. Filtered by
+    completed, priority, a deadline range and board, see TaskFeedFilter. The boards are read from the owner and
+    (user, task_board) membership indexes in subqueries, and their tasks through the (task_board, created_at, id) index.
+    No index serves the newest first order across several boards, so every page sorts all the tasks of the user's
+    boards that pass the filters: the cost grows with those tasks, not with the page size.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = TaskFeedSerializer
+    pagination_class = TaskCursorPagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = TaskFeedFilter
+    ordering_fields = ['created_at']
+
+    def get_queryset(self):
+        user = self.request.user
+        owned = TaskBoard.objects.filter(owner=user.id).values('id')
+        guest = BoardGuest.objects.filter(user=user.id).values('task_board_id')
+        return (Task.objects.filter(Q(task_board_id__in=owned) | Q(task_board_id__in=guest))
+                .select_related('task_board'))
+
 
 class InviteUserView(APIView):
     permission_classes = [IsAuthenticated, IsTaskBoardOwner]
@@ -80,15 +275,16 @@ class InviteUserView(APIView):
     def post(self, request, *args, **kwargs):
         User = get_user_model()
 
-        task_board = get_object_or_404(TaskBoard, slug=self.kwargs['board_slug'])
+        task_board = get_task_board(request, self.kwargs['board_slug'])
         username = request.data.get('username')
         action = request.data.get('action')
+        role = request.data.get('role', BoardGuest.ROLE_EDITOR)
 
         if not action or action not in ['invite', 'remove']:
             return Response({'error': 'Invalid or missing action'}, status=status.HTTP_400_BAD_REQUEST)
         if not username:
             return Response({"Error: Username Required"}, status=status.HTTP_400_BAD_REQUEST)
-        if request.user != task_board.owner:
+        if get_board_role(request, task_board) != ROLE_OWNER:
             return Response({"Error: Only the board owner can edit the guest list"}, status=status.HTTP_403_FORBIDDEN)
 
         action_user = get_object_or_404(User, username=username)
@@ -96,21 +292,28 @@ class InviteUserView(APIView):
         if action == 'invite':
             if username == request.user.username:
                 return Response({"Error: You cannot invite yourself!"}, status=status.HTTP_400_BAD_REQUEST)
-            if task_board.guests.filter(
-                    username=username).count():  # if username count > 1 (already in task board guests)
+            # A JSON list or object is unhashable, so it is refused before the lookup rather than raising
+            if not isinstance(role, str) or role not in dict(BoardGuest.ROLE_CHOICES):
+                return Response({"Error: Invalid role"}, status=status.HTTP_400_BAD_REQUEST)
+            if task_board.has_guest(action_user):
                 return Response({"Error: User already invited!"}, status=status.HTTP_400_BAD_REQUEST)
 
-            task_board.guests.add(action_user)
-            notify_user_invitation_to_task_board(action_user, request.user, task_board)
+            task_board.guests.add(action_user, through_defaults={'role': role})
+            TaskBoard.touch([task_board.pk]) # The guest list is part of the board representation
+            # Email in the background once the membership is committed, the request never waits on SMTP
+            transaction.on_commit(lambda: notify_user_invitation_to_task_board.delay(
+                action_user.pk, request.user.pk, task_board.pk))
             return Response({f"Message: {action_user.username} was successfully invited to '{task_board.title}'"},
                             status=status.HTTP_200_OK)
 
         if action == 'remove':
             if action_user.username == request.user.username:
                 return Response({"Error: You cannot remove yourself!"}, status=status.HTTP_400_BAD_REQUEST)
-            if action_user not in task_board.guests.all():
+            # Deleting by the unique (task_board, user) index doubles as the membership check
+            removed, _ = BoardGuest.objects.filter(task_board=task_board, user=action_user).delete()
+            if not removed:
                 return Response({"Error: User not a guest!"}, status=status.HTTP_400_BAD_REQUEST)
-            task_board.guests.remove(action_user)
+            TaskBoard.touch([task_board.pk])
             return Response({f"Message: {action_user.username} was successfully removed from '{task_board.title}'"},)
         return Response({"Error: Invalid or missing action"}, status=status.HTTP_400_BAD_REQUEST)
 